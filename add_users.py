@@ -1,19 +1,33 @@
+import argparse
 import csv
+import io
 import os
 import shutil
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
-from app import create_app
+from functools import partial
+from time import perf_counter
+from sqlalchemy import String, insert, select
+from sqlalchemy.exc import DataError, DBAPIError, IntegrityError
 from extensions import db
 from models import User, Role
 from werkzeug.security import generate_password_hash
 
+REQUIRED_ROLES = ['User', 'Manager', 'Admin']
+# Columns written by the bulk import, in COPY order.
+BULK_COLUMNS = ['username', 'email', 'password_hash', 'role_id', 'first_name', 'last_name', 'mobile_phone',
+                'work_phone', 'timezone', 'is_active', 'call_sequence']
+# Maximum lengths of the bulk-imported string columns, checked per row before COPY/INSERT.
+FIELD_LENGTHS = {column.key: column.type.length for column in User.__table__.columns
+                 if isinstance(column.type, String) and column.type.length and column.key in BULK_COLUMNS}
+
 def add_users_from_csv(csv_file_path):
+    from app import create_app
     app = create_app()
     with app.app_context():
         # Ensure roles exist
         roles = {role.name: role for role in Role.query.all()}
-        required_roles = ['User', 'Manager', 'Admin']
-        for role_name in required_roles:
+        for role_name in REQUIRED_ROLES:
             if role_name not in roles:
                 print(f"Role '{role_name}' not found. Please ensure roles are seeded before adding users.")
                 return
@@ -63,22 +77,7 @@ def add_users_from_csv(csv_file_path):
                 db.session.commit()
                 print("All users added successfully.")
 
-            # After successful import, rename and move the CSV file
-            timestamp = datetime.now().strftime('%Y%m%d_%H-%M-%S')
-            filename = os.path.basename(csv_file_path)
-            new_filename = f"imported_users_{timestamp}.csv"
-            complete_dir = os.path.join(os.path.dirname(csv_file_path), 'complete')
-
-            # Ensure the 'complete' directory exists
-            if not os.path.exists(complete_dir):
-                os.makedirs(complete_dir)
-
-            # Construct full paths
-            new_file_path = os.path.join(complete_dir, new_filename)
-
-            # Move and rename the file
-            shutil.move(csv_file_path, new_file_path)
-            print(f"CSV file has been moved to '{new_file_path}'.")
+            archive_csv(csv_file_path)
 
         except FileNotFoundError:
             print(f"CSV file '{csv_file_path}' not found.")
@@ -86,6 +85,197 @@ def add_users_from_csv(csv_file_path):
             print(f"An error occurred: {e}")
             db.session.rollback()
 
+def archive_csv(csv_file_path):
+    """Move an imported CSV into the 'complete' directory next to it, with a timestamped name."""
+    timestamp = datetime.now().strftime('%Y%m%d_%H-%M-%S')
+    new_filename = f"imported_users_{timestamp}.csv"
+    complete_dir = os.path.join(os.path.dirname(csv_file_path), 'complete')
+
+    # Ensure the 'complete' directory exists
+    if not os.path.exists(complete_dir):
+        os.makedirs(complete_dir)
+
+    # Construct full paths
+    new_file_path = os.path.join(complete_dir, new_filename)
+
+    # Move and rename the file
+    shutil.move(csv_file_path, new_file_path)
+    print(f"CSV file has been moved to '{new_file_path}'.")
+
+def read_import_rows(csv_file_path, roles, existing_usernames, existing_emails):
+    """
+    Validate every CSV row against the prefetched roles, usernames and emails.
+
+    :return: (rows, errors) where rows are (line number, password, column dict) and
+             errors are (line number, username, message)
+    """
+    rows, errors = [], []
+    seen_usernames, seen_emails = set(existing_usernames), set(existing_emails)
+    with open(csv_file_path, 'r', newline='', encoding='utf-8') as csvfile:
+        reader = csv.DictReader(csvfile)
+        for line, row in enumerate(reader, start=2):
+            username = (row.get('username') or '').strip()
+            email = (row.get('email') or '').strip()
+            password = row.get('password') or ''
+            role = roles.get(row.get('role'))
+            if not username or not email or not password:
+                errors.append((line, username, 'username, email and password are required'))
+            elif not role:
+                errors.append((line, username, f"invalid role '{row.get('role')}'"))
+            elif username in seen_usernames:
+                errors.append((line, username, 'username already exists'))
+            elif email in seen_emails:
+                errors.append((line, username, f"email '{email}' already exists"))
+            else:
+                values = {
+                    'username': username,
+                    'email': email,
+                    'role_id': role.id,
+                    'first_name': row.get('first_name') or None,
+                    'last_name': row.get('last_name') or None,
+                    'mobile_phone': row.get('mobile_phone') or None,
+                    'work_phone': row.get('work_phone') or None,
+                    'timezone': row.get('timezone') or 'UTC',
+                    'is_active': (row.get('is_active') or 'True').lower() == 'true',
+                    'call_sequence': 0,
+                }
+                too_long = [column for column, length in FIELD_LENGTHS.items()
+                            if values.get(column) and len(values[column]) > length]
+                if too_long:
+                    errors.append((line, username, '; '.join(
+                        f'{column} is longer than {FIELD_LENGTHS[column]} characters' for column in too_long)))
+                    continue
+                seen_usernames.add(username)
+                seen_emails.add(email)
+                rows.append((line, password, values))
+    return rows, errors
+
+def copy_users(batch):
+    """
+    Insert a batch with Postgres COPY (psycopg2 only).
+
+    COPY runs on the raw DBAPI cursor, so driver errors are re-raised as the
+    matching SQLAlchemy exception (IntegrityError, DataError, ...) like any
+    other statement's.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for values in batch:
+        writer.writerow(['\\N' if values[column] is None else values[column] for column in BULK_COLUMNS])
+    buffer.seek(0)
+    connection = db.session.connection()
+    dbapi_error = connection.dialect.loaded_dbapi.Error
+    statement = f"COPY users ({', '.join(BULK_COLUMNS)}) FROM STDIN WITH (FORMAT csv, NULL '\\N')"
+    cursor = connection.connection.cursor()
+    try:
+        cursor.copy_expert(statement, buffer)
+    except dbapi_error as e:
+        raise DBAPIError.instance(statement, None, e, dbapi_error)
+    finally:
+        cursor.close()
+
+def insert_users(batch):
+    """Insert a batch with one executemany INSERT."""
+    db.session.execute(insert(User), [
+        {('_' + key if key in ('mobile_phone', 'work_phone') else key): value for key, value in values.items()}
+        for values in batch
+    ])
+
+def bulk_import_users(csv_file_path, batch_size=1000, workers=None, error_report=None, archive=True):
+    """
+    Import users from a CSV in bulk.
+
+    Existing usernames and emails are fetched once, passwords are hashed in a
+    process pool, and rows are inserted in batches (COPY on Postgres with
+    psycopg2, executemany elsewhere), one transaction per batch. A batch that
+    fails is retried row by row so a single bad row only rejects itself.
+
+    :param csv_file_path: CSV with the same columns as user_import/template_users.csv
+    :param batch_size: Rows per insert batch
+    :param workers: Password hashing processes (defaults to the CPU count)
+    :param error_report: Optional path for a CSV of rejected rows (line, username, error)
+    :param archive: Move the CSV into user_import/complete after the import
+    """
+    # Imported here so hashing workers that re-import this module do not build an app.
+    from app import create_app
+    app = create_app()
+    with app.app_context():
+        roles = {role.name: role for role in Role.query.all()}
+        for role_name in REQUIRED_ROLES:
+            if role_name not in roles:
+                print(f"Role '{role_name}' not found. Please ensure roles are seeded before adding users.")
+                return
+
+        started = perf_counter()
+        existing = db.session.execute(select(User.username, User.email)).all()
+        try:
+            rows, errors = read_import_rows(csv_file_path, roles, {u for u, _ in existing}, {e for _, e in existing})
+        except FileNotFoundError:
+            print(f"CSV file '{csv_file_path}' not found.")
+            return
+        validated = perf_counter()
+
+        hash_password = partial(generate_password_hash, method=app.config['PASSWORD_HASH_METHOD'])
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            hashes = list(executor.map(hash_password, [password for _, password, _ in rows],
+                                       chunksize=max(len(rows) // ((workers or os.cpu_count() or 1) * 4), 1)))
+        for (_, _, values), password_hash in zip(rows, hashes):
+            values['password_hash'] = password_hash
+        hashed = perf_counter()
+
+        use_copy = db.engine.dialect.name == 'postgresql' and db.engine.dialect.driver == 'psycopg2'
+        write_batch = copy_users if use_copy else insert_users
+        inserted = 0
+        for offset in range(0, len(rows), batch_size):
+            batch = rows[offset:offset + batch_size]
+            try:
+                write_batch([values for _, _, values in batch])
+                db.session.commit()
+                inserted += len(batch)
+            except (IntegrityError, DataError):
+                db.session.rollback()
+                for line, _, values in batch:
+                    try:
+                        insert_users([values])
+                        db.session.commit()
+                        inserted += 1
+                    except (IntegrityError, DataError) as e:
+                        db.session.rollback()
+                        errors.append((line, values['username'], str(e.orig).strip().splitlines()[0]))
+        finished = perf_counter()
+
+    errors.sort()
+    for line, username, message in errors:
+        print(f"Line {line}: '{username}' skipped: {message}")
+    if error_report and errors:
+        with open(error_report, 'w', newline='', encoding='utf-8') as handle:
+            writer = csv.writer(handle)
+            writer.writerow(['line', 'username', 'error'])
+            writer.writerows(errors)
+        print(f"Error report written to '{error_report}'.")
+
+    total = finished - started
+    print(f"Imported {inserted} of {inserted + len(errors)} users ({len(errors)} rejected) "
+          f"via {'COPY' if use_copy else 'batched INSERT'}.")
+    print(f"Validate {validated - started:.2f}s, hash {hashed - validated:.2f}s, insert {finished - hashed:.2f}s, "
+          f"total {total:.2f}s ({inserted / total if total else 0:.0f} users/s).")
+
+    if archive:
+        archive_csv(csv_file_path)
+
 if __name__ == '__main__':
-    csv_file_path = os.path.join('user_import', 'users.csv')  # Path to your CSV file
-    add_users_from_csv(csv_file_path)
+    parser = argparse.ArgumentParser(description='Import users from a CSV file.')
+    parser.add_argument('csv_file', nargs='?', default=os.path.join('user_import', 'users.csv'),
+                        help='CSV file to import (default: user_import/users.csv)')
+    parser.add_argument('--bulk', action='store_true', help='Bulk mode: parallel hashing and batched inserts')
+    parser.add_argument('--batch-size', type=int, default=1000, help='Rows per insert batch in bulk mode')
+    parser.add_argument('--workers', type=int, help='Password hashing processes in bulk mode')
+    parser.add_argument('--errors', metavar='PATH', help='Write rejected rows to this CSV in bulk mode')
+    parser.add_argument('--no-archive', action='store_true', help='Leave the CSV in place after a bulk import')
+    args = parser.parse_args()
+
+    if args.bulk:
+        bulk_import_users(args.csv_file, batch_size=args.batch_size, workers=args.workers,
+                          error_report=args.errors, archive=not args.no_archive)
+    else:
+        add_users_from_csv(args.csv_file)
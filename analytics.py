@@ -0,0 +1,399 @@
+"""
+Pre-aggregated analytics.
+
+Write hooks record which days a change to Schedule, TimeOffRequest or
+UserActivity touches as (kind, day) rows in analytics_dirty_day, in the same
+transaction as the change. refresh_rollups() recomputes just those days into
+the daily rollup tables, so the analytics dashboard reads a few rows per day
+instead of aggregating raw history. Run it from a job (refresh_analytics.py)
+or let the dashboard call it before reading; refresh_analytics.py --full
+rebuilds everything. Empty rollups over existing raw data (tables just
+created) are rebuilt in full by the next refresh.
+"""
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta
+from time import sleep
+import logging
+
+from sqlalchemy import delete, event, func, insert, inspect, select, type_coerce
+from sqlalchemy.exc import IntegrityError, OperationalError, SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from extensions import db
+from models import (AnalyticsDirtyDay, DailyLoginCount, DailyTimeOffCount, DailyUserHours, Schedule, Team,
+                    TimeOffRequest, User, UserActivity)
+
+logger = logging.getLogger(__name__)
+
+SCHEDULE_HOURS = 'schedule_hours'
+TIME_OFF = 'time_off'
+LOGINS = 'logins'
+# Marker recorded when a change's days cannot be determined; the next refresh rebuilds everything.
+REBUILD_ALL = 'rebuild_all'
+REBUILD_ALL_DAY = date(1970, 1, 1)
+
+REFRESH_ATTEMPTS = 3
+# Key for pg_advisory_xact_lock, shared by every process refreshing the rollups.
+REFRESH_LOCK_KEY = 0x726F6C6C
+
+
+def schedule_days(start_time, end_time):
+    """Calendar days (UTC) that the shift [start_time, end_time) overlaps."""
+    if start_time is None or end_time is None or end_time <= start_time:
+        return []
+    last = (end_time - timedelta(microseconds=1)).date()
+    return [start_time.date() + timedelta(days=i) for i in range((last - start_time.date()).days + 1)]
+
+
+def split_by_day(start_time, end_time):
+    """Yield (day, hours) for each calendar day the shift overlaps."""
+    for day in schedule_days(start_time, end_time):
+        day_start = datetime.combine(day, time.min)
+        overlap = min(end_time, day_start + timedelta(days=1)) - max(start_time, day_start)
+        yield day, overlap.total_seconds() / 3600
+
+
+def _day_ranges(days):
+    """Group days into contiguous inclusive (first, last) ranges."""
+    ranges = []
+    for day in sorted(days):
+        if ranges and day == ranges[-1][1] + timedelta(days=1):
+            ranges[-1][1] = day
+        else:
+            ranges.append([day, day])
+    return [(first, last) for first, last in ranges]
+
+
+def _insert_ignore(table, dialect_name):
+    if dialect_name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        return dialect_insert(table).on_conflict_do_nothing()
+    if dialect_name == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        return dialect_insert(table).on_conflict_do_nothing()
+    return insert(table).prefix_with('IGNORE')
+
+
+def mark_dirty(connection, kind, days):
+    """Record that the rollup for `kind` must be recomputed for `days`."""
+    rows = [{'kind': kind, 'day': day} for day in set(days) if day is not None]
+    if rows:
+        connection.execute(_insert_ignore(AnalyticsDirtyDay.__table__, connection.dialect.name), rows)
+
+
+def _as_day(value):
+    return value.date() if isinstance(value, datetime) else value
+
+
+def _old_and_new(obj, *names):
+    """Current and pre-flush values of the given attributes."""
+    state = inspect(obj)
+    values = [tuple(getattr(obj, name) for name in names)]
+    if state.persistent or state.deleted:
+        old = []
+        for name in names:
+            history = state.attrs[name].history
+            old.append(history.deleted[0] if history.deleted else getattr(obj, name))
+        values.append(tuple(old))
+    return values
+
+
+def _dirty_days_for(obj):
+    if isinstance(obj, Schedule):
+        days = []
+        for start_time, end_time in _old_and_new(obj, 'start_time', 'end_time'):
+            days.extend(schedule_days(start_time, end_time))
+        return SCHEDULE_HOURS, days
+    if isinstance(obj, TimeOffRequest):
+        return TIME_OFF, [_as_day(start_date) for start_date, in _old_and_new(obj, 'start_date')]
+    if isinstance(obj, UserActivity):
+        return LOGINS, [_as_day(timestamp) for timestamp, in _old_and_new(obj, 'timestamp')]
+    return None, []
+
+
+@event.listens_for(Session, 'before_flush')
+def _collect_changed_days(session, flush_context, instances):
+    # Old values of changed and deleted rows have to be read before the flush; a deleted
+    # row cannot be refreshed afterwards.
+    pending = session.info.setdefault('analytics_dirty', defaultdict(set))
+    for obj in list(session.dirty) + list(session.deleted):
+        kind, days = _dirty_days_for(obj)
+        if kind:
+            pending[kind].update(days)
+
+
+@event.listens_for(Session, 'after_flush')
+def _mark_flushed_changes(session, flush_context):
+    # New rows are handled here, once column defaults such as UserActivity.timestamp are set.
+    pending = session.info.pop('analytics_dirty', None) or defaultdict(set)
+    for obj in session.new:
+        kind, days = _dirty_days_for(obj)
+        if kind:
+            pending[kind].update(days)
+    if any(pending.values()):
+        connection = session.connection()
+        for kind, days in pending.items():
+            mark_dirty(connection, kind, days)
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _discard_collected_days(session, previous_transaction):
+    session.info.pop('analytics_dirty', None)
+
+
+def _days_for_values(model, values):
+    return schedule_days(*values) if model is Schedule else [_as_day(values[0])]
+
+
+def _set_values(statement):
+    """Column key -> SQL expression assigned by an UPDATE's SET clause."""
+    assigned = statement._values or dict(statement._ordered_values or ())
+    return {getattr(column, 'key', column): value for column, value in assigned.items()}
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _mark_bulk_changes(orm_execute_state):
+    # Bulk insert()/update()/delete() and Query.delete() bypass the flush.
+    if orm_execute_state.is_select:
+        return
+    mapper = orm_execute_state.bind_mapper
+    if mapper is None or mapper.class_ not in (Schedule, TimeOffRequest, UserActivity):
+        return
+    model = mapper.class_
+    session = orm_execute_state.session
+    kind = {Schedule: SCHEDULE_HOURS, TimeOffRequest: TIME_OFF, UserActivity: LOGINS}[model]
+    columns = {
+        Schedule: (Schedule.start_time, Schedule.end_time),
+        TimeOffRequest: (TimeOffRequest.start_date,),
+        UserActivity: (UserActivity.timestamp,),
+    }[model]
+    params = orm_execute_state.parameters
+
+    days = set()
+    if orm_execute_state.is_insert:
+        for row in params if isinstance(params, list) else [params or {}]:
+            days.update(_days_for_values(model, [row.get(column.key) for column in columns]))
+    elif orm_execute_state.is_update and isinstance(params, list):
+        # Bulk UPDATE by primary key: the old values of the listed rows, and their new values.
+        changes = {row['id']: row for row in params if 'id' in row}
+        for start in range(0, len(changes), 1000):
+            batch = list(changes)[start:start + 1000]
+            for row_id, *old in session.execute(select(model.id, *columns).where(model.id.in_(batch))):
+                days.update(_days_for_values(model, old))
+                new = changes[row_id]
+                days.update(_days_for_values(model, [new.get(column.key, value) for column, value in zip(columns, old)]))
+    else:
+        # Rows an UPDATE or DELETE will touch, read before it runs. For an UPDATE the SET
+        # expressions are evaluated over the same rows too, so the days shifts move to are
+        # marked as well as the days they leave.
+        selected = list(columns)
+        if orm_execute_state.is_update:
+            assigned = _set_values(orm_execute_state.statement)
+            selected += [type_coerce(assigned.get(column.key, column), column.type) for column in columns]
+        statement = select(*selected)
+        whereclause = orm_execute_state.statement.whereclause
+        if whereclause is not None:
+            statement = statement.where(whereclause)
+        try:
+            with session.begin_nested():
+                rows = session.execute(statement, params if isinstance(params, dict) else None).all()
+        except (SQLAlchemyError, TypeError, ValueError) as e:
+            # The new values cannot be bounded; have the next refresh rebuild everything.
+            logger.warning("Could not determine the days a bulk %s change touches (%s); "
+                           "scheduling a full analytics rebuild", model.__name__, e)
+            mark_dirty(session.connection(), REBUILD_ALL, [REBUILD_ALL_DAY])
+            return
+        for values in rows:
+            days.update(_days_for_values(model, values[:len(columns)]))
+            if orm_execute_state.is_update:
+                days.update(_days_for_values(model, values[len(columns):]))
+    mark_dirty(session.connection(), kind, days)
+
+
+def refresh_rollups(full=False):
+    """
+    Recompute the rollups for every day marked dirty, then commit.
+
+    Refreshes are serialized (by a transaction-scoped advisory lock on
+    Postgres), so concurrent dashboard loads do not rebuild the same days at
+    once. A refresh that still collides with another writer is rolled back,
+    along with anything else pending in the session, and retried.
+
+    :param full: Rebuild every rollup from the raw tables instead
+    :return: Dict of kind -> number of days recomputed
+    :raises SQLAlchemyError: If the last of REFRESH_ATTEMPTS attempts fails
+    """
+    for attempt in range(1, REFRESH_ATTEMPTS + 1):
+        try:
+            return _refresh_rollups(full)
+        except (IntegrityError, OperationalError) as e:
+            db.session.rollback()
+            if attempt == REFRESH_ATTEMPTS:
+                raise
+            logger.warning("Analytics refresh collided with a concurrent writer (attempt %d of %d): %s",
+                           attempt, REFRESH_ATTEMPTS, e)
+            sleep(0.05 * attempt)
+
+
+def _lock_refresh():
+    """Wait for any other refresh to finish; the lock is released when this transaction ends."""
+    if db.session.get_bind().dialect.name == 'postgresql':
+        db.session.execute(select(func.pg_advisory_xact_lock(REFRESH_LOCK_KEY)))
+
+
+def _refresh_rollups(full):
+    _lock_refresh()
+    dirty = defaultdict(set)
+    if not full:
+        for kind, day in db.session.execute(select(AnalyticsDirtyDay.kind, AnalyticsDirtyDay.day)):
+            dirty[kind].add(day)
+        if not dirty and not _rollups_missing():
+            db.session.commit()
+            return {}
+        full = not dirty or REBUILD_ALL in dirty
+    if full:
+        dirty = _all_days()
+        for model in (DailyUserHours, DailyTimeOffCount, DailyLoginCount):
+            db.session.execute(delete(model))
+        db.session.execute(delete(AnalyticsDirtyDay))
+
+    rebuilders = {SCHEDULE_HOURS: _rebuild_schedule_hours, TIME_OFF: _rebuild_time_off, LOGINS: _rebuild_logins}
+    refreshed = {}
+    for kind, days in dirty.items():
+        for first, last in _day_ranges(days):
+            if not full:
+                # Claim the markers before recomputing, so a write that lands meanwhile marks the day again.
+                db.session.execute(delete(AnalyticsDirtyDay).where(
+                    AnalyticsDirtyDay.kind == kind, AnalyticsDirtyDay.day.between(first, last)
+                ))
+            rebuilders[kind](first, last)
+        refreshed[kind] = len(days)
+    db.session.commit()
+    logger.info("Analytics rollups refreshed: %s", refreshed)
+    return refreshed
+
+
+def _rollups_missing():
+    """True when every rollup table is empty but there is raw data they should summarize."""
+    for model in (DailyUserHours, DailyTimeOffCount, DailyLoginCount):
+        if db.session.execute(select(model).limit(1)).first() is not None:
+            return False
+    raw = (
+        select(Schedule.id).where(Schedule.end_time > Schedule.start_time),
+        select(TimeOffRequest.id),
+        select(UserActivity.id).where(UserActivity.activity_type == 'login'),
+    )
+    return any(db.session.execute(query.limit(1)).first() is not None for query in raw)
+
+
+def _all_days():
+    """Every day with raw data, per rollup kind."""
+    dirty = {}
+    bounds = {
+        SCHEDULE_HOURS: (func.min(Schedule.start_time), func.max(Schedule.end_time)),
+        TIME_OFF: (func.min(TimeOffRequest.start_date), func.max(TimeOffRequest.start_date)),
+        LOGINS: (func.min(UserActivity.timestamp), func.max(UserActivity.timestamp)),
+    }
+    for kind, (low, high) in bounds.items():
+        first, last = db.session.execute(select(low, high)).one()
+        if first is None:
+            continue
+        first, last = _as_day(first), _as_day(last)
+        dirty[kind] = {first + timedelta(days=i) for i in range((last - first).days + 1)}
+    return dirty
+
+
+def _rebuild_schedule_hours(first, last):
+    range_start = datetime.combine(first, time.min)
+    range_end = datetime.combine(last + timedelta(days=1), time.min)
+    totals = defaultdict(float)
+    rows = db.session.execute(select(Schedule.user_id, Schedule.start_time, Schedule.end_time).where(
+        Schedule.start_time < range_end, Schedule.end_time > range_start
+    ).execution_options(yield_per=1000))
+    for user_id, start_time, end_time in rows:
+        for day, hours in split_by_day(max(start_time, range_start), min(end_time, range_end)):
+            totals[(day, user_id)] += hours
+
+    db.session.execute(delete(DailyUserHours).where(DailyUserHours.day.between(first, last)))
+    if totals:
+        db.session.execute(insert(DailyUserHours), [
+            {'day': day, 'user_id': user_id, 'hours': hours} for (day, user_id), hours in totals.items()
+        ])
+
+
+def _rebuild_time_off(first, last):
+    rows = db.session.execute(select(
+        TimeOffRequest.start_date, TimeOffRequest.status, func.count(TimeOffRequest.id)
+    ).where(TimeOffRequest.start_date.between(first, last)).group_by(
+        TimeOffRequest.start_date, TimeOffRequest.status
+    )).all()
+
+    db.session.execute(delete(DailyTimeOffCount).where(DailyTimeOffCount.day.between(first, last)))
+    counts = defaultdict(int)
+    for day, status, count in rows:
+        counts[(day, status or 'Unknown')] += count
+    if counts:
+        db.session.execute(insert(DailyTimeOffCount), [
+            {'day': day, 'status': status, 'count': count} for (day, status), count in counts.items()
+        ])
+
+
+def _rebuild_logins(first, last):
+    counts = defaultdict(int)
+    rows = db.session.execute(select(UserActivity.user_id, UserActivity.timestamp).where(
+        UserActivity.activity_type == 'login',
+        UserActivity.timestamp >= datetime.combine(first, time.min),
+        UserActivity.timestamp < datetime.combine(last + timedelta(days=1), time.min)
+    ).execution_options(yield_per=1000))
+    for user_id, timestamp in rows:
+        counts[(timestamp.date(), user_id)] += 1
+
+    db.session.execute(delete(DailyLoginCount).where(DailyLoginCount.day.between(first, last)))
+    if counts:
+        db.session.execute(insert(DailyLoginCount), [
+            {'day': day, 'user_id': user_id, 'count': count} for (day, user_id), count in counts.items()
+        ])
+
+
+def dashboard_data(start_day, end_day):
+    """
+    Chart data for the analytics dashboard, read from the rollups.
+
+    Team hours are summed over each user's current team at read time, matching
+    how the raw query attributed them.
+
+    :param start_day: First day to include
+    :param end_day: Last day to include
+    :return: Dict with user_hours, team_hours, time_off_status, time_off_trends and user_activity lists
+    """
+    in_range = DailyUserHours.day.between(start_day, end_day)
+    user_hours = db.session.query(User.username, func.sum(DailyUserHours.hours)).join(
+        DailyUserHours, DailyUserHours.user_id == User.id
+    ).filter(in_range).group_by(User.username).order_by(User.username).all()
+
+    team_hours = db.session.query(Team.name, func.sum(DailyUserHours.hours)).join(
+        User, User.team_id == Team.id
+    ).join(DailyUserHours, DailyUserHours.user_id == User.id).filter(in_range).group_by(Team.name).order_by(
+        Team.name
+    ).all()
+
+    time_off_rows = db.session.query(DailyTimeOffCount.day, DailyTimeOffCount.status, DailyTimeOffCount.count).filter(
+        DailyTimeOffCount.day.between(start_day, end_day)
+    ).all()
+    by_status = defaultdict(int)
+    by_month = defaultdict(int)
+    for day, status, count in time_off_rows:
+        by_status[status] += count
+        by_month[date(day.year, day.month, 1)] += count
+
+    user_activity = db.session.query(User.username, func.sum(DailyLoginCount.count)).join(
+        DailyLoginCount, DailyLoginCount.user_id == User.id
+    ).filter(DailyLoginCount.day.between(start_day, end_day)).group_by(User.username).order_by(User.username).all()
+
+    return {
+        'user_hours': [(username, round(hours, 2)) for username, hours in user_hours],
+        'team_hours': [(name, round(hours, 2)) for name, hours in team_hours],
+        'time_off_status': sorted(by_status.items()),
+        'time_off_trends': sorted(by_month.items()),
+        'user_activity': [(username, int(count)) for username, count in user_activity],
+    }
@@ -1,21 +1,24 @@
 import logging
 import os
 from flask import Flask, render_template
-from sqlalchemy import text
-from sqlalchemy.exc import SQLAlchemyError, OperationalError
 import traceback
 from extensions import db, migrate, jwt, login_manager
+from db_pool import engine_options
+from passwords import password_hasher
+from profiling import profiler
+import metrics
 from routes import main, auth, admin, manager, user, seed_core_colors
 from dotenv import load_dotenv
-
-# Configure logging at the top
-logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-logger = logging.getLogger(__name__)
+from logging_setup import configure_logging
 
 # Load environment variables from .env file
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 def create_app():
+    # JSON logs through a background writer thread; levels from LOG_LEVEL / LOG_LEVELS (see logging_setup)
+    configure_logging()
     app = Flask(__name__)
     app.config['SECRET_KEY'] = os.environ.get('FLASK_SECRET_KEY', 'fallback-secret-key')
     
@@ -23,14 +26,50 @@ def create_app():
     if app.config['SQLALCHEMY_DATABASE_URI'] is None:
         raise ValueError("No DATABASE_URL set for Flask application")
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    # Pool sizing and connection health checks (pre-ping/recycle); see db_pool.engine_options
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config['SQLALCHEMY_DATABASE_URI'])
     app.config['JWT_SECRET_KEY'] = os.environ.get('JWT_SECRET_KEY', 'fallback-jwt-secret-key')
     app.config['JWT_TOKEN_LOCATION'] = ['headers']
     app.config['DEBUG'] = True
+    # Seconds the schedule generator may spend searching for a fairer rotation (0 disables the search)
+    app.config['SCHEDULE_TIME_BUDGET'] = float(os.environ.get('SCHEDULE_TIME_BUDGET', 0))
+    # Schedule solver backend ('greedy' or 'local_search') and the rotation constraints it must respect
+    app.config['SCHEDULE_SOLVER'] = os.environ.get('SCHEDULE_SOLVER', 'greedy')
+    app.config['SCHEDULE_MIN_BLOCK_DAYS'] = int(os.environ.get('SCHEDULE_MIN_BLOCK_DAYS', 3))
+    app.config['SCHEDULE_MAX_BLOCK_DAYS'] = int(os.environ.get('SCHEDULE_MAX_BLOCK_DAYS', 5))
+    app.config['SCHEDULE_MAX_SHIFTS'] = int(os.environ['SCHEDULE_MAX_SHIFTS']) if os.environ.get('SCHEDULE_MAX_SHIFTS') else None
+    app.config['SCHEDULE_REST_DAYS'] = int(os.environ.get('SCHEDULE_REST_DAYS', 0))
+    # Most a manager may ask of the batch generator in one request: pool workers, per-team search seconds, days
+    app.config['SCHEDULE_MAX_WORKERS'] = int(os.environ.get('SCHEDULE_MAX_WORKERS', os.cpu_count() or 1))
+    app.config['SCHEDULE_MAX_TIME_BUDGET'] = float(os.environ.get('SCHEDULE_MAX_TIME_BUDGET', 30))
+    app.config['SCHEDULE_MAX_DAYS'] = int(os.environ.get('SCHEDULE_MAX_DAYS', 366))
+    # Password hashing: werkzeug method (stored hashes are upgraded on login when it changes), pool size
+    # (0 hashes inline), max queued jobs, seconds to wait for a slot, and whether to log a cost benchmark at startup
+    app.config['PASSWORD_HASH_METHOD'] = os.environ.get('PASSWORD_HASH_METHOD', 'scrypt')
+    app.config['PASSWORD_HASH_WORKERS'] = int(os.environ.get('PASSWORD_HASH_WORKERS', max((os.cpu_count() or 2) // 2, 1)))
+    app.config['PASSWORD_HASH_QUEUE'] = int(os.environ.get('PASSWORD_HASH_QUEUE', 0)) or None
+    app.config['PASSWORD_HASH_TIMEOUT'] = float(os.environ.get('PASSWORD_HASH_TIMEOUT', 10))
+    app.config['PASSWORD_HASH_BENCHMARK'] = os.environ.get('PASSWORD_HASH_BENCHMARK', 'false').lower() in ('1', 'true', 'yes')
+    # Query profiling: per-request query count/DB time headers, routes flagged over the query or DB time
+    # threshold, and the slowest statements (at least PERF_SLOW_QUERY_MS) kept for /admin/perf
+    app.config['PERF_ENABLED'] = os.environ.get('PERF_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+    app.config['PERF_SLOW_QUERY_MS'] = float(os.environ.get('PERF_SLOW_QUERY_MS', 100))
+    app.config['PERF_QUERY_THRESHOLD'] = int(os.environ.get('PERF_QUERY_THRESHOLD', 30))
+    app.config['PERF_DB_TIME_THRESHOLD_MS'] = float(os.environ.get('PERF_DB_TIME_THRESHOLD_MS', 250))
+    app.config['PERF_TOP_STATEMENTS'] = int(os.environ.get('PERF_TOP_STATEMENTS', 20))
+    # Prometheus-style /metrics endpoint. Scrapers must send METRICS_TOKEN as a Bearer token; without a token
+    # the endpoint answers 404 unless METRICS_PUBLIC explicitly opens it to anyone
+    app.config['METRICS_ENABLED'] = os.environ.get('METRICS_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+    app.config['METRICS_TOKEN'] = os.environ.get('METRICS_TOKEN')
+    app.config['METRICS_PUBLIC'] = os.environ.get('METRICS_PUBLIC', 'false').lower() in ('1', 'true', 'yes')
 
     # Initialize extensions
     db.init_app(app)
     migrate.init_app(app, db)
     jwt.init_app(app)
+    password_hasher.init_app(app)
+    profiler.init_app(app)
+    metrics.init_app(app)
 
     # Register blueprints
     app.register_blueprint(main)
@@ -43,13 +82,11 @@ def create_app():
     login_manager.login_view = 'auth.login'
     login_manager.init_app(app)
 
-    from models import User
+    from identity import load_identity
 
     @login_manager.user_loader
     def load_user(user_id):
-        user = User.query.get(int(user_id))
-        logger.debug(f"load_user called with user_id={user_id}, returning user={user}")
-        return user
+        return load_identity(user_id)
 
     # Seed core colors
     with app.app_context():
@@ -63,16 +100,6 @@ def create_app():
         logger.exception("Unhandled exception: %s", str(e))
         return render_template('500.html'), 500
 
-    # Database connection test
-    @app.before_request
-    def test_database_connection():
-        try:
-            db.session.execute(text('SELECT 1'))
-            logger.debug("Database connection test successful")
-        except OperationalError as e:
-            logger.error(f"Database connection test failed: {str(e)}")
-            return "Database connection error", 500
-
     @app.after_request
     def after_request(response):
         if response.status_code == 500:
@@ -81,7 +108,8 @@ def create_app():
 
     return app
 
-app = create_app()
-
+# No module-level app: spawned process pool workers (password hashing, schedule generation) re-import the
+# main script, and building an app there would open an engine and start a log writer in every worker.
+# Servers use wsgi:app; scripts call create_app() under their __main__ guard.
 if __name__ == '__main__':
-    app.run()
+    create_app().run()
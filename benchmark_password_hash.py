@@ -0,0 +1,60 @@
+"""
+Measure password hash cost on this host and suggest PASSWORD_HASH_METHOD.
+
+    python benchmark_password_hash.py
+    python benchmark_password_hash.py --target-ms 150 --workers 4
+    python benchmark_password_hash.py --method pbkdf2:sha256:600000
+
+For each candidate the median hash and verify times are reported together
+with the login capacity (logins/sec) of a hashing pool of --workers
+processes. The recommendation is the strongest candidate whose verify time
+stays within --target-ms. Hashes made with other parameters are upgraded on
+each user's next login, so changing the method needs no migration.
+"""
+import argparse
+import os
+
+from passwords import benchmark
+
+CANDIDATES = [
+    'scrypt:16384:8:1',
+    'scrypt:32768:8:1',
+    'scrypt:65536:8:1',
+    'pbkdf2:sha256:600000',
+    'pbkdf2:sha256:1000000',
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark password hashing and recommend a method.')
+    parser.add_argument('--method', action='append', help='Method to measure; repeatable (default: built-in candidates)')
+    parser.add_argument('--samples', type=int, default=5, help='Timed hash/verify pairs per method')
+    parser.add_argument('--workers', type=int, default=max((os.cpu_count() or 2) // 2, 1),
+                        help='Hashing pool size to compute capacity for (default: half the CPUs)')
+    parser.add_argument('--target-ms', type=float, default=250, help='Longest acceptable verify time per login')
+    args = parser.parse_args()
+
+    methods = args.method or CANDIDATES
+    print(f"{'Method':<26} {'Hash ms':>9} {'Verify ms':>10} {'Logins/sec':>11}")
+    results = []
+    for method in methods:
+        result = benchmark(method, samples=args.samples, workers=args.workers)
+        results.append(result)
+        print(f"{result['parameters']:<26} {result['hash_ms']:>9.1f} {result['verify_ms']:>10.1f} "
+              f"{result['logins_per_sec']:>11.1f}")
+
+    within_target = [result for result in results if result['verify_ms'] <= args.target_ms]
+    print()
+    if within_target:
+        # The slowest method that still meets the target is the strongest affordable one.
+        best = max(within_target, key=lambda result: result['verify_ms'])
+        print(f"Recommended: PASSWORD_HASH_METHOD={best['parameters']} "
+              f"({best['verify_ms']:.0f} ms per login, ~{best['logins_per_sec']:.0f} logins/sec "
+              f"with {args.workers} workers)")
+    else:
+        print(f"No candidate verifies within {args.target_ms:.0f} ms on this host; "
+              f"raise --target-ms or add PASSWORD_HASH_WORKERS.")
+
+
+if __name__ == '__main__':
+    main()
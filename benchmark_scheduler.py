@@ -0,0 +1,185 @@
+"""
+Benchmark the schedule generator on synthetic teams.
+
+Every scenario is built in a fresh in-memory SQLite database, so results only
+depend on the code and the seed. Latency, query counts and fairness metrics
+are written as JSON; pass --compare with an earlier results file to see how
+each scenario moved between releases.
+
+    python benchmark_scheduler.py --output bench_results.json
+    python benchmark_scheduler.py --sizes 10 100 --years 1 --compare bench_results.json
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import statistics
+from datetime import date, datetime, timedelta
+from time import perf_counter
+
+# The benchmark always runs against its own in-memory database.
+os.environ['DATABASE_URL'] = 'sqlite://'
+
+from sqlalchemy import event, insert
+
+from app import create_app
+from extensions import db
+from fairness import fairness_metrics
+from models import Schedule, Team, TimeOffRequest, User
+from scheduling_algorithm import RotationConstraints, generate_advanced_schedule
+
+DEFAULT_SIZES = [10, 100, 1000, 5000]
+DEFAULT_YEARS = [1, 3]
+DEFAULT_DENSITIES = [0, 10, 30]
+START_DATE = date(2025, 1, 1)
+
+
+def build_team(size, years, leave_days_per_year, seed):
+    """Insert one synthetic team with `size` users and their approved time off; return its ID."""
+    rng = random.Random(seed)
+    team = Team(name=f'bench-{size}')
+    db.session.add(team)
+    db.session.flush()
+
+    db.session.execute(insert(User), [
+        {
+            'username': f'bench{i}',
+            'email': f'bench{i}@example.com',
+            'password_hash': '!',
+            'team_id': team.id,
+            'timezone': 'UTC',
+            'is_active': True,
+        }
+        for i in range(size)
+    ])
+    user_ids = [user_id for user_id, in db.session.query(User.id).filter_by(team_id=team.id)]
+
+    horizon_days = 365 * years
+    leave = []
+    for user_id in user_ids:
+        remaining = leave_days_per_year * years
+        while remaining > 0:
+            length = min(rng.randint(1, 10), remaining)
+            start = START_DATE + timedelta(days=rng.randrange(horizon_days))
+            leave.append({
+                'user_id': user_id,
+                'start_date': start,
+                'end_date': start + timedelta(days=length - 1),
+                'status': 'Approved',
+            })
+            remaining -= length
+    if leave:
+        db.session.execute(insert(TimeOffRequest), leave)
+    db.session.commit()
+    return team.id, user_ids
+
+
+def run_scenario(app, size, years, density, seed, solver, time_budget, repeat):
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        team_id, user_ids = build_team(size, years, density, seed)
+        end_date = START_DATE + timedelta(days=365 * years - 1)
+
+        statements = []
+        listener = lambda *args, **kwargs: statements.append(1)
+        event.listen(db.engine, 'before_cursor_execute', listener)
+        try:
+            timings = []
+            for _ in range(repeat):
+                statements.clear()
+                started = perf_counter()
+                schedules = generate_advanced_schedule(
+                    team_id, START_DATE, end_date,
+                    time_budget=time_budget, solver=solver,
+                    constraints=RotationConstraints(), seed=seed
+                )
+                timings.append((perf_counter() - started) * 1000)
+            queries = len(statements)
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', listener)
+
+        blocks = [
+            (schedule.user_id, schedule.start_time.date().toordinal(), schedule.end_time.date().toordinal())
+            for schedule in schedules
+        ]
+        db.session.rollback()
+
+    return {
+        'scenario': f'users={size} years={years} leave_days={density}',
+        'users': size,
+        'years': years,
+        'leave_days_per_year': density,
+        'solver': solver,
+        'time_budget': time_budget,
+        'schedules': len(schedules),
+        'latency_ms': {
+            'min': round(min(timings), 3),
+            'median': round(statistics.median(timings), 3),
+            'max': round(max(timings), 3),
+        },
+        'queries': queries,
+        'fairness': fairness_metrics(blocks, user_ids, START_DATE, end_date),
+    }
+
+
+def compare(results, baseline_path):
+    with open(baseline_path, encoding='utf-8') as handle:
+        baseline = {entry['scenario']: entry for entry in json.load(handle)['results']}
+
+    print(f"\n{'Scenario':<40} {'Median ms':>10} {'Before':>10} {'Change':>8} {'Queries':>8} {'Before':>7}")
+    for entry in results:
+        previous = baseline.get(entry['scenario'])
+        if not previous:
+            continue
+        now, before = entry['latency_ms']['median'], previous['latency_ms']['median']
+        change = (now - before) / before * 100 if before else 0.0
+        print(f"{entry['scenario']:<40} {now:>10.1f} {before:>10.1f} {change:>+7.0f}% "
+              f"{entry['queries']:>8} {previous['queries']:>7}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark schedule generation on synthetic teams.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help='Team sizes (users)')
+    parser.add_argument('--years', type=int, nargs='+', default=DEFAULT_YEARS, help='Planning horizons in years')
+    parser.add_argument('--densities', type=int, nargs='+', default=DEFAULT_DENSITIES,
+                        help='Approved leave days per user per year')
+    parser.add_argument('--solver', default='greedy', help='Solver backend to benchmark')
+    parser.add_argument('--time-budget', type=float, default=None, help='Solver time budget in seconds')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per scenario (median is reported)')
+    parser.add_argument('--seed', type=int, default=1234, help='Seed for data and rotations')
+    parser.add_argument('--output', default='bench_results.json', help='Where to write the JSON results')
+    parser.add_argument('--compare', metavar='PATH', help='Earlier results file to compare against')
+    args = parser.parse_args()
+
+    app = create_app()
+    logging.getLogger().setLevel(logging.WARNING)
+
+    results = []
+    for size in args.sizes:
+        for years in args.years:
+            for density in args.densities:
+                entry = run_scenario(app, size, years, density, args.seed, args.solver, args.time_budget, args.repeat)
+                results.append(entry)
+                print(f"{entry['scenario']:<40} {entry['latency_ms']['median']:>9.1f} ms "
+                      f"{entry['queries']:>3} queries  load std {entry['fairness']['load_std']:.2f}")
+
+    report = {
+        'generated_at': datetime.utcnow().isoformat(timespec='seconds') + 'Z',
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'seed': args.seed,
+        'results': results,
+    }
+    with open(args.output, 'w', encoding='utf-8') as handle:
+        json.dump(report, handle, indent=2)
+    print(f"Results written to {args.output}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,328 @@
+"""
+Bulk schedule import with conflict detection.
+
+Rows (from JSON or CSV) are validated, checked for overlaps in one sweep per
+user against each other and against the stored schedules, and then written
+in batches: new shifts as multi-row INSERTs, changed shifts through the unit
+of work so the analytics and cache hooks see both the old and new times.
+"""
+import csv
+import heapq
+import io
+from collections import defaultdict
+
+from sqlalchemy import insert
+
+from extensions import db
+from models import Schedule, User
+from utils import parse_iso_utc
+
+# Largest import accepted in one request, and rows per INSERT/lookup statement.
+MAX_BULK_ROWS = 50000
+BULK_BATCH_SIZE = 1000
+
+MODES = ('insert', 'upsert')
+ON_CONFLICT = ('reject', 'skip')
+
+
+class ImportRow:
+    """One submitted shift and everything found wrong with it."""
+
+    __slots__ = ('row', 'schedule_id', 'user_id', 'username', 'start_time', 'end_time', 'errors', 'conflicts', 'action')
+
+    def __init__(self, row, schedule_id=None, user_id=None, username=None, start_time=None, end_time=None):
+        self.row = row
+        self.schedule_id = schedule_id
+        self.user_id = user_id
+        self.username = username
+        self.start_time = start_time
+        self.end_time = end_time
+        self.errors = []
+        self.conflicts = []
+        self.action = None
+
+    @property
+    def ok(self):
+        return not self.errors and not self.conflicts
+
+    def report(self):
+        entry = {'row': self.row, 'errors': self.errors, 'conflicts': self.conflicts}
+        if self.schedule_id is not None:
+            entry['id'] = self.schedule_id
+        return entry
+
+
+def _parse_row(row_number, values):
+    """Build an ImportRow from a dict of raw values, recording parse errors on it."""
+    row = ImportRow(row_number)
+    for key in ('id', 'user_id'):
+        raw = values.get(key)
+        if raw not in (None, ''):
+            try:
+                setattr(row, 'schedule_id' if key == 'id' else key, int(raw))
+            except (TypeError, ValueError):
+                row.errors.append(f'{key} must be an integer')
+    row.username = (str(values.get('username') or '')).strip() or None
+    if row.user_id is None and row.username is None and not row.errors:
+        row.errors.append('user_id or username is required')
+    for key in ('start_time', 'end_time'):
+        raw = values.get(key)
+        if not raw:
+            row.errors.append(f'{key} is required')
+            continue
+        try:
+            setattr(row, key, parse_iso_utc(str(raw).strip()))
+        except ValueError:
+            row.errors.append(f'{key} must be an ISO 8601 timestamp')
+    if row.start_time and row.end_time and row.end_time <= row.start_time:
+        row.errors.append('end_time must be after start_time')
+    return row
+
+
+def rows_from_json(items):
+    """
+    Parse a JSON list of {id?, user_id | username, start_time, end_time} objects.
+
+    Rows are numbered from 1 in list order.
+    """
+    if not isinstance(items, list):
+        raise ValueError('schedules must be a list')
+    if len(items) > MAX_BULK_ROWS:
+        raise ValueError(f'At most {MAX_BULK_ROWS} schedules per request')
+    rows = []
+    for number, item in enumerate(items, start=1):
+        if isinstance(item, dict):
+            rows.append(_parse_row(number, item))
+        else:
+            row = ImportRow(number)
+            row.errors.append('each schedule must be an object')
+            rows.append(row)
+    return rows
+
+
+def rows_from_csv(text):
+    """
+    Parse CSV with a header of id?, user_id and/or username, start_time, end_time.
+
+    Rows are numbered by file line, so the first data row is 2.
+    """
+    reader = csv.DictReader(io.StringIO(text))
+    if not reader.fieldnames or not {'start_time', 'end_time'} <= set(reader.fieldnames):
+        raise ValueError('CSV header must include start_time, end_time and user_id or username')
+    rows = []
+    for line, values in enumerate(reader, start=2):
+        if len(rows) == MAX_BULK_ROWS:
+            raise ValueError(f'At most {MAX_BULK_ROWS} schedules per request')
+        rows.append(_parse_row(line, values))
+    return rows
+
+
+def _chunks(values, size=BULK_BATCH_SIZE):
+    values = list(values)
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def _resolve_users(rows):
+    """Fill in user_id from username (and check given user_ids exist) with one IN query per batch."""
+    usernames = {row.username for row in rows if row.username and row.user_id is None and not row.errors}
+    user_ids = {row.user_id for row in rows if row.user_id is not None and not row.errors}
+    by_name, known_ids = {}, set()
+    for batch in _chunks(usernames):
+        by_name.update(db.session.query(User.username, User.id).filter(User.username.in_(batch)))
+    for batch in _chunks(user_ids):
+        known_ids.update(user_id for user_id, in db.session.query(User.id).filter(User.id.in_(batch)))
+    for row in rows:
+        if row.errors:
+            continue
+        if row.user_id is None:
+            row.user_id = by_name.get(row.username)
+            if row.user_id is None:
+                row.errors.append(f"unknown username '{row.username}'")
+        elif row.user_id not in known_ids:
+            row.errors.append(f'unknown user_id {row.user_id}')
+
+
+def _load_existing(rows):
+    """Stored schedules of the imported users overlapping the imported period, plus any rows named by id."""
+    valid = [row for row in rows if not row.errors]
+    if not valid:
+        return {}
+    start = min(row.start_time for row in valid)
+    end = max(row.end_time for row in valid)
+    existing = {}
+    for batch in _chunks({row.user_id for row in valid}):
+        for schedule in db.session.query(Schedule).filter(
+            Schedule.user_id.in_(batch), Schedule.start_time < end, Schedule.end_time > start
+        ):
+            existing[schedule.id] = schedule
+    missing = {row.schedule_id for row in valid if row.schedule_id is not None} - existing.keys()
+    for batch in _chunks(missing):
+        for schedule in db.session.query(Schedule).filter(Schedule.id.in_(batch)):
+            existing[schedule.id] = schedule
+    return existing
+
+
+def _assign_actions(rows, existing, mode):
+    """Decide create/update for each valid row; an update replaces the stored interval."""
+    by_start = {(schedule.user_id, schedule.start_time): schedule for schedule in existing.values()}
+    claimed = {}
+    for row in rows:
+        if row.errors:
+            continue
+        if row.schedule_id is not None:
+            if row.schedule_id not in existing:
+                row.errors.append(f'schedule {row.schedule_id} does not exist')
+                continue
+        elif mode == 'upsert':
+            match = by_start.get((row.user_id, row.start_time))
+            if match is not None and match.id not in claimed:
+                row.schedule_id = match.id
+        if row.schedule_id is None:
+            row.action = 'create'
+        elif row.schedule_id in claimed:
+            row.errors.append(f'schedule {row.schedule_id} is also updated by row {claimed[row.schedule_id].row}')
+        else:
+            claimed[row.schedule_id] = row
+            row.action = 'update'
+    return claimed
+
+
+def find_conflicts(rows, existing, replaced):
+    """
+    Record every overlap involving an imported row, per user, with one sorted sweep.
+
+    Intervals are half-open, so back-to-back shifts do not conflict. Overlaps
+    between two stored schedules are pre-existing and not reported, and
+    neither is an update row overlapping the stored schedule it updates.
+
+    :param rows: ImportRows with actions assigned
+    :param existing: Stored schedules by ID
+    :param replaced: IDs of stored schedules whose current interval is left out,
+                     because an accepted row updates them
+    """
+    per_user = defaultdict(list)
+    for schedule in existing.values():
+        if schedule.id not in replaced:
+            per_user[schedule.user_id].append((schedule.start_time, schedule.end_time, 0, schedule.id, None))
+    for row in rows:
+        if row.action:
+            per_user[row.user_id].append((row.start_time, row.end_time, 1, row.row, row))
+
+    for intervals in per_user.values():
+        if not any(interval[4] for interval in intervals):
+            continue
+        intervals.sort(key=lambda interval: (interval[0], interval[1], interval[2], interval[3]))
+        active = []  # heap of (end_time, tiebreak, interval) still open at the sweep position
+        for counter, interval in enumerate(intervals):
+            start, end, _, _, row = interval
+            while active and active[0][0] <= start:
+                heapq.heappop(active)
+            for _, _, other in active:
+                other_row = other[4]
+                if _same_schedule(interval, other):
+                    continue
+                if row is not None:
+                    row.conflicts.append(_describe(other))
+                if other_row is not None:
+                    other_row.conflicts.append(_describe(interval))
+            heapq.heappush(active, (end, counter, interval))
+
+
+def _same_schedule(interval, other):
+    """True for an update row paired with the stored schedule it updates."""
+    row, other_row = interval[4], other[4]
+    if row is not None and other_row is None:
+        return row.schedule_id == other[3]
+    if row is None and other_row is not None:
+        return other_row.schedule_id == interval[3]
+    return False
+
+
+def parse_flag(value):
+    """
+    Parse a boolean option given as a JSON bool or a form/query string.
+
+    :raises ValueError: For anything but a bool, '1'/'true'/'yes' or '0'/'false'/'no'/''
+    """
+    if value is None or isinstance(value, bool):
+        return bool(value)
+    if isinstance(value, str):
+        if value.strip().lower() in ('1', 'true', 'yes'):
+            return True
+        if value.strip().lower() in ('0', 'false', 'no', ''):
+            return False
+    raise ValueError(f'Invalid boolean value: {value!r}')
+
+
+def _describe(interval):
+    start, end, imported, key, _ = interval
+    entry = {'row': key} if imported else {'schedule_id': key}
+    entry.update({'start_time': start.isoformat(), 'end_time': end.isoformat()})
+    return entry
+
+
+def import_schedules(rows, mode='insert', on_conflict='reject', dry_run=False):
+    """
+    Validate, conflict-check and write a batch of shifts.
+
+    :param rows: ImportRows from rows_from_json() or rows_from_csv()
+    :param mode: 'insert' creates every row (rows with an id update that schedule);
+                 'upsert' also updates the user's stored schedule starting at the same time
+    :param on_conflict: 'reject' writes nothing if any row is invalid or conflicts;
+                        'skip' writes the clean rows and reports the rest
+    :param dry_run: Check only, never write
+    :return: Report dict with counts and the per-row problems
+    """
+    _resolve_users(rows)
+    existing = _load_existing(rows)
+    claimed = _assign_actions(rows, existing, mode)
+    # A stored schedule only leaves the sweep if the row updating it is accepted. Dropping a
+    # rejected update brings its stored interval back, which can reject more rows, so sweep
+    # again until the set of replaced schedules stops shrinking.
+    replaced = set(claimed)
+    while True:
+        for row in rows:
+            row.conflicts = []
+        find_conflicts(rows, existing, replaced)
+        accepted_updates = {schedule_id for schedule_id in replaced if claimed[schedule_id].ok}
+        if accepted_updates == replaced:
+            break
+        replaced = accepted_updates
+
+    rejected = [row for row in rows if not row.ok]
+    accepted = [row for row in rows if row.ok]
+    write = not dry_run and (on_conflict == 'skip' or not rejected)
+    created = [row for row in accepted if row.action == 'create']
+    updated = [row for row in accepted if row.action == 'update']
+
+    if write and accepted:
+        try:
+            for batch in _chunks(created):
+                db.session.execute(insert(Schedule), [
+                    {'user_id': row.user_id, 'start_time': row.start_time, 'end_time': row.end_time} for row in batch
+                ])
+            for row in updated:
+                schedule = existing[row.schedule_id]
+                schedule.user_id = row.user_id
+                schedule.start_time = row.start_time
+                schedule.end_time = row.end_time
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+    else:
+        # Nothing is written; release the rows loaded for the check.
+        db.session.rollback()
+
+    # A dry run reports what the real run would write: nothing if on_conflict='reject' and a row failed.
+    counted = write or (dry_run and (on_conflict == 'skip' or not rejected))
+    return {
+        'written': write and bool(accepted),
+        'dry_run': dry_run,
+        'received': len(rows),
+        'created': len(created) if counted else 0,
+        'updated': len(updated) if counted else 0,
+        'rejected': len(rejected),
+        'problems': [row.report() for row in rejected],
+    }
@@ -0,0 +1,80 @@
+from time import monotonic
+import threading
+
+from flask import g, has_app_context
+
+_MISSING = object()
+
+# Every LocalCache registers itself here so its stats can be reported in one place.
+CACHES = {}
+
+
+class LocalCache:
+    """
+    Small thread-safe in-process cache with hit/miss counters.
+
+    Values are computed by the `loader` passed to get() and kept until they are
+    invalidated or, when `ttl` is set, until they are `ttl` seconds old. The TTL
+    bounds staleness in worker processes that never see an invalidation.
+
+    Every invalidate() bumps a generation counter; a load that was already
+    running when it happened returns its value but does not store it, so a
+    pre-invalidation value is never served afterwards.
+    """
+
+    def __init__(self, name, ttl=None):
+        self.name = name
+        self.ttl = ttl
+        self._data = {}
+        self._lock = threading.Lock()
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+        CACHES[name] = self
+
+    def get(self, key, loader):
+        """
+        Return the cached value for `key`, calling loader(key) on a miss.
+
+        :param key: Hashable cache key
+        :param loader: Callable taking the key and returning the value to cache
+        """
+        entry = self._data.get(key)
+        if entry is not None and (entry[1] is None or entry[1] > monotonic()):
+            self.hits += 1
+            return entry[0]
+        self.misses += 1
+        generation = self._generation
+        value = loader(key)
+        expires = monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            if generation == self._generation:
+                self._data[key] = (value, expires)
+        return value
+
+    def invalidate(self, key=_MISSING):
+        """Forget `key`, or everything when no key is given."""
+        with self._lock:
+            self._generation += 1
+            if key is _MISSING:
+                self._data.clear()
+            else:
+                self._data.pop(key, None)
+
+    def stats(self):
+        return {'name': self.name, 'size': len(self._data), 'hits': self.hits, 'misses': self.misses, 'ttl': self.ttl}
+
+
+def request_memo(namespace, key, loader):
+    """
+    Memoize loader(key) for the rest of the current request.
+
+    Outside an application context the loader is simply called.
+    """
+    if not has_app_context():
+        return loader(key)
+    memo = g.setdefault('_request_memo', {}).setdefault(namespace, {})
+    value = memo.get(key, _MISSING)
+    if value is _MISSING:
+        value = memo[key] = loader(key)
+    return value
@@ -0,0 +1,61 @@
+"""
+Nightly on-call coverage check.
+
+    python check_coverage.py                          # the next 30 days, all teams
+    python check_coverage.py --days 365 --team 3      # a year ahead for one team
+    python check_coverage.py --min-gap 60 --json      # ignore gaps under an hour, JSON output
+
+Reports uncovered windows, double-booked users and shifts that overlap approved
+time off. Exits with status 1 when anything is found, so a scheduler (cron, a
+CI job) can alert on it.
+"""
+import argparse
+import json
+import sys
+from datetime import date, datetime, timedelta
+
+from app import create_app
+from shift_coverage import analyze_coverage, COVERAGE_DEFAULT_DAYS, COVERAGE_MAX_DAYS
+
+
+def parse_date(value):
+    return datetime.strptime(value, '%Y-%m-%d').date()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check upcoming on-call coverage for gaps and conflicts.')
+    parser.add_argument('--start', type=parse_date, default=None, help='First day to check (YYYY-MM-DD, default: today)')
+    parser.add_argument('--days', type=int, default=COVERAGE_DEFAULT_DAYS,
+                        help=f'Number of days to check (default: {COVERAGE_DEFAULT_DAYS}, max {COVERAGE_MAX_DAYS})')
+    parser.add_argument('--team', dest='team_ids', type=int, action='append', default=[],
+                        help='Team ID to include; repeat for several teams (default: all teams)')
+    parser.add_argument('--min-gap', type=int, default=0, help='Ignore uncovered windows shorter than this many minutes')
+    parser.add_argument('--json', action='store_true', help='Print the full report as JSON')
+    args = parser.parse_args()
+    if not 1 <= args.days <= COVERAGE_MAX_DAYS:
+        parser.error(f'--days must be between 1 and {COVERAGE_MAX_DAYS}')
+
+    start_date = args.start or date.today()
+    end_date = start_date + timedelta(days=args.days - 1)
+    app = create_app()
+    with app.app_context():
+        report = analyze_coverage(start_date, end_date, args.team_ids, timedelta(minutes=args.min_gap))
+
+    totals = report['totals']
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print(f"Coverage {start_date} to {end_date}, {totals['teams']} teams, {totals['shifts']} shifts")
+        print(f"{'Team':<30} {'Covered %':>10} {'Gaps':>6} {'Gap h':>8} {'Double':>7} {'On leave':>9}")
+        for team in report['teams']:
+            gap_hours = sum(gap['hours'] for gap in team['gaps'])
+            print(f"{team['team_name']:<30} {team['coverage_pct']:>10.1f} {len(team['gaps']):>6} {gap_hours:>8.1f} "
+                  f"{len(team['double_booked']):>7} {len(team['leave_conflicts']):>9}")
+        print(f"{totals['gaps']} gaps ({totals['gap_hours']:.1f} h), {totals['double_booked']} double bookings, "
+              f"{totals['leave_conflicts']} leave conflicts in {report['total_ms']:.0f} ms.")
+    if totals['gaps'] or totals['double_booked'] or totals['leave_conflicts']:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
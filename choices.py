@@ -0,0 +1,153 @@
+"""
+Cached choice lists for the forms in forms.py.
+
+Each provider loads its (value, label) pairs with one column-only query and
+shares the resulting tuple between every form instance until a committed
+change touches one of its models. Lists that grow with headcount (any user
+for a schedule) are not preloaded at all: those fields use search_users()
+through a searchable picker and only carry the selected option.
+"""
+import logging
+
+import pytz
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from caching import LocalCache
+from extensions import db
+from listings import user_search_filter
+from models import Role, Team, TeamColor, User
+
+logger = logging.getLogger(__name__)
+
+# Built once; SelectField accepts any sequence, so forms share this tuple instead of copying a list.
+TIMEZONE_CHOICES = tuple((tz, tz) for tz in pytz.all_timezones)
+# Role IDs whose users are offered by manager_choices (Admin and Manager in setup.py).
+MANAGER_ROLE_IDS = (1, 2)
+USER_SEARCH_LIMIT = 20
+USER_SEARCH_MAX_LIMIT = 100
+
+PROVIDERS = []
+
+
+class ChoiceProvider:
+    """
+    A choice list loaded once and shared until one of `models` changes.
+
+    Entries are keyed by a version number that invalidate() bumps, so a load
+    that was already running when the data changed is stored under the old
+    version and never served. The TTL bounds staleness in other worker
+    processes, which do not see this process's commits.
+
+    :param name: Cache name, reported in cache stats
+    :param loader: Callable returning an iterable of (value, label) pairs
+    :param models: Model classes whose changes invalidate the list
+    :param ttl: Seconds before the list is reloaded regardless
+    """
+
+    def __init__(self, name, loader, models, ttl=300):
+        self.loader = loader
+        self.models = tuple(models)
+        self.version = 0
+        self._cache = LocalCache(f'choices.{name}', ttl=ttl)
+        PROVIDERS.append(self)
+
+    def __call__(self):
+        return self._cache.get(self.version, self._load)
+
+    def _load(self, version):
+        return tuple((value, label) for value, label in self.loader())
+
+    def invalidate(self):
+        self.version += 1
+        self._cache.invalidate()
+
+
+role_choices = ChoiceProvider(
+    'roles', lambda: db.session.query(Role.id, Role.name).order_by(Role.id), [Role])
+
+team_choices = ChoiceProvider(
+    'teams', lambda: [(0, 'No Team')] + db.session.query(Team.id, Team.name).order_by(Team.id).all(), [Team])
+
+manager_choices = ChoiceProvider(
+    'managers',
+    lambda: db.session.query(User.id, User.username).filter(User.role_id.in_(MANAGER_ROLE_IDS)).order_by(User.id),
+    [User])
+
+color_choices = ChoiceProvider(
+    'colors', lambda: db.session.query(TeamColor.id, TeamColor.hex_value).order_by(TeamColor.id), [TeamColor])
+
+
+def user_label(user):
+    """Option text for a user in pickers: 'username (First Last)'."""
+    full_name = ' '.join(part for part in (user.first_name, user.last_name) if part)
+    return f'{user.username} ({full_name})' if full_name else user.username
+
+
+def search_users(query='', after=None, limit=USER_SEARCH_LIMIT):
+    """
+    One page of users whose username, first name, last name or email starts with `query`.
+
+    Pages are keyed on username (unique), so each page is a range read no
+    matter how deep the caller has scrolled.
+
+    :param query: Case-insensitive prefix; empty matches everyone
+    :param after: Username of the last user on the previous page
+    :param limit: Page size, capped at USER_SEARCH_MAX_LIMIT
+    :return: (list of user dicts, username to pass as `after` for the next page or None)
+    """
+    limit = max(1, min(limit, USER_SEARCH_MAX_LIMIT))
+    rows = db.session.query(
+        User.id, User.username, User.first_name, User.last_name, User.email, User.is_active
+    )
+    if query:
+        rows = rows.filter(user_search_filter(query))
+    if after:
+        rows = rows.filter(User.username > after)
+    rows = rows.order_by(User.username).limit(limit + 1).all()
+
+    users = [{
+        'id': row.id,
+        'username': row.username,
+        'name': ' '.join(part for part in (row.first_name, row.last_name) if part),
+        'email': row.email,
+        'is_active': row.is_active,
+        'label': user_label(row),
+    } for row in rows[:limit]]
+    next_after = users[-1]['username'] if len(rows) > limit else None
+    return users, next_after
+
+
+def _stale_providers(objects):
+    return {provider for provider in PROVIDERS for obj in objects if isinstance(obj, provider.models)}
+
+
+@event.listens_for(Session, 'after_flush')
+def _mark_choice_changes(session, flush_context):
+    stale = _stale_providers(session.new) | _stale_providers(session.dirty) | _stale_providers(session.deleted)
+    if stale:
+        session.info.setdefault('stale_choices', set()).update(stale)
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _mark_choice_bulk_changes(orm_execute_state):
+    # Bulk insert()/update()/delete() and Query.delete() bypass the flush.
+    if orm_execute_state.is_select:
+        return
+    mapper = orm_execute_state.bind_mapper
+    if mapper is None:
+        return
+    stale = {provider for provider in PROVIDERS if issubclass(mapper.class_, provider.models)}
+    if stale:
+        orm_execute_state.session.info.setdefault('stale_choices', set()).update(stale)
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_choices_on_commit(session):
+    for provider in session.info.pop('stale_choices', ()):
+        provider.invalidate()
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _discard_choices_on_rollback(session, previous_transaction):
+    session.info.pop('stale_choices', None)
@@ -0,0 +1,76 @@
+from time import perf_counter
+import os
+import threading
+
+from sqlalchemy.pool import QueuePool
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that records how long callers wait to check out a connection."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._wait_lock = threading.Lock()
+        self.wait_count = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def _do_get(self):
+        started = perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            waited = perf_counter() - started
+            with self._wait_lock:
+                self.wait_count += 1
+                self.wait_total += waited
+                if waited > self.wait_max:
+                    self.wait_max = waited
+
+
+def engine_options(database_url, environ=os.environ):
+    """
+    Build SQLALCHEMY_ENGINE_OPTIONS from the environment.
+
+    Connection health is handled by the pool (pre-ping on checkout, recycle
+    after DB_POOL_RECYCLE seconds) rather than by probing on every request.
+    Size DB_POOL_SIZE + DB_MAX_OVERFLOW to the server's worker threads
+    (waitress defaults to 4).
+
+    :param database_url: SQLAlchemy database URL
+    :param environ: Mapping to read DB_POOL_* settings from
+    :return: Dict of create_engine() keyword arguments
+    """
+    options = {
+        'pool_pre_ping': environ.get('DB_POOL_PRE_PING', 'true').lower() in ('1', 'true', 'yes'),
+        'pool_recycle': int(environ.get('DB_POOL_RECYCLE', 1800)),
+    }
+    # SQLite uses its own single-connection pools, which take none of the sizing arguments.
+    if not database_url.startswith('sqlite'):
+        options.update({
+            'poolclass': TimedQueuePool,
+            'pool_size': int(environ.get('DB_POOL_SIZE', 5)),
+            'max_overflow': int(environ.get('DB_MAX_OVERFLOW', 10)),
+            'pool_timeout': float(environ.get('DB_POOL_TIMEOUT', 30)),
+        })
+    return options
+
+
+def pool_stats(engine):
+    """Checked-in/out connections, overflow and checkout wait times for the engine's pool."""
+    pool = engine.pool
+    stats = {'pool': type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        stats.update({
+            'size': pool.size(),
+            'checked_in': pool.checkedin(),
+            'checked_out': pool.checkedout(),
+            'overflow': pool.overflow(),
+        })
+    if isinstance(pool, TimedQueuePool):
+        stats.update({
+            'checkouts': pool.wait_count,
+            'wait_avg_ms': round(pool.wait_total / pool.wait_count * 1000, 3) if pool.wait_count else 0.0,
+            'wait_max_ms': round(pool.wait_max * 1000, 3),
+        })
+    return stats
@@ -0,0 +1,153 @@
+"""
+Run EXPLAIN on the hot schedule/time-off/activity queries and report index usage.
+
+    python explain_queries.py              # plans only
+    python explain_queries.py --analyze    # EXPLAIN ANALYZE (Postgres; executes the queries)
+    python explain_queries.py --query calendar_range --query on_call_now
+
+On Postgres a "Seq Scan" on a large table means the index is not being used;
+on tiny tables the planner may still prefer a sequential scan, so check
+against production-sized data.
+"""
+import argparse
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, select
+
+from extensions import db
+from models import Note, Schedule, Team, TimeOffRequest, User, UserActivity
+from listings import schedule_listing_query, user_listing_query
+from shift_coverage import coverage_leave_query, coverage_shift_query
+from utils import hours_between
+
+WATCHED_TABLES = ['schedule', 'time_off_request', 'user_activity', 'note', 'users']
+
+
+def hot_queries(user_id, team_id, now):
+    """The statements behind the dashboard, calendar, analytics, reports and scheduler."""
+    month_ago = now - timedelta(days=30)
+    year_ahead = now + timedelta(days=365)
+    return {
+        'on_call_now': select(User.id).join(Schedule, Schedule.user_id == User.id).where(
+            Schedule.start_time <= now, Schedule.end_time >= now
+        ),
+        'calendar_range': select(Schedule.id, Schedule.start_time, Schedule.end_time, User.username).join(
+            User, Schedule.user_id == User.id
+        ).where(Schedule.start_time < now + timedelta(days=42), Schedule.end_time > now),
+        'upcoming_user_schedules': select(Schedule).where(
+            Schedule.user_id == user_id, Schedule.end_time >= now
+        ).order_by(Schedule.start_time),
+        'rotation_on_call_hours': select(
+            Schedule.user_id, func.sum(hours_between(Schedule.start_time, Schedule.end_time))
+        ).where(
+            Schedule.user_id.in_([user_id]), Schedule.start_time >= now, Schedule.end_time <= year_ahead
+        ).group_by(Schedule.user_id),
+        'rotation_time_off': select(TimeOffRequest.user_id, TimeOffRequest.start_date, TimeOffRequest.end_date).where(
+            TimeOffRequest.user_id.in_([user_id]),
+            TimeOffRequest.start_date <= year_ahead.date(),
+            TimeOffRequest.end_date >= now.date(),
+            TimeOffRequest.status == 'Approved'
+        ),
+        'analytics_user_hours': select(
+            User.username, func.sum(hours_between(Schedule.start_time, Schedule.end_time))
+        ).join(Schedule, Schedule.user_id == User.id).where(
+            Schedule.start_time >= month_ago, Schedule.end_time <= now
+        ).group_by(User.username),
+        'analytics_team_hours': select(
+            Team.name, func.sum(hours_between(Schedule.start_time, Schedule.end_time))
+        ).join(User, User.team_id == Team.id).join(Schedule, Schedule.user_id == User.id).where(
+            Schedule.start_time >= month_ago, Schedule.end_time <= now
+        ).group_by(Team.name),
+        'analytics_time_off_status': select(TimeOffRequest.status, func.count(TimeOffRequest.id)).where(
+            TimeOffRequest.start_date >= month_ago.date(), TimeOffRequest.end_date <= now.date()
+        ).group_by(TimeOffRequest.status),
+        'analytics_logins': select(User.username, func.count(UserActivity.id)).join(
+            UserActivity, UserActivity.user_id == User.id
+        ).where(
+            UserActivity.timestamp >= month_ago,
+            UserActivity.timestamp <= now,
+            UserActivity.activity_type == 'login'
+        ).group_by(User.username),
+        'team_notes': select(Note).where(Note.team_id == team_id, Note.is_archived.is_(False)).order_by(
+            Note.created_at.desc()
+        ),
+        'team_members': select(User.id).where(User.team_id == team_id),
+        'manage_schedule_page': schedule_listing_query(start=month_ago).where(Schedule.start_time <= now).limit(51),
+        'manage_users_page': user_listing_query(active=True).limit(51),
+        'user_prefix_search': user_listing_query(active=True, query='smi').limit(51),
+        'coverage_shifts': coverage_shift_query(now, year_ahead),
+        'coverage_time_off': coverage_leave_query(now, year_ahead),
+    }
+
+
+def explain(statement, analyze=False):
+    """Return the plan lines for `statement` on the app's engine."""
+    engine = db.engine
+    compiled = statement.compile(dialect=engine.dialect, compile_kwargs={'render_postcompile': True})
+    params = compiled.params
+    if engine.dialect.positional:
+        params = tuple(compiled.params[name] for name in compiled.positiontup)
+
+    if engine.dialect.name == 'postgresql':
+        prefix = 'EXPLAIN (ANALYZE, BUFFERS)' if analyze else 'EXPLAIN'
+    elif engine.dialect.name == 'sqlite':
+        prefix = 'EXPLAIN QUERY PLAN'
+    else:
+        prefix = 'EXPLAIN'
+
+    with engine.connect() as connection:
+        rows = connection.exec_driver_sql(f'{prefix} {compiled}', params).fetchall()
+    # SQLite returns (id, parent, notused, detail); everything else returns one text column.
+    return [str(row[-1]) for row in rows]
+
+
+def full_scans(plan, dialect_name):
+    """Watched tables that the plan reads without an index."""
+    scanned = []
+    for line in plan:
+        for table in WATCHED_TABLES:
+            if dialect_name == 'postgresql' and f'Seq Scan on {table}' in line:
+                scanned.append(table)
+            elif dialect_name == 'sqlite' and line.startswith(f'SCAN {table}') and 'USING' not in line:
+                scanned.append(table)
+    return sorted(set(scanned))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='EXPLAIN the hot queries and flag full table scans.')
+    parser.add_argument('--analyze', action='store_true', help='Use EXPLAIN ANALYZE on Postgres (runs the queries)')
+    parser.add_argument('--query', action='append', default=[], help='Only explain this query; repeatable')
+    args = parser.parse_args()
+
+    from app import create_app
+    app = create_app()
+    with app.app_context():
+        user_id = db.session.query(func.min(User.id)).scalar() or 1
+        team_id = db.session.query(func.min(Team.id)).scalar() or 1
+        queries = hot_queries(user_id, team_id, datetime.utcnow())
+        names = args.query or list(queries)
+        dialect_name = db.engine.dialect.name
+
+        flagged = []
+        for name in names:
+            if name not in queries:
+                print(f"Unknown query '{name}'. Available: {', '.join(queries)}")
+                continue
+            plan = explain(queries[name], analyze=args.analyze)
+            scans = full_scans(plan, dialect_name)
+            status = f"FULL SCAN: {', '.join(scans)}" if scans else 'index'
+            print(f"== {name} [{status}]")
+            for line in plan:
+                print(f"   {line}")
+            if scans:
+                flagged.append(name)
+
+        print()
+        if flagged:
+            print(f"{len(flagged)} of {len(names)} queries scan a watched table without an index: {', '.join(flagged)}")
+        else:
+            print(f"All {len(names)} queries use an index on the watched tables.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+import numpy as np
+
+WEEKEND_MULTIPLIER = 1.5
+HOLIDAY_MULTIPLIER = 2.0
+MAX_CONSECUTIVE_DAYS = 7
+STREAK_PENALTY = 0.5
+
+
+def day_weights(start_date, days, holidays=(), weekend_multiplier=WEEKEND_MULTIPLIER,
+                holiday_multiplier=HOLIDAY_MULTIPLIER):
+    """
+    Weight of one on-call day for each day of the period.
+
+    :param start_date: First day of the period
+    :param days: Number of days in the period
+    :param holidays: Iterable of dates that count as holidays
+    :param weekend_multiplier: Weight of a Saturday or Sunday
+    :param holiday_multiplier: Weight of a holiday (takes precedence over weekends)
+    :return: float32 array of shape (days,)
+    """
+    weekday = (np.arange(days) + start_date.weekday()) % 7
+    weights = np.where(weekday >= 5, weekend_multiplier, 1.0).astype(np.float32)
+
+    offsets = [(holiday - start_date).days for holiday in holidays]
+    offsets = [offset for offset in offsets if 0 <= offset < days]
+    if offsets:
+        weights[offsets] = holiday_multiplier
+    return weights
+
+
+def plan_matrix(blocks, user_ids, start, end):
+    """
+    Represent a plan as a users x days on-call matrix.
+
+    :param blocks: List of (user_id, start_ordinal, end_ordinal) tuples, end exclusive
+    :param user_ids: Row order of the matrix
+    :param start: First day ordinal of the period
+    :param end: Day ordinal just past the end of the period
+    :return: bool array of shape (len(user_ids), end - start)
+    """
+    rows = {user_id: row for row, user_id in enumerate(user_ids)}
+    matrix = np.zeros((len(user_ids), end - start), dtype=bool)
+    for user_id, block_start, block_end in blocks:
+        matrix[rows[user_id], max(block_start, start) - start:min(block_end, end) - start] = True
+    return matrix
+
+
+def weighted_load(matrices, weights):
+    """
+    Weighted on-call load per user.
+
+    :param matrices: Array of shape (..., users, days)
+    :param weights: Array of shape (days,) from day_weights
+    :return: float32 array of shape (..., users)
+    """
+    return matrices.astype(np.float32) @ weights
+
+
+def streak_excess(matrices, max_consecutive=MAX_CONSECUTIVE_DAYS):
+    """
+    Days each user spends on call beyond `max_consecutive` in a row.
+
+    Counts the windows of max_consecutive + 1 days that are fully on call,
+    which equals the number of excess days across all of a user's streaks.
+
+    :param matrices: Array of shape (..., users, days)
+    :param max_consecutive: Longest streak that is not penalised
+    :return: int32 array of shape (..., users)
+    """
+    window = max_consecutive + 1
+    if matrices.shape[-1] < window:
+        return np.zeros(matrices.shape[:-1], dtype=np.int32)
+    padded = np.zeros(matrices.shape[:-1] + (matrices.shape[-1] + 1,), dtype=np.int32)
+    np.cumsum(matrices, axis=-1, dtype=np.int32, out=padded[..., 1:])
+    window_sums = padded[..., window:] - padded[..., :-window]
+    return np.count_nonzero(window_sums == window, axis=-1).astype(np.int32)
+
+
+def score_plans(matrices, weights, baseline=None, max_consecutive=MAX_CONSECUTIVE_DAYS,
+                streak_penalty=STREAK_PENALTY):
+    """
+    Score one or many candidate plans; lower is fairer.
+
+    The score is the standard deviation of weighted load across users (plus
+    any load they already carry) and a penalty per excess streak day.
+
+    :param matrices: Array of shape (users, days) or (plans, users, days)
+    :param weights: Array of shape (days,) from day_weights
+    :param baseline: Optional array of shape (users,) with existing load in weighted days
+    :param max_consecutive: Longest streak that is not penalised
+    :param streak_penalty: Score added per excess streak day
+    :return: float score, or float64 array of shape (plans,)
+    """
+    loads = weighted_load(matrices, weights)
+    if baseline is not None:
+        loads = loads + baseline
+    excess = streak_excess(matrices, max_consecutive).sum(axis=-1)
+    return loads.std(axis=-1) + streak_penalty * excess
+
+
+def fairness_metrics(blocks, user_ids, start_date, end_date, holidays=()):
+    """
+    Summary fairness numbers for a generated plan.
+
+    :param blocks: List of (user_id, start_ordinal, end_ordinal) tuples
+    :param user_ids: IDs of the users in the rotation
+    :param start_date: First day of the period
+    :param end_date: Last day of the period (inclusive)
+    :param holidays: Iterable of holiday dates
+    :return: Dict with score, load spread and streak excess
+    """
+    start, end = start_date.toordinal(), end_date.toordinal() + 1
+    matrix = plan_matrix(blocks, user_ids, start, end)
+    weights = day_weights(start_date, end - start, holidays)
+    loads = weighted_load(matrix, weights)
+    return {
+        'score': float(score_plans(matrix, weights)),
+        'load_min': float(loads.min()) if loads.size else 0.0,
+        'load_max': float(loads.max()) if loads.size else 0.0,
+        'load_mean': float(loads.mean()) if loads.size else 0.0,
+        'load_std': float(loads.std()) if loads.size else 0.0,
+        'streak_excess_days': int(streak_excess(matrix).sum()),
+        'uncovered_days': int((~matrix.any(axis=0)).sum()),
+    }
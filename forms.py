@@ -1,8 +1,9 @@
 from flask_wtf import FlaskForm
 from wtforms import StringField, SelectField, BooleanField, PasswordField
 from wtforms.validators import DataRequired, Email, Optional, Length, ValidationError
-from models import Role, Team, TeamColor, User
-import pytz
+from choices import TIMEZONE_CHOICES, role_choices, team_choices, manager_choices, color_choices, user_label
+from extensions import db
+from models import User
 
 class PhoneNumberField(StringField):
     def process_formdata(self, valuelist):
@@ -22,7 +23,7 @@ class UserForm(FlaskForm):
     email = StringField('Email', validators=[DataRequired(), Email()])
     work_phone = PhoneNumberField('Work Phone', validators=[Optional()])
     mobile_phone = PhoneNumberField('Mobile Phone', validators=[Optional()])
-    timezone = SelectField('Timezone', choices=[(tz, tz) for tz in pytz.all_timezones], validators=[DataRequired()])
+    timezone = SelectField('Timezone', validators=[DataRequired()])
     role_id = SelectField('Role', coerce=int, validators=[DataRequired()])
     team_id = SelectField('Team', coerce=int, validators=[Optional()])
     is_active = BooleanField('Active')
@@ -30,8 +31,9 @@ class UserForm(FlaskForm):
 
     def __init__(self, *args, **kwargs):
         super(UserForm, self).__init__(*args, **kwargs)
-        self.role_id.choices = [(role.id, role.name) for role in Role.query.all()]
-        self.team_id.choices = [(0, 'No Team')] + [(team.id, team.name) for team in Team.query.all()]
+        self.timezone.choices = TIMEZONE_CHOICES
+        self.role_id.choices = role_choices()
+        self.team_id.choices = team_choices()
     
 class TeamForm(FlaskForm):
     name = StringField('Name', validators=[DataRequired()])
@@ -40,23 +42,38 @@ class TeamForm(FlaskForm):
 
     def __init__(self, *args, **kwargs):
         super(TeamForm, self).__init__(*args, **kwargs)
-        self.manager_id.choices = [(user.id, user.username) for user in User.query.filter(User.role_id.in_([1, 2])).all()]
-        self.color_id.choices = [(color.id, color.hex_value) for color in TeamColor.query.all()]
+        self.manager_id.choices = manager_choices()
+        self.color_id.choices = color_choices()
 
 class ScheduleForm(FlaskForm):
-    user_id = SelectField('User', validators=[Optional()], coerce=int)
+    # Any user can be scheduled, so the options come from the user search endpoint
+    # (see choices.search_users) and only the selected user is rendered.
+    user_id = SelectField('User', validators=[Optional()], coerce=int, validate_choice=False)
     start_time = StringField('Start Time', validators=[DataRequired()])
     end_time = StringField('End Time', validators=[DataRequired()])
 
     def __init__(self, *args, **kwargs):
         super(ScheduleForm, self).__init__(*args, **kwargs)
-        self.user_id.choices = [(user.id, user.username) for user in User.query.all()]
+        self.user_id.choices = []
+
+    def validate_user_id(self, field):
+        user = db.session.get(User, field.data)
+        if user is None:
+            raise ValidationError('Not a valid choice.')
+        field.choices = [(user.id, user_label(user))]
 
 class TimeoffForm(FlaskForm):
-    user_id = SelectField('User', validators=[DataRequired()], coerce=int)
+    # Any user can request time off, so the requester is checked by ID rather than against a choice list.
+    user_id = SelectField('User', validators=[DataRequired()], coerce=int, validate_choice=False)
     start_time = StringField('Start Time', validators=[DataRequired()])
     end_time = StringField('End Time', validators=[DataRequired()])
 
     def __init__(self, *args, **kwargs):
         super(TimeoffForm, self).__init__(*args, **kwargs)
-        self.user_id.choices = [(user.id, user.username) for user in User.query.filter(User.role_id.in_([1, 2])).all()]
+        self.user_id.choices = []
+
+    def validate_user_id(self, field):
+        user = db.session.get(User, field.data)
+        if user is None:
+            raise ValidationError('Not a valid choice.')
+        field.choices = [(user.id, user_label(user))]
@@ -0,0 +1,62 @@
+import argparse
+import json
+from datetime import datetime
+from multiprocessing import get_all_start_methods
+
+
+def parse_date(value):
+    return datetime.strptime(value, '%Y-%m-%d').date()
+
+
+def generate_schedules(team_ids, start_date, end_date, max_workers=None, time_budget=None, solver=None, seed=None,
+                       as_json=False):
+    # Imported here so process pool workers that re-import this module do not build an app.
+    from app import create_app
+    from models import Team
+    from scheduling_algorithm import batch_generate_schedules, generation_options
+
+    app = create_app()
+    with app.app_context():
+        if not team_ids:
+            team_ids = [team_id for team_id, in Team.query.with_entities(Team.id).all()]
+        if not team_ids:
+            print("No teams found.")
+            return
+
+        options = generation_options(app.config)
+        if time_budget is not None:
+            options['time_budget'] = time_budget
+        if solver is not None:
+            options['solver'] = solver
+        # This script has no request threads, so its workers can be forked instead of spawned.
+        start_method = 'fork' if 'fork' in get_all_start_methods() else 'spawn'
+        report = batch_generate_schedules(team_ids, start_date, end_date, max_workers=max_workers, seed=seed,
+                                          start_method=start_method, **options)
+
+        if as_json:
+            print(json.dumps(report, indent=2))
+            return
+
+        print(f"{'Team':<30} {'Users':>6} {'Schedules':>10} {'Solve ms':>10}")
+        for team in report['teams']:
+            print(f"{team['team_name']:<30} {team['users']:>6} {team['schedules']:>10} {team['solve_ms']:>10.1f}")
+        print(f"Created {report['schedules_created']} schedules for {len(report['teams'])} teams.")
+        print(f"Load {report['load_ms']:.1f} ms, solve {report['solve_ms']:.1f} ms, "
+              f"insert {report['insert_ms']:.1f} ms, total {report['total_ms']:.1f} ms.")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Generate on-call schedules for many teams at once.')
+    parser.add_argument('start_date', type=parse_date, help='First day of the period (YYYY-MM-DD)')
+    parser.add_argument('end_date', type=parse_date, help='Last day of the period (YYYY-MM-DD)')
+    parser.add_argument('--team', dest='team_ids', type=int, action='append', default=[],
+                        help='Team ID to include; repeat for several teams (default: all teams)')
+    parser.add_argument('--workers', type=int, default=None, help='Process pool size (default: CPU count)')
+    parser.add_argument('--time-budget', type=float, default=None,
+                        help='Seconds per team to search for a fairer rotation (default: SCHEDULE_TIME_BUDGET)')
+    parser.add_argument('--solver', default=None, help='Solver backend, e.g. greedy or local_search (default: SCHEDULE_SOLVER)')
+    parser.add_argument('--seed', type=int, default=None, help='Random seed for reproducible rotations')
+    parser.add_argument('--json', action='store_true', help='Print the timing report as JSON')
+    args = parser.parse_args()
+    generate_schedules(args.team_ids, args.start_date, args.end_date, max_workers=args.workers,
+                       time_budget=args.time_budget, solver=args.solver, seed=args.seed, as_json=args.json)
@@ -0,0 +1,77 @@
+from collections import namedtuple
+import logging
+
+from flask_login import UserMixin
+
+from caching import LocalCache, request_memo
+from extensions import db
+from models import User, role_permission_names
+
+logger = logging.getLogger(__name__)
+
+RoleSnapshot = namedtuple('RoleSnapshot', ['id', 'name'])
+TeamSnapshot = namedtuple('TeamSnapshot', ['id', 'name'])
+
+# Identity snapshots per user ID. edit_user, activate_user, delete_user, edit_role, edit_team and delete_team
+# invalidate explicitly; the short TTL covers other worker processes.
+identity_cache = LocalCache('user_identity', ttl=60)
+
+
+class UserIdentity(UserMixin):
+    """
+    Read-only snapshot of the logged-in user, used as `current_user`.
+
+    Holds what nearly every request needs (name, role, team, timezone) so that
+    loading the user from the session costs no queries. Permission checks go
+    through the per-role permission cache. Any other attribute (relationships
+    such as `managed_teams`) is read from the real User row, loaded at most
+    once per request.
+    """
+
+    def __init__(self, user):
+        self.id = user.id
+        self.username = user.username
+        self.email = user.email
+        self.first_name = user.first_name
+        self.last_name = user.last_name
+        self.timezone = user.timezone
+        self.active = user.is_active
+        self.role_id = user.role_id
+        self.role = RoleSnapshot(user.role.id, user.role.name) if user.role else None
+        self.team_id = user.team_id
+        self.team = TeamSnapshot(user.team.id, user.team.name) if user.team else None
+
+    def __repr__(self):
+        return f'<UserIdentity {self.username}>'
+
+    @property
+    def is_active(self):
+        return self.active
+
+    def __getattr__(self, name):
+        # Only called for attributes the snapshot does not carry.
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return getattr(self.model(), name)
+
+    def model(self):
+        """The User row for this identity, loaded once per request."""
+        return request_memo('identity_user', self.id, lambda user_id: db.session.get(User, user_id))
+
+    def has_permission(self, perm_name):
+        if self.role_id is None:
+            return False
+        return perm_name in role_permission_names(self.role_id)
+
+
+def load_identity(user_id):
+    """Return the cached identity for `user_id`, or None if the user does not exist."""
+    return identity_cache.get(int(user_id), _load_identity)
+
+
+def _load_identity(user_id):
+    user = db.session.query(User).options(
+        db.joinedload(User.role), db.joinedload(User.team)
+    ).filter(User.id == user_id).first()
+    logger.debug("Identity cache miss for user_id=%s", user_id)
+    return UserIdentity(user) if user else None
@@ -0,0 +1,101 @@
+from bisect import bisect_right
+
+
+def merge_intervals(intervals):
+    """
+    Merge overlapping or touching half-open intervals.
+
+    :param intervals: Iterable of (start, end) pairs where start < end
+    :return: Sorted list of disjoint (start, end) tuples
+    """
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1][1] = end
+        else:
+            merged.append([start, end])
+    return [(start, end) for start, end in merged]
+
+
+def subtract_intervals(intervals, removed):
+    """
+    Remove one set of half-open intervals from another.
+
+    :param intervals: Sorted, disjoint (start, end) pairs, as from merge_intervals()
+    :param removed: Sorted, disjoint (start, end) pairs to cut out
+    :return: Sorted list of the disjoint (start, end) pieces of `intervals` not in `removed`
+    """
+    result = []
+    i = 0
+    for start, end in intervals:
+        while i < len(removed) and removed[i][1] <= start:
+            i += 1
+        j = i
+        while j < len(removed) and removed[j][0] < end:
+            if removed[j][0] > start:
+                result.append((start, removed[j][0]))
+            start = max(start, removed[j][1])
+            j += 1
+        if start < end:
+            result.append((start, end))
+    return result
+
+
+class IntervalIndex:
+    """
+    Sorted-array index over a set of half-open [start, end) intervals.
+
+    Intervals are merged on construction, so the start and end arrays are both
+    sorted and every lookup is a single bisect. Works with any ordered values
+    (date ordinals, datetimes, ...).
+    """
+    __slots__ = ('starts', 'ends')
+
+    def __init__(self, intervals=()):
+        merged = merge_intervals(intervals)
+        self.starts = [start for start, _ in merged]
+        self.ends = [end for _, end in merged]
+
+    def __len__(self):
+        return len(self.starts)
+
+    def __iter__(self):
+        return iter(zip(self.starts, self.ends))
+
+    def contains(self, point):
+        """Return True if `point` falls inside one of the intervals."""
+        i = bisect_right(self.starts, point) - 1
+        return i >= 0 and point < self.ends[i]
+
+    def overlaps(self, start, end):
+        """Return True if [start, end) intersects any interval."""
+        i = bisect_right(self.ends, start)
+        return i < len(self.starts) and self.starts[i] < end
+
+    def next_free(self, point):
+        """Return `point` if it is uncovered, otherwise the end of the interval covering it."""
+        i = bisect_right(self.starts, point) - 1
+        if i >= 0 and point < self.ends[i]:
+            return self.ends[i]
+        return point
+
+    def next_start(self, point):
+        """Return the first interval start strictly after `point`, or None."""
+        i = bisect_right(self.starts, point)
+        return self.starts[i] if i < len(self.starts) else None
+
+    def free_run(self, start, limit):
+        """
+        Length of the gap beginning at `start`, capped at `limit`.
+
+        :param start: Point to measure from
+        :param limit: Upper bound for the end of the gap
+        :return: 0 if `start` is covered, otherwise (gap end - start)
+        """
+        if self.contains(start):
+            return 0
+        upcoming = self.next_start(start)
+        if upcoming is not None and upcoming < limit:
+            return upcoming - start
+        return limit - start
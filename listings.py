@@ -0,0 +1,171 @@
+"""
+Keyset-paginated listings for the management pages.
+
+A page is read by seeking past the last row of the previous one (carried in
+an opaque cursor) instead of with OFFSET, so every page costs the same
+however deep the caller has scrolled, and rows come back as plain column
+tuples joined in one query.
+"""
+import base64
+import json
+from datetime import datetime
+
+from sqlalchemy import Boolean, and_, func, literal_column, or_
+
+from extensions import db
+from helpers import format_phone_number
+from models import Role, Schedule, Team, User
+
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+USER_SEARCH_COLUMNS = (User.username, User.first_name, User.last_name, User.email)
+
+
+class InvalidCursor(ValueError):
+    """Raised for a cursor that was not produced by encode_cursor()."""
+
+
+def encode_cursor(*values):
+    """Opaque, URL-safe cursor for the sort key of the last row on a page."""
+    return base64.urlsafe_b64encode(json.dumps(values, default=str).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, size):
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except (ValueError, TypeError) as e:
+        raise InvalidCursor(f'Malformed cursor: {e}')
+    if not isinstance(values, list) or len(values) != size:
+        raise InvalidCursor('Malformed cursor')
+    return values
+
+
+def page_size(value, default=PAGE_SIZE):
+    """Parse a requested page size, clamped to 1..MAX_PAGE_SIZE."""
+    try:
+        return max(1, min(int(value), MAX_PAGE_SIZE)) if value else default
+    except ValueError:
+        return default
+
+
+def schedule_listing_query(team_id=None, user_id=None, start=None, end=None):
+    """
+    Schedules newest first, with the user and team columns the listing shows.
+
+    :param team_id: Only schedules of this team's members
+    :param user_id: Only this user's schedules
+    :param start: Only schedules ending at or after this time
+    :param end: Only schedules starting before this time
+    :return: Select over (id, start_time, end_time, user_id, username, team_id, team_name)
+    """
+    query = db.select(
+        Schedule.id, Schedule.start_time, Schedule.end_time, Schedule.user_id,
+        User.username, User.team_id, Team.name.label('team_name')
+    ).join(User, Schedule.user_id == User.id).outerjoin(Team, User.team_id == Team.id)
+    if team_id:
+        query = query.where(User.team_id == team_id)
+    if user_id:
+        query = query.where(Schedule.user_id == user_id)
+    if start:
+        query = query.where(Schedule.end_time >= start)
+    if end:
+        query = query.where(Schedule.start_time < end)
+    return query.order_by(Schedule.start_time.desc(), Schedule.id.desc())
+
+
+def schedule_page(cursor=None, limit=PAGE_SIZE, **filters):
+    """
+    One page of schedule_listing_query().
+
+    :param cursor: Cursor returned with the previous page, or None for the first page
+    :param limit: Rows per page
+    :param filters: team_id, user_id, start and end, as for schedule_listing_query()
+    :return: (list of row dicts, cursor for the next page or None)
+    :raises InvalidCursor: If `cursor` cannot be decoded
+    """
+    query = schedule_listing_query(**filters)
+    if cursor:
+        last_start, last_id = decode_cursor(cursor, 2)
+        try:
+            last_start = datetime.fromisoformat(last_start)
+        except (TypeError, ValueError):
+            raise InvalidCursor('Malformed cursor')
+        if not isinstance(last_id, int) or isinstance(last_id, bool):
+            raise InvalidCursor('Malformed cursor')
+        # The redundant `<=` lets the start_time index bound the scan.
+        query = query.where(
+            Schedule.start_time <= last_start,
+            or_(Schedule.start_time < last_start, and_(Schedule.start_time == last_start, Schedule.id < last_id))
+        )
+    rows = db.session.execute(query.limit(limit + 1)).all()
+    schedules = [row._asdict() for row in rows[:limit]]
+    next_cursor = None
+    if len(rows) > limit:
+        last = schedules[-1]
+        next_cursor = encode_cursor(last['start_time'].isoformat(), last['id'])
+    return schedules, next_cursor
+
+
+def user_search_filter(query):
+    """
+    Case-insensitive prefix match of `query` on username, first name, last name or email.
+
+    Each branch can use that column's lower() index (see models). Postgres
+    gets LIKE 'prefix%' against text_pattern_ops indexes. SQLite will not use
+    an expression index for LIKE, so it gets the equivalent range
+    prefix <= lower(column) < successor(prefix).
+    """
+    prefix = query.lower()
+    if db.engine.dialect.name == 'sqlite':
+        upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+        return or_(*(and_(func.lower(column) >= prefix, func.lower(column) < upper) for column in USER_SEARCH_COLUMNS))
+    pattern = prefix.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+    return or_(*(func.lower(column).like(pattern, escape='\\') for column in USER_SEARCH_COLUMNS))
+
+
+def user_listing_query(active=True, query=''):
+    """
+    Users ordered by username, with their role and team names.
+
+    :param active: List active (True) or inactive (False) users
+    :param query: Optional prefix for user_search_filter()
+    """
+    select = db.select(
+        User.id, User.username, User.first_name, User.last_name, User.email,
+        User._work_phone.label('work_phone'), User._mobile_phone.label('mobile_phone'),
+        User.timezone, User.is_active, Role.name.label('role_name'), Team.name.label('team_name')
+    ).outerjoin(Role, User.role_id == Role.id).outerjoin(Team, User.team_id == Team.id)
+    if query:
+        select = select.where(user_search_filter(query))
+        if db.engine.dialect.name == 'sqlite':
+            # SQLite has no statistics on the bound prefix ranges and would rather walk the
+            # (is_active, username) index over every user; unary + keeps this term off the index.
+            select = select.where(literal_column('+users.is_active', Boolean) == active)
+            return select.order_by(User.username)
+    return select.where(User.is_active == active).order_by(User.username)
+
+
+def user_page(cursor=None, limit=PAGE_SIZE, active=True, query=''):
+    """
+    One page of user_listing_query(), keyed on username (unique).
+
+    :param cursor: Cursor returned with the previous page, or None for the first page
+    :param limit: Rows per page
+    :param active: List active or inactive users
+    :param query: Optional search prefix
+    :return: (list of row dicts with formatted phone numbers, cursor for the next page or None)
+    :raises InvalidCursor: If `cursor` cannot be decoded
+    """
+    select = user_listing_query(active, query)
+    if cursor:
+        last_username, = decode_cursor(cursor, 1)
+        select = select.where(User.username > str(last_username))
+    rows = db.session.execute(select.limit(limit + 1)).all()
+    users = []
+    for row in rows[:limit]:
+        user = row._asdict()
+        user['work_phone'] = format_phone_number(user['work_phone'])
+        user['mobile_phone'] = format_phone_number(user['mobile_phone'])
+        users.append(user)
+    next_cursor = encode_cursor(users[-1]['username']) if len(rows) > limit else None
+    return users, next_cursor
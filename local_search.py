@@ -0,0 +1,204 @@
+from bisect import bisect_left, insort
+from itertools import accumulate
+from time import perf_counter
+import math
+import random
+
+
+def improve_rotation(blocks, user_ids, user_hours, unavailable, start, day_weights, constraints,
+                     deadline, rng=random):
+    """
+    Improve a feasible rotation by simulated-annealing local search.
+
+    Every move keeps the plan feasible (time off, block length limits, max
+    shifts per user and rest gaps), so whatever is held when the deadline
+    passes can be returned. The objective is the sum of squared weighted loads,
+    which for a fixed amount of coverage is minimised exactly when the spread
+    of load across users is.
+
+    Moves:
+    - reassign a block to another user
+    - swap the users of two blocks
+    - shift the boundary between two adjacent blocks by one day
+
+    :param blocks: Feasible list of (user_id, start_ordinal, end_ordinal) tuples, sorted by start
+    :param user_ids: IDs of the users in the rotation
+    :param user_hours: Dict of user ID -> hours already on call
+    :param unavailable: Dict of user ID -> IntervalIndex of unavailable day ordinals
+    :param start: First day ordinal of the period
+    :param day_weights: Sequence of per-day weights for the period
+    :param constraints: RotationConstraints with min_block, max_block, max_shifts and rest_days
+    :param deadline: perf_counter() value at which to stop
+    :param rng: Random source
+    :return: Best list of (user_id, start_ordinal, end_ordinal) tuples found
+    """
+    if not blocks or len(user_ids) < 2:
+        return list(blocks)
+
+    state = _RotationState(blocks, user_ids, user_hours, unavailable, start, day_weights, constraints)
+    best_cost = current_cost = state.cost()
+    best_blocks = state.blocks()
+
+    started = perf_counter()
+    budget = max(deadline - started, 1e-9)
+    initial_temperature = max(state.mean_block_weight() ** 2, 1e-6)
+    iteration = 0
+    temperature = initial_temperature
+
+    while True:
+        iteration += 1
+        # perf_counter() is cheap but not free; check the clock every 64 moves.
+        if iteration % 64 == 0:
+            now = perf_counter()
+            if now >= deadline:
+                break
+            temperature = initial_temperature * max(1 - (now - started) / budget, 1e-3)
+
+        move = rng.random()
+        if move < 0.5:
+            delta = state.try_reassign(rng, temperature)
+        elif move < 0.8:
+            delta = state.try_swap(rng, temperature)
+        else:
+            delta = state.try_shift_boundary(rng, temperature)
+
+        if delta is None:
+            continue
+        current_cost += delta
+        if current_cost < best_cost - 1e-9:
+            best_cost = current_cost
+            best_blocks = state.blocks()
+
+    return best_blocks
+
+
+def _accept(delta, temperature, rng):
+    return delta <= 0 or rng.random() < math.exp(-delta / temperature)
+
+
+class _RotationState:
+    """Mutable plan with per-user block lists and loads for O(log n) move checks."""
+
+    def __init__(self, blocks, user_ids, user_hours, unavailable, start, day_weights, constraints):
+        self.user_ids = list(user_ids)
+        self.unavailable = unavailable
+        self.start = start
+        self.constraints = constraints
+        self.prefix = [0.0] + list(accumulate(float(weight) for weight in day_weights))
+
+        self.owners = [user_id for user_id, _, _ in blocks]
+        self.starts = [block_start for _, block_start, _ in blocks]
+        self.ends = [block_end for _, _, block_end in blocks]
+        self.user_blocks = {user_id: [] for user_id in self.user_ids}
+        self.load = {user_id: user_hours.get(user_id, 0.0) / 24 for user_id in self.user_ids}
+        for i, user_id in enumerate(self.owners):
+            self.user_blocks[user_id].append(i)
+            self.load[user_id] += self.weight(i)
+
+    def weight(self, i):
+        return self.prefix[self.ends[i] - self.start] - self.prefix[self.starts[i] - self.start]
+
+    def day_weight(self, day):
+        return self.prefix[day - self.start + 1] - self.prefix[day - self.start]
+
+    def cost(self):
+        return sum(load * load for load in self.load.values())
+
+    def mean_block_weight(self):
+        return sum(self.weight(i) for i in range(len(self.owners))) / len(self.owners)
+
+    def blocks(self):
+        return list(zip(self.owners, self.starts, self.ends))
+
+    def is_free(self, user_id, block_start, block_end):
+        index = self.unavailable.get(user_id)
+        return index is None or not index.overlaps(block_start, block_end)
+
+    def fits(self, user_id, block_start, block_end, ignore=()):
+        """Can user_id take [block_start, block_end) given their other blocks?"""
+        if not self.is_free(user_id, block_start, block_end):
+            return False
+        own = [i for i in self.user_blocks[user_id] if i not in ignore]
+        max_shifts = self.constraints.max_shifts
+        if max_shifts is not None and len(own) >= max_shifts:
+            return False
+        rest = self.constraints.rest_days
+        position = bisect_left([self.starts[i] for i in own], block_start)
+        if position > 0 and self.ends[own[position - 1]] + rest > block_start:
+            return False
+        if position < len(own) and block_end + rest > self.starts[own[position]]:
+            return False
+        return True
+
+    def move_block(self, i, user_id):
+        previous = self.owners[i]
+        weight = self.weight(i)
+        self.user_blocks[previous].remove(i)
+        self.load[previous] -= weight
+        insort(self.user_blocks[user_id], i)
+        self.load[user_id] += weight
+        self.owners[i] = user_id
+
+    def try_reassign(self, rng, temperature):
+        i = rng.randrange(len(self.owners))
+        current, candidate = self.owners[i], rng.choice(self.user_ids)
+        if candidate == current or not self.fits(candidate, self.starts[i], self.ends[i]):
+            return None
+        weight = self.weight(i)
+        delta = 2 * weight * (self.load[candidate] - self.load[current] + weight)
+        if not _accept(delta, temperature, rng):
+            return None
+        self.move_block(i, candidate)
+        return delta
+
+    def try_swap(self, rng, temperature):
+        i, j = rng.randrange(len(self.owners)), rng.randrange(len(self.owners))
+        first, second = self.owners[i], self.owners[j]
+        if first == second:
+            return None
+        if not (self.fits(second, self.starts[i], self.ends[i], ignore=(j,))
+                and self.fits(first, self.starts[j], self.ends[j], ignore=(i,))):
+            return None
+        change = self.weight(j) - self.weight(i)
+        delta = ((self.load[first] + change) ** 2 + (self.load[second] - change) ** 2
+                 - self.load[first] ** 2 - self.load[second] ** 2)
+        if not _accept(delta, temperature, rng):
+            return None
+        self.move_block(i, second)
+        self.move_block(j, first)
+        return delta
+
+    def try_shift_boundary(self, rng, temperature):
+        if len(self.owners) < 2:
+            return None
+        i = rng.randrange(len(self.owners) - 1)
+        boundary = self.ends[i]
+        if boundary != self.starts[i + 1] or self.owners[i] == self.owners[i + 1]:
+            return None
+
+        # Move the boundary one day right (block i grows) or left (block i + 1 grows).
+        if rng.random() < 0.5:
+            day, gainer, loser, new_boundary = boundary, self.owners[i], self.owners[i + 1], boundary + 1
+            grown = (i, self.starts[i], new_boundary)
+        else:
+            day, gainer, loser, new_boundary = boundary - 1, self.owners[i + 1], self.owners[i], boundary - 1
+            grown = (i + 1, new_boundary, self.ends[i + 1])
+
+        first_length = new_boundary - self.starts[i]
+        second_length = self.ends[i + 1] - new_boundary
+        limits = self.constraints
+        if not (limits.min_block <= first_length <= limits.max_block
+                and limits.min_block <= second_length <= limits.max_block):
+            return None
+        index, grown_start, grown_end = grown
+        if not self.fits(gainer, grown_start, grown_end, ignore=(index,)):
+            return None
+
+        weight = self.day_weight(day)
+        delta = 2 * weight * (self.load[gainer] - self.load[loser] + weight)
+        if not _accept(delta, temperature, rng):
+            return None
+        self.ends[i] = self.starts[i + 1] = new_boundary
+        self.load[gainer] += weight
+        self.load[loser] -= weight
+        return delta
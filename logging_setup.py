@@ -0,0 +1,119 @@
+"""
+Queue-based logging with JSON output.
+
+Callers only build a LogRecord and put it on an in-memory queue; a
+QueueListener thread formats and writes it. Messages are formatted on the
+writer thread as well, unless an argument is something other than a plain
+value (a model instance, say), whose repr is taken on the calling thread
+while the object is still safe to touch.
+
+Levels come from the environment: LOG_LEVEL for the root logger and
+LOG_LEVELS for overrides, e.g. 'routes=DEBUG,sqlalchemy.engine=WARNING'.
+LOG_FORMAT=text switches from JSON lines to the plain format.
+"""
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+import atexit
+import json
+import logging
+import os
+import queue
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+# Arguments of these types can be formatted later, on the writer thread.
+_DEFERRABLE_TYPES = (str, int, float, bool, type(None))
+# LogRecord attributes that are not user-supplied `extra` fields.
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime', 'taskName'}
+
+_listener = None
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, message, any `extra` fields and the traceback."""
+
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'thread': record.threadName,
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exception'] = record.exc_text
+        if record.stack_info:
+            entry['stack'] = self.formatStack(record.stack_info)
+        return json.dumps(entry, default=str)
+
+
+class DeferredQueueHandler(QueueHandler):
+    """QueueHandler that leaves message formatting to the listener thread where it is safe to."""
+
+    def prepare(self, record):
+        args = record.args
+        if args and not all(isinstance(arg, _DEFERRABLE_TYPES) for arg in
+                            (args.values() if isinstance(args, dict) else args)):
+            record.msg = record.getMessage()
+            record.args = None
+        return record
+
+
+def parse_levels(spec):
+    """
+    Parse per-logger levels.
+
+    :param spec: Comma-separated 'logger=LEVEL' pairs
+    :return: Dict of logger name to level name
+    """
+    levels = {}
+    for item in (spec or '').split(','):
+        name, _, level = item.partition('=')
+        if name.strip() and level.strip():
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def configure_logging(environ=os.environ):
+    """
+    Route all logging through a queue to a background writer thread.
+
+    Safe to call more than once: later calls only update formats and levels.
+
+    :param environ: Mapping to read LOG_LEVEL, LOG_LEVELS and LOG_FORMAT from
+    """
+    global _listener
+    output = logging.StreamHandler()
+    if environ.get('LOG_FORMAT', 'json').lower() == 'text':
+        output.setFormatter(logging.Formatter(TEXT_FORMAT))
+    else:
+        output.setFormatter(JsonFormatter())
+
+    root = logging.getLogger()
+    if _listener is not None:
+        _listener.stop()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    log_queue = queue.SimpleQueue()
+    root.addHandler(DeferredQueueHandler(log_queue))
+    _listener = QueueListener(log_queue, output, respect_handler_level=True)
+    _listener.start()
+
+    root.setLevel(environ.get('LOG_LEVEL', 'INFO').upper())
+    for name, level in parse_levels(environ.get('LOG_LEVELS')).items():
+        logging.getLogger(name).setLevel(level)
+
+
+def stop_logging():
+    """Flush queued records and stop the writer thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+atexit.register(stop_logging)
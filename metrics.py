@@ -0,0 +1,274 @@
+"""
+In-process metrics in the Prometheus text exposition format.
+
+Counters and histograms live in a module-level registry and are updated as
+requests are served; gauges for the connection pool, caches and password
+hasher are read when /metrics is scraped. Each worker process keeps its own
+registry, so scrape every process (or run one) for complete numbers.
+"""
+from bisect import bisect_left
+from time import perf_counter, time
+import hmac
+import logging
+import threading
+
+from flask import Response, g, request
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+GENERATION_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+PROCESS_STARTED_AT = time()
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs += [f'{name}="{_escape(value)}"' for name, value in extra]
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=(), registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+        (registry if registry is not None else REGISTRY).register(self)
+
+    def labels(self, **labels):
+        """The child metric for one combination of label values."""
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        for key, child in sorted(self._children.items()):
+            lines.extend(self._render_child(key, child))
+        return lines
+
+
+class _CounterChild:
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+
+class Counter(_Metric):
+    """Monotonically increasing count."""
+
+    kind = 'counter'
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def _render_child(self, key, child):
+        return [f'{self.name}{_format_labels(self.labelnames, key)} {_format_value(child.value)}']
+
+
+class _HistogramChild:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+
+class Histogram(_Metric):
+    """Distribution of observed values over fixed cumulative buckets."""
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS, registry=None):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames, registry)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def _render_child(self, key, child):
+        with child._lock:
+            counts, total = list(child.counts), child.sum
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float('inf'),), counts):
+            cumulative += count
+            labels = _format_labels(self.labelnames, key, [('le', _format_value(float(bound)))])
+            lines.append(f'{self.name}_bucket{labels} {cumulative}')
+        labels = _format_labels(self.labelnames, key)
+        lines.append(f'{self.name}_sum{labels} {_format_value(total)}')
+        lines.append(f'{self.name}_count{labels} {cumulative}')
+        return lines
+
+
+class Registry:
+    """Metrics plus callables that report gauges at scrape time."""
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+
+    def add_collector(self, collector):
+        """
+        Register a callable run on every scrape.
+
+        :param collector: Callable returning (name, type, help, [(labels dict, value), ...]) tuples
+        """
+        self._collectors.append(collector)
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for collector in self._collectors:
+            try:
+                families = list(collector())
+            except Exception as e:
+                logger.error("Metrics collector %s failed: %s", getattr(collector, '__name__', collector), e)
+                continue
+            for name, kind, documentation, samples in families:
+                lines.append(f'# HELP {name} {documentation}')
+                lines.append(f'# TYPE {name} {kind}')
+                for labels, value in samples:
+                    if value is None:
+                        continue
+                    lines.append(f'{name}{_format_labels(labels.keys(), labels.values())} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+http_requests_total = Counter(
+    'http_requests_total', 'HTTP requests by route and status.',
+    ['blueprint', 'endpoint', 'method', 'status'])
+http_request_duration_seconds = Histogram(
+    'http_request_duration_seconds', 'Time to produce a response (streamed bodies excluded), by route.',
+    ['blueprint', 'endpoint', 'method'])
+schedule_generation_seconds = Histogram(
+    'schedule_generation_seconds', 'Schedule generation duration, by solver and mode (single team or batch).',
+    ['solver', 'mode'], buckets=GENERATION_BUCKETS)
+schedules_generated_total = Counter(
+    'schedules_generated_total', 'Schedules produced by the generator.', ['solver', 'mode'])
+report_exports_total = Counter(
+    'report_exports_total', 'Report exports started, by report and format.', ['report', 'format'])
+report_export_bytes_total = Counter(
+    'report_export_bytes_total', 'Bytes of report exports sent, by report and format.', ['report', 'format'])
+
+
+def count_bytes(chunks, report, export_format):
+    """Pass `chunks` through, adding their sizes to report_export_bytes_total."""
+    report_exports_total.labels(report=report, format=export_format).inc()
+    counter = report_export_bytes_total.labels(report=report, format=export_format)
+    for chunk in chunks:
+        counter.inc(len(chunk))
+        yield chunk
+
+
+def _collect_app_state():
+    # Imported here so that any module (scheduling_algorithm included) can import metrics without a cycle.
+    from caching import CACHES
+    from db_pool import pool_stats
+    from extensions import db
+    from on_call import resolver
+    from passwords import password_hasher
+
+    yield ('process_start_time_seconds', 'gauge', 'Start time of the process since the epoch.',
+           [({}, PROCESS_STARTED_AT)])
+
+    pool = pool_stats(db.engine)
+    pool_labels = {'pool': pool['pool']}
+    yield ('db_pool_size', 'gauge', 'Connections the pool keeps open.', [(pool_labels, pool.get('size'))])
+    yield ('db_pool_checked_out', 'gauge', 'Connections currently in use.', [(pool_labels, pool.get('checked_out'))])
+    yield ('db_pool_checked_in', 'gauge', 'Idle connections in the pool.', [(pool_labels, pool.get('checked_in'))])
+    yield ('db_pool_overflow', 'gauge', 'Connections open beyond the pool size.', [(pool_labels, pool.get('overflow'))])
+    yield ('db_pool_checkouts_total', 'counter', 'Connection checkouts.', [(pool_labels, pool.get('checkouts'))])
+    yield ('db_pool_wait_max_seconds', 'gauge', 'Longest wait for a connection.',
+           [(pool_labels, pool['wait_max_ms'] / 1000 if 'wait_max_ms' in pool else None)])
+
+    caches = [cache.stats() for cache in CACHES.values()]
+    caches.append(dict(resolver.stats(), name='on_call', size=None))
+    yield ('cache_hits_total', 'counter', 'Cache lookups answered from the cache.',
+           [({'cache': stats['name']}, stats['hits']) for stats in caches])
+    yield ('cache_misses_total', 'counter', 'Cache lookups that had to load the value.',
+           [({'cache': stats['name']}, stats['misses']) for stats in caches])
+    yield ('cache_entries', 'gauge', 'Entries currently cached.',
+           [({'cache': stats['name']}, stats['size']) for stats in caches])
+
+    hasher = password_hasher.stats()
+    yield ('password_hash_queue_depth', 'gauge', 'Password hashing jobs queued or running.', [({}, hasher['queue_depth'])])
+    yield ('password_hash_completed_total', 'counter', 'Password hashes and verifications completed.',
+           [({}, hasher['completed'])])
+    yield ('password_hash_rejected_total', 'counter', 'Password hashing jobs rejected with a full queue.',
+           [({}, hasher['rejected'])])
+
+
+def init_app(app):
+    """Time every request, count responses by status and serve the registry at /metrics."""
+    if not app.config['METRICS_ENABLED']:
+        return
+
+    @app.before_request
+    def start_timer():
+        g._metrics_started = perf_counter()
+
+    @app.after_request
+    def record_request(response):
+        started = g.pop('_metrics_started', None)
+        if started is None:
+            return response
+        blueprint = request.blueprint or ''
+        # Unmatched URLs share one label so that 404 scans cannot create unbounded series.
+        endpoint = request.endpoint or 'unmatched'
+        http_request_duration_seconds.labels(
+            blueprint=blueprint, endpoint=endpoint, method=request.method
+        ).observe(perf_counter() - started)
+        http_requests_total.labels(
+            blueprint=blueprint, endpoint=endpoint, method=request.method, status=response.status_code
+        ).inc()
+        return response
+
+    def metrics():
+        token = app.config['METRICS_TOKEN']
+        if not token and not app.config['METRICS_PUBLIC']:
+            # Fail closed: without a token the endpoint only exists when explicitly made public.
+            return Response('Not Found\n', status=404, content_type=CONTENT_TYPE)
+        if token and not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+            return Response('Unauthorized\n', status=401, content_type=CONTENT_TYPE)
+        return Response(REGISTRY.render(), content_type=CONTENT_TYPE)
+
+    app.add_url_rule('/metrics', 'metrics', metrics)
+
+
+REGISTRY.add_collector(_collect_app_state)
@@ -0,0 +1,44 @@
+"""Add composite indexes for time-range lookups
+
+Revision ID: 4b7e2d9c1a05
+Revises:
+Create Date: 2026-10-18 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4b7e2d9c1a05'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+INDEXES = [
+    ('ix_schedule_user_id_start_time_end_time', 'schedule', ['user_id', 'start_time', 'end_time']),
+    ('ix_schedule_start_time_end_time', 'schedule', ['start_time', 'end_time']),
+    ('ix_time_off_request_user_id_start_date_end_date', 'time_off_request', ['user_id', 'start_date', 'end_date']),
+    ('ix_time_off_request_start_date_end_date', 'time_off_request', ['start_date', 'end_date']),
+    ('ix_user_activity_user_id_timestamp', 'user_activity', ['user_id', 'timestamp']),
+    ('ix_user_activity_activity_type_timestamp', 'user_activity', ['activity_type', 'timestamp']),
+    ('ix_note_team_id_is_archived_created_at', 'note', ['team_id', 'is_archived', 'created_at']),
+    ('ix_users_team_id', 'users', ['team_id']),
+]
+
+
+def upgrade():
+    # db.create_all() already builds these on fresh databases, hence if_not_exists.
+    if op.get_bind().dialect.name == 'postgresql':
+        # Build concurrently so existing tables stay writable while the indexes are created.
+        with op.get_context().autocommit_block():
+            for name, table, columns in INDEXES:
+                op.create_index(name, table, columns, if_not_exists=True, postgresql_concurrently=True)
+    else:
+        for name, table, columns in INDEXES:
+            op.create_index(name, table, columns, if_not_exists=True)
+
+
+def downgrade():
+    for name, table, _ in reversed(INDEXES):
+        op.drop_index(name, table_name=table, if_exists=True)
@@ -0,0 +1,68 @@
+"""Add analytics rollup tables
+
+Revision ID: 7c3f8a1e5d20
+Revises: 4b7e2d9c1a05
+Create Date: 2026-10-18 12:00:00.000000
+
+The upgrade queues a full rebuild, so the next refresh (the dashboard's or
+`python refresh_analytics.py`) backfills the rollups from existing history.
+
+"""
+from datetime import date
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7c3f8a1e5d20'
+down_revision = '4b7e2d9c1a05'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # db.create_all() already builds these on fresh databases, hence if_not_exists.
+    op.create_table(
+        'analytics_daily_user_hours',
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('hours', sa.Float(), nullable=False),
+        sa.PrimaryKeyConstraint('day', 'user_id'),
+        if_not_exists=True
+    )
+    op.create_table(
+        'analytics_daily_time_off',
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('status', sa.String(length=20), nullable=False),
+        sa.Column('count', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('day', 'status'),
+        if_not_exists=True
+    )
+    op.create_table(
+        'analytics_daily_logins',
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('count', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('day', 'user_id'),
+        if_not_exists=True
+    )
+    op.create_table(
+        'analytics_dirty_day',
+        sa.Column('kind', sa.String(length=20), nullable=False),
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.PrimaryKeyConstraint('kind', 'day'),
+        if_not_exists=True
+    )
+
+    # Queue a full rebuild (analytics.REBUILD_ALL) so existing history is backfilled on the next refresh.
+    dirty_day = sa.table('analytics_dirty_day', sa.column('kind', sa.String), sa.column('day', sa.Date))
+    op.execute(dirty_day.delete().where(dirty_day.c.kind == 'rebuild_all'))
+    op.bulk_insert(dirty_day, [{'kind': 'rebuild_all', 'day': date(1970, 1, 1)}])
+
+
+def downgrade():
+    op.drop_table('analytics_dirty_day', if_exists=True)
+    op.drop_table('analytics_daily_logins', if_exists=True)
+    op.drop_table('analytics_daily_time_off', if_exists=True)
+    op.drop_table('analytics_daily_user_hours', if_exists=True)
@@ -0,0 +1,40 @@
+"""Add user listing and prefix search indexes
+
+Revision ID: a5d19e4c7b3f
+Revises: 7c3f8a1e5d20
+Create Date: 2026-10-18 15:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a5d19e4c7b3f'
+down_revision = '7c3f8a1e5d20'
+branch_labels = None
+depends_on = None
+
+SEARCH_COLUMNS = ['username', 'first_name', 'last_name', 'email']
+
+
+def upgrade():
+    # db.create_all() already builds these on fresh databases, hence if_not_exists.
+    if op.get_bind().dialect.name == 'postgresql':
+        # Build concurrently so the users table stays writable while the indexes are created.
+        with op.get_context().autocommit_block():
+            op.create_index('ix_users_is_active_username', 'users', ['is_active', 'username'],
+                            if_not_exists=True, postgresql_concurrently=True)
+            for column in SEARCH_COLUMNS:
+                op.create_index(f'ix_users_{column}_lower', 'users', [sa.text(f'lower({column}) text_pattern_ops')],
+                                if_not_exists=True, postgresql_concurrently=True)
+    else:
+        op.create_index('ix_users_is_active_username', 'users', ['is_active', 'username'], if_not_exists=True)
+        for column in SEARCH_COLUMNS:
+            op.create_index(f'ix_users_{column}_lower', 'users', [sa.text(f'lower({column})')], if_not_exists=True)
+
+
+def downgrade():
+    for column in reversed(SEARCH_COLUMNS):
+        op.drop_index(f'ix_users_{column}_lower', table_name='users', if_exists=True)
+    op.drop_index('ix_users_is_active_username', table_name='users', if_exists=True)
@@ -1,8 +1,9 @@
 from extensions import db
 from flask_login import UserMixin
-from werkzeug.security import generate_password_hash, check_password_hash
+from passwords import password_hasher
 from datetime import datetime
 from helpers import format_phone_number
+from caching import LocalCache, request_memo
 
 # Association table for team managers
 team_managers = db.Table('team_managers',
@@ -18,6 +19,10 @@ role_permissions = db.Table('role_permissions',
 
 class User(UserMixin, db.Model):
     __tablename__ = 'users'  # This tells SQLAlchemy to use 'users' as the table name
+    __table_args__ = (
+        db.Index('ix_users_team_id', 'team_id'),
+        db.Index('ix_users_is_active_username', 'is_active', 'username'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     first_name = db.Column(db.String(64), nullable=True)
     last_name = db.Column(db.String(64), nullable=True)
@@ -38,17 +43,15 @@ class User(UserMixin, db.Model):
     is_active = db.Column(db.Boolean, default=True)
     
     def has_permission(self, perm_name):
-        if self.role and self.role.permissions:
-            permission = Permission.query.filter_by(name=perm_name).first()
-            if permission:
-                return permission in self.role.permissions
-        return False
+        if self.role_id is None:
+            return False
+        return perm_name in role_permission_names(self.role_id)
     
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = password_hasher.hash(password)
     
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        return password_hasher.verify(self.password_hash, password)
 
     @property
     def work_phone(self):
@@ -66,6 +69,17 @@ class User(UserMixin, db.Model):
     def mobile_phone(self, value):
         self._mobile_phone = value
 
+# Case-insensitive prefix search on the user listings (see listings.user_search_filter).
+# text_pattern_ops lets Postgres use them for LIKE 'abc%' whatever the database collation.
+db.Index('ix_users_username_lower', db.func.lower(User.username).label('username_lower'),
+         postgresql_ops={'username_lower': 'text_pattern_ops'})
+db.Index('ix_users_first_name_lower', db.func.lower(User.first_name).label('first_name_lower'),
+         postgresql_ops={'first_name_lower': 'text_pattern_ops'})
+db.Index('ix_users_last_name_lower', db.func.lower(User.last_name).label('last_name_lower'),
+         postgresql_ops={'last_name_lower': 'text_pattern_ops'})
+db.Index('ix_users_email_lower', db.func.lower(User.email).label('email_lower'),
+         postgresql_ops={'email_lower': 'text_pattern_ops'})
+
 class Team(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(64), unique=True, nullable=False)
@@ -112,6 +126,10 @@ class Permission(db.Model):
 
 
 class Schedule(db.Model):
+    __table_args__ = (
+        db.Index('ix_schedule_user_id_start_time_end_time', 'user_id', 'start_time', 'end_time'),
+        db.Index('ix_schedule_start_time_end_time', 'start_time', 'end_time'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     start_time = db.Column(db.DateTime, nullable=False)
@@ -119,6 +137,10 @@ class Schedule(db.Model):
     user = db.relationship('User', backref=db.backref('schedules', lazy='dynamic'))
 
 class TimeOffRequest(db.Model):
+    __table_args__ = (
+        db.Index('ix_time_off_request_user_id_start_date_end_date', 'user_id', 'start_date', 'end_date'),
+        db.Index('ix_time_off_request_start_date_end_date', 'start_date', 'end_date'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     start_date = db.Column(db.Date, nullable=False)
@@ -127,6 +149,9 @@ class TimeOffRequest(db.Model):
     user = db.relationship('User', backref=db.backref('time_off_requests', lazy='dynamic'))
 
 class Note(db.Model):
+    __table_args__ = (
+        db.Index('ix_note_team_id_is_archived_created_at', 'team_id', 'is_archived', 'created_at'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     content = db.Column(db.Text, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -135,6 +160,10 @@ class Note(db.Model):
     is_archived = db.Column(db.Boolean, default=False)
 
 class UserActivity(db.Model):
+    __table_args__ = (
+        db.Index('ix_user_activity_user_id_timestamp', 'user_id', 'timestamp'),
+        db.Index('ix_user_activity_activity_type_timestamp', 'activity_type', 'timestamp'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     timestamp = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
@@ -152,3 +181,44 @@ class TeamColor(db.Model):
     @property
     def is_assigned(self):
         return self.teams is not None
+
+
+# Analytics rollups, maintained by analytics.py. User IDs are plain columns rather than
+# foreign keys so deleting a user never has to touch the rollups.
+class DailyUserHours(db.Model):
+    __tablename__ = 'analytics_daily_user_hours'
+    day = db.Column(db.Date, primary_key=True)
+    user_id = db.Column(db.Integer, primary_key=True)
+    hours = db.Column(db.Float, nullable=False, default=0.0)
+
+class DailyTimeOffCount(db.Model):
+    __tablename__ = 'analytics_daily_time_off'
+    day = db.Column(db.Date, primary_key=True)
+    status = db.Column(db.String(20), primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+class DailyLoginCount(db.Model):
+    __tablename__ = 'analytics_daily_logins'
+    day = db.Column(db.Date, primary_key=True)
+    user_id = db.Column(db.Integer, primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+class AnalyticsDirtyDay(db.Model):
+    __tablename__ = 'analytics_dirty_day'
+    kind = db.Column(db.String(20), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+
+
+# Permission names per role ID. Cleared by edit_role; the TTL covers other worker processes.
+role_permission_cache = LocalCache('role_permissions', ttl=300)
+
+def role_permission_names(role_id):
+    """Frozen set of permission names granted to a role, cached in-process and per request."""
+    return request_memo('role_permissions', role_id,
+                        lambda key: role_permission_cache.get(key, _load_role_permission_names))
+
+def _load_role_permission_names(role_id):
+    rows = db.session.query(Permission.name).join(
+        role_permissions, role_permissions.c.permission_id == Permission.id
+    ).filter(role_permissions.c.role_id == role_id)
+    return frozenset(name for name, in rows)
@@ -0,0 +1,186 @@
+from bisect import bisect_right
+from datetime import datetime, timedelta
+from time import monotonic
+import logging
+import threading
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from extensions import db
+from helpers import format_phone_number
+from models import Schedule, Team, User
+
+logger = logging.getLogger(__name__)
+
+# Models whose changes make the cached snapshot stale. User and Team are here because
+# the snapshot carries usernames, phone numbers and team names alongside the shifts.
+WATCHED_MODELS = (Schedule, User, Team)
+
+
+class OnCallResolver:
+    """
+    Answers "who is on call now, and who is next" per team from memory.
+
+    Shifts overlapping a lookahead window are loaded once into per-team lists
+    sorted by start time. A resolved answer stays valid until the next shift
+    boundary (a current shift ending or the next one starting), so repeated
+    calls between boundaries are a single comparison. Crossing a boundary is
+    re-resolved from the in-memory timeline; the database is only read again
+    when the window runs out, when `max_age` seconds have passed, or after a
+    committed change to a Schedule, User or Team.
+
+    `max_age` bounds staleness across worker processes, since invalidation
+    only reaches the process that made the change.
+    """
+
+    def __init__(self, lookahead=timedelta(days=7), max_age=60):
+        self.lookahead = lookahead
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._timeline = None
+        self._loaded_at = None
+        self._loaded_until = None
+        self._loaded_monotonic = None
+        self._snapshot = None
+        self._valid_until = None
+        self.hits = 0
+        self.misses = 0
+        self.loads = 0
+
+    def invalidate(self):
+        """Drop the loaded timeline; the next call reads the schedule again."""
+        with self._lock:
+            self._timeline = None
+            self._snapshot = None
+
+    def snapshot(self, now=None):
+        """
+        Return the on-call state per team.
+
+        :param now: Naive UTC datetime to resolve for (defaults to utcnow)
+        :return: Dict with 'as_of', 'valid_until' and 'teams', a list of dicts with
+                 team_id, team_name, current (list of shifts) and next (shift or None)
+        """
+        now = now or datetime.utcnow()
+        snapshot, valid_until = self._snapshot, self._valid_until
+        if (snapshot is not None and snapshot['as_of'] <= now < valid_until
+                and monotonic() - self._loaded_monotonic <= self.max_age):
+            self.hits += 1
+            return snapshot
+
+        with self._lock:
+            if (self._timeline is None or not self._loaded_at <= now < self._loaded_until
+                    or monotonic() - self._loaded_monotonic > self.max_age):
+                self._load(now)
+            self.misses += 1
+            self._snapshot, self._valid_until = self._resolve(now)
+            return self._snapshot
+
+    def on_call_users(self, now=None):
+        """Flat list of everyone currently on call, across all teams."""
+        return [shift for team in self.snapshot(now)['teams'] for shift in team['current']]
+
+    def team(self, team_id, now=None):
+        """On-call state for one team, or None if it has no shifts in the lookahead window."""
+        for team in self.snapshot(now)['teams']:
+            if team['team_id'] == team_id:
+                return team
+        return None
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'loads': self.loads}
+
+    def _load(self, now):
+        until = now + self.lookahead
+        rows = db.session.query(
+            Schedule.start_time,
+            Schedule.end_time,
+            User.id,
+            User.username,
+            User.email,
+            User._mobile_phone,
+            Team.id,
+            Team.name
+        ).join(User, Schedule.user_id == User.id).outerjoin(Team, User.team_id == Team.id).filter(
+            Schedule.end_time >= now,
+            Schedule.start_time < until
+        ).order_by(Schedule.start_time).all()
+
+        timeline = {}
+        for start_time, end_time, user_id, username, email, mobile_phone, team_id, team_name in rows:
+            entry = timeline.setdefault(team_id, {'team_name': team_name or 'No Team', 'starts': [], 'shifts': []})
+            entry['starts'].append(start_time)
+            entry['shifts'].append({
+                'user_id': user_id,
+                'username': username,
+                'email': email,
+                'mobile_phone': format_phone_number(mobile_phone) or None,
+                'team_id': team_id,
+                'team_name': entry['team_name'],
+                'start_time': start_time,
+                'end_time': end_time,
+            })
+
+        self._timeline = timeline
+        self._loaded_at = now
+        self._loaded_until = until
+        self._loaded_monotonic = monotonic()
+        self.loads += 1
+        logger.debug("On-call timeline loaded: %d shifts across %d teams", len(rows), len(timeline))
+
+    def _resolve(self, now):
+        # A shift is current while start_time <= now <= end_time, matching the dashboard query.
+        boundary = self._loaded_until
+        teams = []
+        for team_id, entry in self._timeline.items():
+            started = bisect_right(entry['starts'], now)
+            current = [shift for shift in entry['shifts'][:started] if shift['end_time'] >= now]
+            upcoming = entry['shifts'][started] if started < len(entry['shifts']) else None
+            for shift in current:
+                boundary = min(boundary, shift['end_time'] + timedelta(microseconds=1))
+            if upcoming is not None:
+                boundary = min(boundary, upcoming['start_time'])
+            teams.append({
+                'team_id': team_id,
+                'team_name': entry['team_name'],
+                'current': current,
+                'next': upcoming,
+            })
+        teams.sort(key=lambda team: team['team_name'])
+        return {'as_of': now, 'valid_until': boundary, 'teams': teams}, boundary
+
+
+resolver = OnCallResolver()
+
+
+def _touches_watched_models(objects):
+    return any(isinstance(obj, WATCHED_MODELS) for obj in objects)
+
+
+@event.listens_for(Session, 'after_flush')
+def _mark_on_call_changes(session, flush_context):
+    if _touches_watched_models(session.new) or _touches_watched_models(session.dirty) \
+            or _touches_watched_models(session.deleted):
+        session.info['on_call_stale'] = True
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _mark_on_call_bulk_changes(orm_execute_state):
+    # Bulk insert()/update()/delete() and Query.delete() bypass the flush.
+    if orm_execute_state.is_select:
+        return
+    mapper = orm_execute_state.bind_mapper
+    if mapper is not None and issubclass(mapper.class_, WATCHED_MODELS):
+        orm_execute_state.session.info['on_call_stale'] = True
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_on_commit(session):
+    if session.info.pop('on_call_stale', False):
+        resolver.invalidate()
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _discard_on_rollback(session, previous_transaction):
+    session.info.pop('on_call_stale', None)
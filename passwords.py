@@ -0,0 +1,214 @@
+"""
+Password hashing off the request threads.
+
+Hashing and verification run in a bounded process pool so a burst of logins
+cannot starve the server's worker threads of CPU. At most `max_queue` jobs
+may be queued or running; past that callers wait up to `timeout` seconds for
+a slot and then get PasswordHasherBusy. Workers are spawned rather than
+forked, since forking a multi-threaded server process is unsafe, and a pool
+broken by a dying worker is replaced on the next call. A spawned worker
+re-imports the main script, so entry points must only call create_app()
+under their `if __name__ == '__main__'` guard (wsgi.py is imported by the
+server, never run as the main script). Stored hashes whose
+parameters differ from the configured method are upgraded on the next
+successful login (see needs_rehash).
+"""
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import get_context
+from time import perf_counter
+import logging
+import os
+import threading
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_METHOD = 'scrypt'
+
+
+class PasswordHasherBusy(Exception):
+    """Raised when the hashing queue stays full for longer than the timeout."""
+
+
+def hash_parameters(method):
+    """
+    Canonical parameter string for a werkzeug hash method.
+
+    'scrypt' and 'scrypt:32768:8:1' both give 'scrypt:32768:8:1', the prefix
+    werkzeug stores before the first '$' of a hash.
+    """
+    return generate_password_hash('', method=method).split('$', 1)[0]
+
+
+class PasswordHasher:
+    """
+    Hashes and verifies passwords in a bounded process pool.
+
+    With workers=0 everything runs inline on the calling thread, which is what
+    CLI scripts get until init_app() configures a pool.
+    """
+
+    def __init__(self, method=DEFAULT_METHOD, workers=0, max_queue=None, timeout=10.0):
+        self._executor = None
+        self._executor_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.configure(method, workers, max_queue, timeout)
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+        self.busy_seconds = 0.0
+        self.pool_restarts = 0
+
+    def configure(self, method=DEFAULT_METHOD, workers=0, max_queue=None, timeout=10.0):
+        self.method = method
+        self._parameters = None
+        self.workers = workers
+        self.max_queue = max_queue or max(workers * 4, 1)
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(self.max_queue)
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+                self._executor = None
+
+    def init_app(self, app):
+        self.configure(
+            method=app.config['PASSWORD_HASH_METHOD'],
+            workers=app.config['PASSWORD_HASH_WORKERS'],
+            max_queue=app.config['PASSWORD_HASH_QUEUE'],
+            timeout=app.config['PASSWORD_HASH_TIMEOUT'],
+        )
+        if app.config['PASSWORD_HASH_BENCHMARK']:
+            result = benchmark(self.method, workers=self.workers or 1)
+            logger.info("Password hashing %s: %.1f ms per verify, capacity ~%.0f logins/sec with %d workers",
+                        result['parameters'], result['verify_ms'], result['logins_per_sec'], result['workers'])
+
+    @property
+    def parameters(self):
+        """Canonical parameters of the configured method, as stored in hashes."""
+        if self._parameters is None:
+            self._parameters = hash_parameters(self.method)
+        return self._parameters
+
+    def hash(self, password):
+        """Hash `password` with the configured method."""
+        return self._run(generate_password_hash, password, self.method)
+
+    def verify(self, password_hash, password):
+        """Return True if `password` matches `password_hash`."""
+        return self._run(check_password_hash, password_hash, password)
+
+    def needs_rehash(self, password_hash):
+        """True if `password_hash` was made with different parameters than the configured method."""
+        return password_hash.split('$', 1)[0] != self.parameters
+
+    def stats(self):
+        return {
+            'method': self.parameters,
+            'workers': self.workers,
+            'max_queue': self.max_queue,
+            'queue_depth': self.in_flight,
+            'max_queue_depth': self.max_in_flight,
+            'completed': self.completed,
+            'rejected': self.rejected,
+            'pool_restarts': self.pool_restarts,
+            'avg_ms': round(self.busy_seconds / self.completed * 1000, 3) if self.completed else 0.0,
+        }
+
+    def _run(self, function, *args):
+        if not self.workers:
+            return self._timed(function, *args)
+        if not self._slots.acquire(timeout=self.timeout):
+            with self._stats_lock:
+                self.rejected += 1
+            raise PasswordHasherBusy(f'{self.max_queue} password hashing jobs already queued')
+        try:
+            self._track(1)
+            started = perf_counter()
+            # Only the wait for a slot is bounded; an accepted job is a fixed amount of work.
+            result = self._submit(function, *args)
+            with self._stats_lock:
+                self.completed += 1
+                self.busy_seconds += perf_counter() - started
+            return result
+        finally:
+            self._track(-1)
+            self._slots.release()
+
+    def _submit(self, function, *args):
+        executor = self._pool()
+        try:
+            return executor.submit(function, *args).result()
+        except BrokenProcessPool:
+            # A worker died (killed, out of memory); the executor stays broken for good.
+            logger.warning("Password hashing pool is broken; starting a new one")
+            self._discard_pool(executor)
+        executor = self._pool()
+        try:
+            return executor.submit(function, *args).result()
+        except BrokenProcessPool:
+            logger.error("Replacement password hashing pool is broken too; hashing on the request thread")
+            self._discard_pool(executor)
+            return function(*args)
+
+    def _discard_pool(self, executor):
+        with self._executor_lock:
+            if self._executor is executor:
+                self._executor = None
+                with self._stats_lock:
+                    self.pool_restarts += 1
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def _timed(self, function, *args):
+        started = perf_counter()
+        result = function(*args)
+        with self._stats_lock:
+            self.completed += 1
+            self.busy_seconds += perf_counter() - started
+        return result
+
+    def _track(self, change):
+        with self._stats_lock:
+            self.in_flight += change
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+
+    def _pool(self):
+        if self._executor is None:
+            with self._executor_lock:
+                if self._executor is None:
+                    self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=get_context('spawn'))
+        return self._executor
+
+
+def benchmark(method=DEFAULT_METHOD, samples=5, workers=None):
+    """
+    Measure hash and verify cost for `method` on this host.
+
+    :param method: werkzeug hash method, e.g. 'scrypt' or 'pbkdf2:sha256:600000'
+    :param samples: Number of timed hash/verify pairs
+    :param workers: Processes available for verification (defaults to the CPU count)
+    :return: Dict with parameters, hash_ms, verify_ms and the login capacity in logins/sec
+    """
+    workers = workers or os.cpu_count() or 1
+    hash_times, verify_times = [], []
+    for i in range(samples):
+        started = perf_counter()
+        password_hash = generate_password_hash(f'benchmark-{i}', method=method)
+        hash_times.append(perf_counter() - started)
+        started = perf_counter()
+        check_password_hash(password_hash, f'benchmark-{i}')
+        verify_times.append(perf_counter() - started)
+    verify_ms = sorted(verify_times)[len(verify_times) // 2] * 1000
+    return {
+        'parameters': hash_parameters(method),
+        'hash_ms': round(sorted(hash_times)[len(hash_times) // 2] * 1000, 2),
+        'verify_ms': round(verify_ms, 2),
+        'workers': workers,
+        'logins_per_sec': round(workers * 1000 / verify_ms, 1) if verify_ms else None,
+    }
+
+
+password_hasher = PasswordHasher()
@@ -0,0 +1,198 @@
+"""
+Per-request query counting and slow statement capture.
+
+Cursor events on every Engine time each statement. The count and DB time are
+added to the current request's totals, which are returned as response headers
+(X-DB-Query-Count, X-DB-Time-Ms, Server-Timing) and folded into per-endpoint
+aggregates. Statements slower than PERF_SLOW_QUERY_MS are kept, with their
+parameters, in a bounded top-N list. Both are shown on /admin/perf.
+
+The per-statement cost is two perf_counter() calls and a few dict updates, so
+the profiler is on by default (PERF_ENABLED=false turns it off).
+"""
+from datetime import datetime, timezone
+from time import perf_counter
+import heapq
+import itertools
+import logging
+import threading
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+# Longest statement text and parameter repr kept for a slow statement.
+MAX_STATEMENT_LENGTH = 2000
+MAX_PARAMETERS_LENGTH = 500
+
+
+class RouteStats:
+    """Running totals for one endpoint."""
+
+    __slots__ = ('endpoint', 'requests', 'queries', 'db_seconds', 'seconds', 'max_queries', 'max_db_seconds', 'flagged')
+
+    def __init__(self, endpoint):
+        self.endpoint = endpoint
+        self.requests = 0
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.seconds = 0.0
+        self.max_queries = 0
+        self.max_db_seconds = 0.0
+        self.flagged = 0
+
+    def as_dict(self):
+        return {
+            'endpoint': self.endpoint,
+            'requests': self.requests,
+            'avg_queries': round(self.queries / self.requests, 1) if self.requests else 0.0,
+            'max_queries': self.max_queries,
+            'avg_db_ms': round(self.db_seconds / self.requests * 1000, 2) if self.requests else 0.0,
+            'max_db_ms': round(self.max_db_seconds * 1000, 2),
+            'avg_ms': round(self.seconds / self.requests * 1000, 2) if self.requests else 0.0,
+            'flagged': self.flagged,
+        }
+
+
+class QueryProfiler:
+    """
+    Counts queries and DB time per request and remembers the slowest statements.
+
+    :param slow_query_ms: Statements at least this slow are captured
+    :param query_threshold: Requests running more queries than this are flagged
+    :param db_time_threshold_ms: Requests spending more DB time than this are flagged
+    :param top_statements: Number of slow statements kept
+    """
+
+    def __init__(self, slow_query_ms=100.0, query_threshold=30, db_time_threshold_ms=250.0, top_statements=20):
+        self._lock = threading.Lock()
+        self._sequence = itertools.count()
+        self._listening = False
+        self.configure(slow_query_ms, query_threshold, db_time_threshold_ms, top_statements)
+        self.reset()
+
+    def configure(self, slow_query_ms=100.0, query_threshold=30, db_time_threshold_ms=250.0, top_statements=20):
+        self.slow_query_seconds = slow_query_ms / 1000
+        self.query_threshold = query_threshold
+        self.db_time_threshold_seconds = db_time_threshold_ms / 1000
+        self.top_statements = top_statements
+
+    def init_app(self, app):
+        if not app.config['PERF_ENABLED']:
+            return
+        self.configure(
+            slow_query_ms=app.config['PERF_SLOW_QUERY_MS'],
+            query_threshold=app.config['PERF_QUERY_THRESHOLD'],
+            db_time_threshold_ms=app.config['PERF_DB_TIME_THRESHOLD_MS'],
+            top_statements=app.config['PERF_TOP_STATEMENTS'],
+        )
+        if not self._listening:
+            event.listen(Engine, 'before_cursor_execute', self._before_cursor_execute)
+            event.listen(Engine, 'after_cursor_execute', self._after_cursor_execute)
+            self._listening = True
+        app.before_request(self._start_request)
+        app.after_request(self._finish_request)
+
+    def reset(self):
+        """Drop all route totals and captured statements."""
+        with self._lock:
+            self.routes = {}
+            self._slow = []
+            self.started_at = datetime.now(timezone.utc)
+
+    def route_stats(self):
+        """Per-endpoint totals, heaviest (by average query count) first."""
+        with self._lock:
+            rows = [stats.as_dict() for stats in self.routes.values()]
+        return sorted(rows, key=lambda row: (row['avg_queries'], row['avg_db_ms']), reverse=True)
+
+    def slow_statements(self):
+        """Captured slow statements, slowest first."""
+        with self._lock:
+            entries = [entry for _, _, entry in self._slow]
+        return sorted(entries, key=lambda entry: entry['duration_ms'], reverse=True)
+
+    def request_totals(self):
+        """(query count, DB seconds) so far in the current request, or None outside one."""
+        if not has_request_context():
+            return None
+        totals = g.get('_query_profile')
+        return (totals[0], totals[1]) if totals else None
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if context is not None:
+            context._profile_started = perf_counter()
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, '_profile_started', None)
+        if started is None:
+            return
+        elapsed = perf_counter() - started
+        endpoint = None
+        if has_request_context():
+            totals = g.get('_query_profile')
+            if totals is not None:
+                totals[0] += 1
+                totals[1] += elapsed
+            endpoint = request.endpoint
+        if elapsed >= self.slow_query_seconds:
+            self._capture(statement, parameters, executemany, elapsed, endpoint)
+
+    def _capture(self, statement, parameters, executemany, elapsed, endpoint):
+        with self._lock:
+            if len(self._slow) >= self.top_statements and elapsed <= self._slow[0][0]:
+                return
+        entry = {
+            'duration_ms': round(elapsed * 1000, 2),
+            'statement': statement[:MAX_STATEMENT_LENGTH],
+            'parameters': repr(parameters)[:MAX_PARAMETERS_LENGTH],
+            'executemany': executemany,
+            'endpoint': endpoint,
+            'captured_at': datetime.now(timezone.utc),
+        }
+        item = (elapsed, next(self._sequence), entry)
+        with self._lock:
+            if len(self._slow) < self.top_statements:
+                heapq.heappush(self._slow, item)
+            elif elapsed > self._slow[0][0]:
+                heapq.heapreplace(self._slow, item)
+
+    def _start_request(self):
+        g._query_profile = [0, 0.0, perf_counter()]
+
+    def _finish_request(self, response):
+        totals = g.pop('_query_profile', None)
+        if totals is None:
+            return response
+        queries, db_seconds, started = totals
+        elapsed = perf_counter() - started
+        response.headers['X-DB-Query-Count'] = str(queries)
+        response.headers['X-DB-Time-Ms'] = f'{db_seconds * 1000:.2f}'
+        response.headers.add('Server-Timing', f'db;dur={db_seconds * 1000:.2f};desc="{queries} queries"')
+
+        endpoint = request.endpoint
+        if endpoint is None or endpoint == 'static':
+            return response
+        flagged = queries > self.query_threshold or db_seconds > self.db_time_threshold_seconds
+        if flagged:
+            logger.warning("%s %s ran %d queries in %.1f ms (thresholds: %d queries, %.0f ms)",
+                           request.method, endpoint, queries, db_seconds * 1000,
+                           self.query_threshold, self.db_time_threshold_seconds * 1000)
+        with self._lock:
+            stats = self.routes.get(endpoint)
+            if stats is None:
+                stats = self.routes[endpoint] = RouteStats(endpoint)
+            stats.requests += 1
+            stats.queries += queries
+            stats.db_seconds += db_seconds
+            stats.seconds += elapsed
+            stats.max_queries = max(stats.max_queries, queries)
+            stats.max_db_seconds = max(stats.max_db_seconds, db_seconds)
+            if flagged:
+                stats.flagged += 1
+        return response
+
+
+profiler = QueryProfiler()
@@ -0,0 +1,36 @@
+"""
+Bring the analytics rollup tables up to date.
+
+    python refresh_analytics.py          # recompute days changed since the last run
+    python refresh_analytics.py --full   # rebuild every rollup from the raw tables
+
+Run it periodically (cron, a scheduled task) so the analytics dashboard has
+little or nothing left to refresh when it is opened. Rollup tables created on
+an existing database are backfilled in full by the first run.
+"""
+import argparse
+from time import perf_counter
+
+from app import create_app
+from analytics import refresh_rollups
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Refresh the analytics rollup tables.')
+    parser.add_argument('--full', action='store_true', help='Rebuild all rollups instead of only the changed days')
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        started = perf_counter()
+        refreshed = refresh_rollups(full=args.full)
+        elapsed = (perf_counter() - started) * 1000
+        if refreshed:
+            summary = ', '.join(f"{kind}: {days} days" for kind, days in sorted(refreshed.items()))
+            print(f"Refreshed {summary} in {elapsed:.0f} ms")
+        else:
+            print("Analytics rollups are up to date.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,201 @@
+import csv
+import io
+import zlib
+
+from sqlalchemy import func
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Columnar exports are optional: pip install pyarrow
+    pa = pq = None
+
+from extensions import db
+from models import Schedule, Team, TimeOffRequest, User
+from utils import hours_between
+
+REPORT_HEADERS = {
+    'user_hours': ['Name', 'Total Hours'],
+    'team_hours': ['Name', 'Total Hours'],
+    'time_off_requests': ['Username', 'Start Date', 'End Date', 'Status'],
+}
+
+# Rows fetched per round trip while streaming, and rows written per yielded chunk.
+STREAM_BATCH_SIZE = 1000
+# Rows per Arrow record batch / Parquet row group. Larger batches compress better.
+COLUMNAR_BATCH_SIZE = 65536
+
+COLUMNAR_FORMATS = {
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+    'arrow': ('application/vnd.apache.arrow.stream', 'arrows'),
+}
+
+
+def report_query(report_type, start_date, end_date):
+    """
+    Build the query behind a custom report without running it.
+
+    :param report_type: 'user_hours', 'team_hours' or 'time_off_requests'
+    :param start_date: Start of the reporting period
+    :param end_date: End of the reporting period
+    :return: Query, or None for an unknown report type
+    """
+    if report_type == 'user_hours':
+        return db.session.query(
+            User.username,
+            func.sum(hours_between(Schedule.start_time, Schedule.end_time)).label('total_hours')
+        ).join(Schedule).filter(Schedule.start_time >= start_date, Schedule.end_time <= end_date).group_by(User.username)
+    if report_type == 'team_hours':
+        return db.session.query(
+            Team.name,
+            func.sum(hours_between(Schedule.start_time, Schedule.end_time)).label('total_hours')
+        ).join(User, User.team_id == Team.id).join(Schedule, Schedule.user_id == User.id).filter(
+            Schedule.start_time >= start_date, Schedule.end_time <= end_date
+        ).group_by(Team.name)
+    if report_type == 'time_off_requests':
+        return db.session.query(
+            User.username,
+            TimeOffRequest.start_date,
+            TimeOffRequest.end_date,
+            TimeOffRequest.status
+        ).join(TimeOffRequest).filter(
+            TimeOffRequest.start_date >= start_date, TimeOffRequest.end_date <= end_date
+        ).order_by(TimeOffRequest.start_date, TimeOffRequest.id)
+    return None
+
+
+def format_report_row(report_type, row):
+    if report_type == 'time_off_requests':
+        return [row[0], row[1].strftime('%Y-%m-%d'), row[2].strftime('%Y-%m-%d'), row[3]]
+    return [row[0], f"{row[1]:.2f}"]
+
+
+def stream_csv(report_type, query, compress=False):
+    """
+    Yield a report as CSV bytes, a batch of rows at a time.
+
+    Rows come from a server-side cursor (yield_per), so memory stays flat
+    however many rows the report has.
+
+    :param report_type: Report type, selects the header and row format
+    :param query: Query returned by report_query()
+    :param compress: Yield a gzip stream instead of plain CSV
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    compressor = zlib.compressobj(wbits=31) if compress else None
+
+    def drain():
+        data = buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+        return compressor.compress(data) if compressor else data
+
+    writer.writerow(REPORT_HEADERS.get(report_type, []))
+    pending = 0
+    if query is not None:
+        for row in query.yield_per(STREAM_BATCH_SIZE):
+            writer.writerow(format_report_row(report_type, row))
+            pending += 1
+            if pending == STREAM_BATCH_SIZE:
+                chunk = drain()
+                if chunk:
+                    yield chunk
+                pending = 0
+    chunk = drain()
+    if compressor:
+        chunk += compressor.flush()
+    if chunk:
+        yield chunk
+
+
+def columnar_export_available():
+    return pa is not None
+
+
+def report_schema(report_type):
+    if report_type == 'time_off_requests':
+        return pa.schema([
+            ('username', pa.string()),
+            ('start_date', pa.date32()),
+            ('end_date', pa.date32()),
+            ('status', pa.string()),
+        ])
+    return pa.schema([('name', pa.string()), ('total_hours', pa.float64())])
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file that hands written bytes back to a generator and keeps an absolute position."""
+
+    def __init__(self):
+        super().__init__()
+        self.chunks = []
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        data = bytes(data)
+        self.chunks.append(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+def _record_batches(query, schema):
+    rows = []
+    for row in query.yield_per(COLUMNAR_BATCH_SIZE):
+        rows.append(row)
+        if len(rows) == COLUMNAR_BATCH_SIZE:
+            yield _to_record_batch(rows, schema)
+            rows = []
+    if rows:
+        yield _to_record_batch(rows, schema)
+
+
+def _to_record_batch(rows, schema):
+    arrays = []
+    for values, field in zip(zip(*rows), schema):
+        if pa.types.is_floating(field.type):
+            # Postgres returns the hour sums as Decimal.
+            values = [None if value is None else float(value) for value in values]
+        arrays.append(pa.array(values, type=field.type))
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def stream_columnar(report_type, query, export_format):
+    """
+    Yield a report as Parquet (one row group per batch) or an Arrow IPC stream.
+
+    Record batches are built straight from the result rows, COLUMNAR_BATCH_SIZE
+    at a time, and the encoded bytes are yielded as each batch is written.
+
+    :param report_type: Report type, selects the schema
+    :param query: Query returned by report_query()
+    :param export_format: 'parquet' or 'arrow'
+    """
+    schema = report_schema(report_type)
+    sink = _ChunkSink()
+    if export_format == 'parquet':
+        writer = pq.ParquetWriter(sink, schema, compression='zstd')
+    else:
+        writer = pa.ipc.new_stream(sink, schema)
+
+    if query is not None:
+        for batch in _record_batches(query, schema):
+            writer.write_batch(batch)
+            chunk = sink.drain()
+            if chunk:
+                yield chunk
+    writer.close()
+    chunk = sink.drain()
+    if chunk:
+        yield chunk
@@ -1,18 +1,32 @@
 import pytz
-from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, current_app, send_file
+from flask import (Blueprint, render_template, request, redirect, url_for, flash, jsonify, current_app, Response,
+                   stream_with_context)
 from flask_login import login_user, login_required, logout_user, current_user
-from werkzeug.security import check_password_hash, generate_password_hash
-from models import User, Team, Schedule, Note, TimeOffRequest, UserActivity, TeamColor, Role, Permission
-from sqlalchemy import func
+from models import User, Team, Schedule, Note, TimeOffRequest, UserActivity, TeamColor, Role, Permission, role_permission_cache
+from sqlalchemy import func, text
 from datetime import datetime, timedelta, timezone
 from sqlalchemy.exc import SQLAlchemyError, OperationalError, IntegrityError
-from scheduling_algorithm import generate_advanced_schedule
+from scheduling_algorithm import (generate_advanced_schedule, batch_generate_schedules, generation_options, SOLVERS,
+                                  repair_schedule_for_time_off, RotationConstraints)
 import logging
-from utils import admin_required, manager_required, get_user_local_time, permission_required
+from utils import (admin_required, manager_required, get_user_local_time, permission_required, parse_iso_utc,
+                   hours_between)
+from helpers import format_phone_number
+from on_call import resolver as on_call_resolver
+from db_pool import pool_stats
+from identity import identity_cache
+from analytics import refresh_rollups, dashboard_data as analytics_dashboard_data
+from passwords import password_hasher, PasswordHasherBusy
+from profiling import profiler
+from metrics import count_bytes
+from choices import search_users, team_choices, user_label, USER_SEARCH_LIMIT
+from listings import schedule_page, user_page, page_size, InvalidCursor
+from bulk_schedules import (import_schedules, parse_flag, rows_from_csv, rows_from_json, MODES as BULK_MODES,
+                            ON_CONFLICT as BULK_ON_CONFLICT)
+from shift_coverage import analyze_coverage, COVERAGE_DEFAULT_DAYS, COVERAGE_MAX_DAYS
+from reports import report_query, stream_csv, stream_columnar, columnar_export_available, COLUMNAR_FORMATS
 from permissions import *
 import traceback
-import csv
-import io
 import pytz
 from forms import UserForm, TeamForm, PhoneNumberField, ScheduleForm, TimeoffForm   
 from extensions import db
@@ -34,18 +48,35 @@ def index():
     else:
         return redirect(url_for('auth.login'))
 
+@main.route('/healthz')
+def healthz():
+    """Liveness: the process is up and serving requests. Does not touch the database."""
+    return jsonify({"status": "ok"})
+
+@main.route('/readyz')
+def readyz():
+    """Readiness: the database answers, plus connection pool statistics."""
+    try:
+        with db.engine.connect() as connection:
+            connection.execute(text('SELECT 1'))
+    except SQLAlchemyError as e:
+        logger.error(f"Readiness check failed: {str(e)}")
+        return jsonify({"status": "unavailable", "database": "error", "pool": pool_stats(db.engine)}), 503
+    return jsonify({"status": "ready", "database": "ok", "pool": pool_stats(db.engine),
+                    "password_hasher": password_hasher.stats()})
+
 @main.route('/dashboard')
 @login_required
 @permission_required(VIEW_DASHBOARD)
 def dashboard():
-    logger.debug(f"User authenticated: {current_user.is_authenticated}")
-    logger.debug(f"Current user: {current_user}")
     try:
-        logger.debug("Starting index route")
-        logger.info(f"User {current_user.username} accessing index page")
+        logger.debug("User %s accessing dashboard", current_user.username)
         
         logger.debug("Fetching user schedules")
-        user_schedules = db.session.query(Schedule).filter_by(user_id=current_user.id).all()
+        user_schedules = db.session.query(Schedule).filter(
+            Schedule.user_id == current_user.id,
+            Schedule.end_time >= datetime.utcnow()
+        ).order_by(Schedule.start_time).all()
         user_tz = pytz.timezone(current_user.timezone)
         for schedule in user_schedules:
             schedule.start_time = schedule.start_time.replace(tzinfo=timezone.utc).astimezone(user_tz)
@@ -54,29 +85,16 @@ def dashboard():
             logger.warning("User schedules query returned None")
             user_schedules = []
         
-        logger.debug("Fetching all schedules")
-        all_schedules = db.session.query(Schedule).options(
-            db.joinedload(Schedule.user).joinedload(User.team).joinedload(Team.color)
-        ).all()
-        if all_schedules is None:
-            logger.warning("All schedules query returned None")
-            all_schedules = []
-        
         logger.debug("Fetching team notes")
         notes = db.session.query(Note).filter_by(team_id=current_user.team_id).all()
         if notes is None:
             logger.warning("Team notes query returned None")
             notes = []
         
-        now = datetime.now(timezone.utc)
         user_local_time = get_user_local_time(current_user)
-        on_call_users = db.session.query(User).join(Schedule).filter(
-            Schedule.start_time <= now,
-            Schedule.end_time >= now
-        ).options(db.joinedload(User.team)).all()
+        on_call_users = on_call_resolver.on_call_users()
        
-        logger.debug(f"Rendering dashboard for user {current_user.username}")
-        return render_template('dashboard.html', user_schedules=user_schedules, all_schedules=all_schedules, notes=notes, on_call_users=on_call_users, user_local_time=user_local_time)
+        return render_template('dashboard.html', user_schedules=user_schedules, notes=notes, on_call_users=on_call_users, user_local_time=user_local_time)
     except OperationalError as e:
         logger.error(f"Database connection error in index route: {str(e)}")
         logger.error(traceback.format_exc())
@@ -95,30 +113,123 @@ def dashboard():
     finally:
         pass
 
+@main.route('/api/schedules')
+@login_required
+@permission_required(VIEW_DASHBOARD)
+def schedule_events():
+    """FullCalendar event feed: only schedules overlapping [start, end), optionally for one team."""
+    try:
+        range_start = parse_iso_utc(request.args['start'])
+        range_end = parse_iso_utc(request.args['end'])
+    except (KeyError, ValueError):
+        return jsonify({"status": "error", "message": "start and end must be ISO 8601 timestamps"}), 400
+    team_id = request.args.get('team', type=int)
+
+    query = db.session.query(
+        Schedule.id,
+        Schedule.start_time,
+        Schedule.end_time,
+        User.username,
+        User._mobile_phone,
+        Team.name,
+        TeamColor.hex_value
+    ).join(User, Schedule.user_id == User.id).outerjoin(Team, User.team_id == Team.id).outerjoin(
+        TeamColor, Team.color_id == TeamColor.id
+    ).filter(
+        Schedule.start_time < range_end,
+        Schedule.end_time > range_start
+    )
+    if team_id:
+        query = query.filter(User.team_id == team_id)
+
+    events = []
+    for schedule_id, start_time, end_time, username, mobile_phone, team_name, color in query:
+        team_name = team_name or 'No Team'
+        events.append({
+            'id': schedule_id,
+            'title': f'{username} ({team_name})',
+            'start': start_time.isoformat(),
+            'end': end_time.isoformat(),
+            'color': color or '#000000',
+            'extendedProps': {
+                'teamName': team_name,
+                'userName': username,
+                'mobilePhone': format_phone_number(mobile_phone) or 'N/A'
+            }
+        })
+    return jsonify(events)
+
+@main.route('/api/on_call')
+@login_required
+@permission_required(VIEW_DASHBOARD)
+def on_call_status():
+    """Current and next on-call user per team, served from the in-memory resolver."""
+    team_id = request.args.get('team', type=int)
+    snapshot = on_call_resolver.snapshot()
+    teams = snapshot['teams']
+    if team_id:
+        teams = [team for team in teams if team['team_id'] == team_id]
+
+    def shift_json(shift):
+        return {
+            'user_id': shift['user_id'],
+            'username': shift['username'],
+            'email': shift['email'],
+            'mobile_phone': shift['mobile_phone'],
+            'start': shift['start_time'].isoformat() + 'Z',
+            'end': shift['end_time'].isoformat() + 'Z'
+        }
+
+    response = jsonify({
+        'as_of': snapshot['as_of'].isoformat() + 'Z',
+        'valid_until': snapshot['valid_until'].isoformat() + 'Z',
+        'teams': [{
+            'team_id': team['team_id'],
+            'team_name': team['team_name'],
+            'current': [shift_json(shift) for shift in team['current']],
+            'next': shift_json(team['next']) if team['next'] else None
+        } for team in teams]
+    })
+    response.cache_control.private = True
+    # Never longer than the resolver's own max_age: edits are not visible to a cached response.
+    response.cache_control.max_age = max(min(int((snapshot['valid_until'] - snapshot['as_of']).total_seconds()),
+                                             on_call_resolver.max_age), 0)
+    return response
+
 @auth.route('/login', methods=['GET', 'POST'])
 def login():
     if request.method == 'POST':
         username = request.form.get('username')
         password = request.form.get('password')
-        logger.debug(f"Login attempt for username: {username}")
+        logger.debug("Login attempt for username: %s", username)
 
         try:
             user = db.session.query(User).filter_by(username=username).first()
-            if user and check_password_hash(user.password_hash, password):
-                logger.debug(f"user.is_active: {user.is_active}")
-                logger.info(f"Successful login for user: {user.username}")
+            if user and user.check_password(password):
+                if password_hasher.needs_rehash(user.password_hash):
+                    # Hash parameters changed since this password was set; upgrade while we have it.
+                    try:
+                        user.set_password(password)
+                        db.session.commit()
+                        logger.info("Upgraded password hash for user: %s", user.username)
+                    except PasswordHasherBusy:
+                        # The password is already verified; leave the upgrade to a later login.
+                        logger.info("Skipped password hash upgrade for user %s, hashing saturated", user.username)
+                logger.info("Successful login for user: %s", user.username)
                 login_user(user)
-                logger.debug(f"After login_user, current_user.is_authenticated: {current_user.is_authenticated}")
-                logger.debug(f"Redirecting user {user.username} to the index page")
 
                 # Redirect to the page the user was trying to access or index
                 next_page = request.args.get('next')
                 return redirect(next_page or url_for('main.dashboard'))
             else:
-                logger.warning(f"Failed login attempt for user: {username}")
+                logger.warning("Failed login attempt for user: %s", username)
                 flash('Invalid username or password.', 'danger')
                 return render_template('login.html')
 
+        except PasswordHasherBusy as e:
+            logger.warning(f"Login rejected, password hashing saturated: {str(e)}")
+            flash('The server is busy. Please try again in a moment.', 'danger')
+            return render_template('login.html'), 503
         except SQLAlchemyError as e:
             logger.error(f"Database error during login: {str(e)}")
             logger.error(traceback.format_exc())
@@ -142,13 +253,33 @@ def logout():
     flash('You have been logged out.', 'info')
     return redirect(url_for('main.index'))
 
+@admin.route('/perf')
+@login_required
+@permission_required(MANAGE_PERMISSIONS)
+def perf():
+    """Per-endpoint query counts and DB time, and the slowest statements captured since the last reset."""
+    return render_template('perf.html',
+                           routes=profiler.route_stats(),
+                           slow_statements=profiler.slow_statements(),
+                           profiler=profiler,
+                           pool=pool_stats(db.engine))
+
+@admin.route('/perf/reset', methods=['POST'])
+@login_required
+@permission_required(MANAGE_PERMISSIONS)
+def reset_perf():
+    profiler.reset()
+    logger.info("User %s reset query profiling statistics", current_user.username)
+    flash('Profiling statistics have been reset.', 'success')
+    return redirect(url_for('admin.perf'))
+
 @admin.route('/analytics', methods=['GET', 'POST'])
 @login_required
 @permission_required(VIEW_ANALYTICS)
 def analytics_dashboard():
     
     try:
-        logger.info(f"User {current_user.username} accessing analytics dashboard")
+        logger.info("User %s accessing analytics dashboard", current_user.username)
         
         if request.method == 'POST':
             start_date = datetime.strptime(request.form.get('start_date'), '%Y-%m-%d')
@@ -157,62 +288,28 @@ def analytics_dashboard():
             end_date = datetime.now(timezone.utc)
             start_date = end_date - timedelta(days=30)
 
-        logger.debug("Fetching total users")
         total_users = db.session.query(func.count(User.id)).scalar()
-        logger.debug(f"Total users: {total_users}")
-
-        logger.debug("Fetching total teams")
         total_teams = db.session.query(func.count(Team.id)).scalar()
-        logger.debug(f"Total teams: {total_teams}")
-
-        logger.debug("Fetching total schedules")
         total_schedules = db.session.query(func.count(Schedule.id)).scalar()
-        logger.debug(f"Total schedules: {total_schedules}")
-
-        logger.debug("Calculating average schedule hours")
-        avg_schedule_hours = db.session.query(func.avg(func.extract('epoch', Schedule.end_time - Schedule.start_time) / 3600)).scalar()
+        avg_schedule_hours = db.session.query(func.avg(hours_between(Schedule.start_time, Schedule.end_time))).scalar()
         if avg_schedule_hours is None:
             logger.warning("Average schedule hours is None, setting to 0")
             avg_schedule_hours = 0
-        logger.debug(f"Average schedule hours: {avg_schedule_hours:.2f}")
-
-        logger.debug("Fetching user hours")
-        user_hours = db.session.query(
-            User.username,
-            func.sum(func.extract('epoch', Schedule.end_time - Schedule.start_time) / 3600).label('total_hours')
-        ).join(Schedule).filter(Schedule.start_time >= start_date, Schedule.end_time <= end_date).group_by(User.username).all()
-        logger.debug(f"User hours: {user_hours}")
-
-        logger.debug("Fetching team hours")
-        team_hours = db.session.query(
-            Team.name,
-            func.sum(func.extract('epoch', Schedule.end_time - Schedule.start_time) / 3600).label('total_hours')
-        ).join(User, User.team_id == Team.id).join(Schedule, Schedule.user_id == User.id).filter(
-            Schedule.start_time >= start_date, 
-            Schedule.end_time <= end_date
-        ).group_by(Team.name).all()
-        logger.debug(f"Team hours: {team_hours}")
-
-        logger.debug("Fetching time off status")
-        time_off_status = db.session.query(
-            TimeOffRequest.status,
-            func.count(TimeOffRequest.id)
-        ).filter(TimeOffRequest.start_date >= start_date, TimeOffRequest.end_date <= end_date).group_by(TimeOffRequest.status).all()
-        logger.debug(f"Time off status: {time_off_status}")
-
-        logger.debug("Fetching time off trends")
-        time_off_trends = db.session.query(
-            func.date_trunc('month', TimeOffRequest.start_date).label('month'),
-            func.count(TimeOffRequest.id)
-        ).filter(TimeOffRequest.start_date >= start_date, TimeOffRequest.end_date <= end_date).group_by('month').order_by('month').all()
-        logger.debug(f"Time off trends: {time_off_trends}")
-
-        logger.debug("Fetching user activity")
-        user_activity = db.session.query(
-            User.username,
-            func.count(UserActivity.id).label('login_count')
-        ).join(UserActivity).filter(UserActivity.timestamp >= start_date, UserActivity.timestamp <= end_date, UserActivity.activity_type == 'login').group_by(User.username).all()
-        logger.debug(f"User activity: {user_activity}")
+        logger.debug("Analytics totals: %d users, %d teams, %d schedules, %.2f average hours",
+                     total_users, total_teams, total_schedules, avg_schedule_hours)
+
+        # Charts read the daily rollups; recompute any days changed since the last refresh first.
+        try:
+            refresh_rollups()
+        except SQLAlchemyError as e:
+            # Another refresh kept winning; show the rollups as they are rather than fail the page.
+            logger.warning("Analytics rollup refresh failed, serving the last refreshed data: %s", e)
+        rollups = analytics_dashboard_data(start_date.date(), end_date.date())
+        user_hours = rollups['user_hours']
+        team_hours = rollups['team_hours']
+        time_off_status = rollups['time_off_status']
+        time_off_trends = rollups['time_off_trends']
+        user_activity = rollups['user_activity']
 
         return render_template('analytics_dashboard.html',
                                total_users=total_users,
@@ -238,15 +335,36 @@ def analytics_dashboard():
 @login_required
 @permission_required(MANAGE_USERS)
 def manage_users():
-    users = User.query.filter_by(is_active=True).all()
-    return render_template('manage_users.html', users=users)
+    return render_user_listing('manage_users.html', active=True)
 
 @admin.route('/manage_inactive_users')
 @login_required
 @permission_required(MANAGE_USERS)
 def manage_inactive_users():
-    users = User.query.filter_by(is_active=False).all()
-    return render_template('manage_inactive_users.html', users=users)
+    return render_user_listing('manage_inactive_users.html', active=False)
+
+def render_user_listing(template, active):
+    """
+    One keyset page of active or inactive users, filtered by the `q` prefix.
+
+    XHR requests get the page as JSON with the cursor for the next one.
+    """
+    query = request.args.get('q', '').strip()
+    try:
+        users, next_cursor = user_page(request.args.get('cursor'), page_size(request.args.get('limit')),
+                                       active=active, query=query)
+    except InvalidCursor:
+        if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+            return jsonify({"status": "error", "message": "Invalid cursor"}), 400
+        return redirect(url_for(request.endpoint))
+    if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+        for user in users:
+            user['details_url'] = url_for('admin.details_user', user_id=user['id'])
+            user['edit_url'] = url_for('admin.edit_user', user_id=user['id'])
+            user['activate_url'] = url_for('admin.activate_user', user_id=user['id'])
+            user['delete_url'] = url_for('admin.delete_user', user_id=user['id'])
+        return jsonify({"status": "success", "users": users, "next_cursor": next_cursor})
+    return render_template(template, users=users, next_cursor=next_cursor, query=query)
 
 @admin.route('/activate_user/<int:user_id>', methods=['POST'])
 @login_required
@@ -255,6 +373,7 @@ def activate_user(user_id):
     user = User.query.get_or_404(user_id)
     user.is_active = True
     db.session.commit()
+    identity_cache.invalidate(user.id)
     flash('User activated successfully.', 'success')
     return redirect(url_for('admin.manage_inactive_users'))
 
@@ -297,6 +416,7 @@ def edit_user(user_id):
         if form.team_id.data == 0:
             user.team_id = None
         db.session.commit()
+        identity_cache.invalidate(user.id)
         flash('User updated successfully.', 'success')
         return redirect(url_for('admin.manage_users'))
     return render_template('edit_user.html', form=form, user=user)
@@ -308,6 +428,7 @@ def delete_user(user_id):
     user = User.query.get_or_404(user_id)
     db.session.delete(user)
     db.session.commit()
+    identity_cache.invalidate(user_id)
     flash('User deleted successfully.', 'success')
     return redirect(url_for('admin.manage_users'))
 
@@ -353,6 +474,8 @@ def edit_team(team_id):
     if form.validate_on_submit():
         form.populate_obj(team)
         db.session.commit()
+        # Identities carry the team name.
+        identity_cache.invalidate()
         flash('Team updated successfully!', 'success')
         return redirect(url_for('admin.manage_teams'))
     managers = User.query.filter(User.role.has(name='manager')).all()
@@ -367,6 +490,7 @@ def delete_team(team_id):
     team = Team.query.get_or_404(team_id)
     db.session.delete(team)
     db.session.commit()
+    identity_cache.invalidate()
     flash('Team deleted successfully!', 'success')
     return redirect(url_for('admin.manage_teams'))
 
@@ -391,8 +515,39 @@ def manage_schedule():
         flash('Schedule created successfully', 'success')
         return redirect(url_for('manager.manage_schedule'))
     
-    schedules = Schedule.query.order_by(Schedule.start_time.desc()).all()
-    return render_template('manage_schedule.html', form=form, schedules=schedules)
+    try:
+        filters = {
+            'team_id': request.args.get('team_id', type=int),
+            'user_id': request.args.get('user_id', type=int),
+            'start': datetime.strptime(request.args['start'], '%Y-%m-%d') if request.args.get('start') else None,
+            # The end date is inclusive.
+            'end': datetime.strptime(request.args['end'], '%Y-%m-%d') + timedelta(days=1) if request.args.get('end') else None,
+        }
+        schedules, next_cursor = schedule_page(request.args.get('cursor'), page_size(request.args.get('limit')), **filters)
+    except (ValueError, InvalidCursor):
+        if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+            return jsonify({"status": "error", "message": "Invalid filter or cursor"}), 400
+        flash('Invalid schedule filter.', 'warning')
+        return redirect(url_for('manager.manage_schedule'))
+
+    if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+        return jsonify({
+            "status": "success",
+            "schedules": [{
+                "id": schedule['id'],
+                "username": schedule['username'],
+                "team_name": schedule['team_name'],
+                "start_time": schedule['start_time'].strftime('%Y-%m-%d %H:%M'),
+                "end_time": schedule['end_time'].strftime('%Y-%m-%d %H:%M'),
+                "edit_url": url_for('manager.edit_schedule', schedule_id=schedule['id']),
+            } for schedule in schedules],
+            "next_cursor": next_cursor,
+        })
+
+    filter_user = db.session.get(User, filters['user_id']) if filters['user_id'] else None
+    return render_template('manage_schedule.html', form=form, schedules=schedules, next_cursor=next_cursor,
+                           teams=team_choices()[1:], filters=request.args,
+                           filter_user=(filter_user.id, user_label(filter_user)) if filter_user else None)
 
         
 @manager.route('/advanced_schedule', methods=['GET', 'POST'])
@@ -400,18 +555,155 @@ def manage_schedule():
 @permission_required(MANAGE_SCHEDULES)
 def advanced_schedule():
     
+    teams = Team.query.order_by(Team.name).all()
     try:
-        logger.info(f"User {current_user.username} accessing advanced schedule page")
-        # Add any data processing or logic needed for advanced scheduling here
-        return render_template('advanced_manage_schedule.html')
+        logger.info("User %s accessing advanced schedule page", current_user.username)
+        if request.method == 'POST':
+            team_ids = [int(team_id) for team_id in request.form.getlist('team_ids')]
+            start_date = datetime.strptime(request.form.get('start_date'), '%Y-%m-%d').date()
+            end_date = datetime.strptime(request.form.get('end_date'), '%Y-%m-%d').date()
+            max_days = current_app.config['SCHEDULE_MAX_DAYS']
+            if not team_ids or end_date < start_date:
+                flash('Select at least one team and a valid date range.', 'warning')
+                return render_template('advanced_schedule.html', teams=teams)
+            if (end_date - start_date).days >= max_days:
+                flash(f'Choose a date range of at most {max_days} days.', 'warning')
+                return render_template('advanced_schedule.html', teams=teams)
+
+            report = batch_generate_schedules(team_ids, start_date, end_date,
+                                              max_workers=current_app.config['SCHEDULE_MAX_WORKERS'],
+                                              **generation_options(current_app.config))
+            flash(f"Generated {report['schedules_created']} schedules for {len(report['teams'])} teams in {report['total_ms']:.0f} ms.", 'success')
+            return render_template('advanced_schedule.html', teams=teams, report=report)
+        return render_template('advanced_schedule.html', teams=teams)
     except Exception as e:
         logger.error(f"Error in advanced_schedule route: {str(e)}")
         logger.error(traceback.format_exc())
-        flash('An error occurred while loading the advanced scheduling page.', 'error')
-        return render_template('advanced_manage_schedule.html')
+        flash('An error occurred while generating the advanced schedule.', 'error')
+        return render_template('advanced_schedule.html', teams=teams)
     finally:
         pass
 
+@manager.route('/api/generate_schedules', methods=['POST'])
+@login_required
+@permission_required(MANAGE_SCHEDULES)
+def batch_generate_schedules_api():
+    payload = request.get_json(silent=True) or {}
+    try:
+        team_ids = [int(team_id) for team_id in payload.get('team_ids', [])]
+        start_date = datetime.strptime(payload['start_date'], '%Y-%m-%d').date()
+        end_date = datetime.strptime(payload['end_date'], '%Y-%m-%d').date()
+        max_workers = int(payload['max_workers']) if payload.get('max_workers') else None
+        holidays = [datetime.strptime(day, '%Y-%m-%d').date() for day in payload.get('holidays', [])]
+        options = generation_options(current_app.config)
+        if 'time_budget' in payload:
+            options['time_budget'] = float(payload['time_budget'])
+        if 'solver' in payload:
+            options['solver'] = payload['solver']
+        seed = int(payload['seed']) if payload.get('seed') is not None else None
+    except (KeyError, TypeError, ValueError):
+        return jsonify({"status": "error", "message": "team_ids, start_date and end_date (YYYY-MM-DD) are required"}), 400
+    if not team_ids or end_date < start_date or (max_workers is not None and max_workers < 1):
+        return jsonify({"status": "error", "message": "Select at least one team and a valid date range"}), 400
+    # Every request runs on a server thread and its pool on the server's CPUs, so bound what one may ask for.
+    limits = current_app.config
+    if (end_date - start_date).days >= limits['SCHEDULE_MAX_DAYS']:
+        return jsonify({"status": "error", "message": f"Choose a date range of at most {limits['SCHEDULE_MAX_DAYS']} days"}), 400
+    if max_workers is not None and max_workers > limits['SCHEDULE_MAX_WORKERS']:
+        return jsonify({"status": "error", "message": f"max_workers must be at most {limits['SCHEDULE_MAX_WORKERS']}"}), 400
+    if 'time_budget' in payload and not 0 <= options['time_budget'] <= limits['SCHEDULE_MAX_TIME_BUDGET']:
+        return jsonify({"status": "error",
+                        "message": f"time_budget must be between 0 and {limits['SCHEDULE_MAX_TIME_BUDGET']} seconds"}), 400
+    if options['solver'] not in SOLVERS:
+        return jsonify({"status": "error", "message": f"Unknown solver '{options['solver']}'"}), 400
+
+    try:
+        report = batch_generate_schedules(team_ids, start_date, end_date,
+                                          max_workers=max_workers or limits['SCHEDULE_MAX_WORKERS'],
+                                          holidays=holidays, seed=seed, **options)
+        return jsonify({"status": "success", **report})
+    except SQLAlchemyError as e:
+        logger.error(f"Database error in batch_generate_schedules_api: {str(e)}")
+        return jsonify({"status": "error", "message": "A database error occurred while saving schedules"}), 500
+
+@manager.route('/api/schedules/bulk', methods=['POST'])
+@login_required
+@permission_required(MANAGE_SCHEDULES)
+def bulk_schedules_api():
+    """
+    Create or update many schedules at once, reporting overlaps per row.
+
+    Accepts JSON {"schedules": [...], "mode", "on_conflict", "dry_run"} or CSV
+    (an uploaded `file`, or a text/csv body) with options in the query string.
+    """
+    try:
+        if request.is_json:
+            payload = request.get_json(silent=True)
+            if not isinstance(payload, dict):
+                raise ValueError('Expected a JSON object with a schedules list')
+            rows = rows_from_json(payload.get('schedules'))
+            options = payload
+        else:
+            upload = request.files.get('file')
+            text = upload.read().decode('utf-8-sig') if upload else request.get_data(as_text=True)
+            rows = rows_from_csv(text)
+            options = {**request.args, **request.form}
+    except (ValueError, UnicodeDecodeError) as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+
+    try:
+        dry_run = parse_flag(options.get('dry_run'))
+    except ValueError:
+        return jsonify({"status": "error", "message": "dry_run must be true or false"}), 400
+    mode = options.get('mode') or 'insert'
+    on_conflict = options.get('on_conflict') or 'reject'
+    if mode not in BULK_MODES or on_conflict not in BULK_ON_CONFLICT:
+        return jsonify({"status": "error", "message": "mode must be insert or upsert, on_conflict reject or skip"}), 400
+    if not rows:
+        return jsonify({"status": "error", "message": "No schedules supplied"}), 400
+
+    try:
+        report = import_schedules(rows, mode=mode, on_conflict=on_conflict, dry_run=dry_run)
+    except SQLAlchemyError as e:
+        logger.error("Database error in bulk_schedules_api: %s", e)
+        return jsonify({"status": "error", "message": "A database error occurred while saving schedules"}), 500
+    logger.info("User %s bulk-imported schedules: %d created, %d updated, %d rejected",
+                current_user.username, report['created'], report['updated'], report['rejected'])
+    if report['rejected'] and not report['written'] and not report['dry_run']:
+        return jsonify({"status": "error", "message": "Some schedules are invalid or overlap; nothing was saved",
+                        **report}), 409
+    return jsonify({"status": "success", **report})
+
+@manager.route('/api/coverage')
+@login_required
+@permission_required(MANAGE_SCHEDULES)
+def coverage_api():
+    """Coverage gaps, double bookings and leave conflicts: ?start=&end= (YYYY-MM-DD, inclusive)&team_id=&min_gap_minutes=."""
+    try:
+        today = datetime.now(timezone.utc).date()
+        start_date = datetime.strptime(request.args['start'], '%Y-%m-%d').date() if request.args.get('start') else today
+        end_date = (datetime.strptime(request.args['end'], '%Y-%m-%d').date() if request.args.get('end')
+                    else start_date + timedelta(days=COVERAGE_DEFAULT_DAYS - 1))
+        team_ids = [int(team_id) for team_id in request.args.getlist('team_id')]
+        min_gap = timedelta(minutes=int(request.args.get('min_gap_minutes', 0)))
+    except ValueError:
+        return jsonify({"status": "error", "message": "start and end must be YYYY-MM-DD; team_id and min_gap_minutes integers"}), 400
+    if end_date < start_date or (end_date - start_date).days >= COVERAGE_MAX_DAYS:
+        return jsonify({"status": "error", "message": f"Choose a date range of at most {COVERAGE_MAX_DAYS} days"}), 400
+    return jsonify({"status": "success", **analyze_coverage(start_date, end_date, team_ids, min_gap)})
+
+@manager.route('/api/users')
+@login_required
+@permission_required(MANAGE_SCHEDULES)
+def search_users_api():
+    """User picker search: ?q=<prefix>&after=<username>&limit=<n>, one page of matches per call."""
+    try:
+        limit = int(request.args.get('limit', USER_SEARCH_LIMIT))
+    except ValueError:
+        return jsonify({"status": "error", "message": "limit must be an integer"}), 400
+    users, next_after = search_users(request.args.get('q', '').strip(), request.args.get('after') or None, limit)
+    return jsonify({"status": "success", "users": users, "next_after": next_after})
+
 @manager.route('/edit_schedule/<int:schedule_id>', methods=['GET', 'POST'])
 @login_required
 @permission_required(MANAGE_SCHEDULES)
@@ -461,7 +753,7 @@ def batch_delete_schedules():
 @login_required
 @permission_required(MANAGE_TIMEOFF)
 def manage_timeoff():
-    timeoffs = TimeOffRequest.query.all()
+    timeoffs = TimeOffRequest.query.options(joinedload(TimeOffRequest.user)).order_by(TimeOffRequest.start_date.desc()).all()
     return render_template('manage_timeoff.html', timeoffs=timeoffs)
 
 @user.route('/time_off_request', methods=['GET', 'POST'])
@@ -489,13 +781,67 @@ def edit_timeoff(timeoff_id):
     timeoff = TimeOffRequest.query.get_or_404(timeoff_id)
     form = TimeoffForm(obj=timeoff)
     if form.validate_on_submit():
+        previous = (timeoff.user_id, timeoff.start_date, timeoff.end_date)
         form.populate_obj(timeoff)
-        timeoff.start_date = datetime.strptime(form.start_time.data, '%Y-%m-%d %H:%M')
-        timeoff.end_date = datetime.strptime(form.end_time.data, '%Y-%m-%d %H:%M')
-        db.session.commit()
+        timeoff.start_date = datetime.strptime(form.start_time.data, '%Y-%m-%d %H:%M').date()
+        timeoff.end_date = datetime.strptime(form.end_time.data, '%Y-%m-%d %H:%M').date()
+        repair = None
+        try:
+            if timeoff.status == 'Approved' and (timeoff.user_id, timeoff.start_date, timeoff.end_date) != previous:
+                # Approved leave moved: reassign the shifts that now clash, in the same transaction as the edit.
+                repair = repair_schedule_for_time_off(timeoff, RotationConstraints.from_config(current_app.config))
+            db.session.commit()
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            logger.error(f"Database error updating time off request {timeoff_id}: {str(e)}")
+            flash('An error occurred while updating the time off request.', 'error')
+            return redirect(url_for('admin.manage_timeoff'))
         flash('Time off request updated successfully!', 'success')
+        if repair is not None:
+            flash(f"{len(repair['reassigned'])} on-call span(s) reassigned.", 'info')
+            if repair['uncovered']:
+                flash(f"{len(repair['uncovered'])} on-call span(s) could not be covered by the team.", 'warning')
         return redirect(url_for('admin.manage_timeoff'))
-    return render_template('edit_time_off_request.html', form=form)
+    if request.method == 'GET':
+        form.start_time.data = timeoff.start_date.strftime('%Y-%m-%d %H:%M') if timeoff.start_date else None
+        form.end_time.data = timeoff.end_date.strftime('%Y-%m-%d %H:%M') if timeoff.end_date else None
+    return render_template('edit_time_off_request.html', form=form, timeoff=timeoff)
+
+@admin.route('/approve_time_off_request/<int:timeoff_id>', methods=['POST'])
+@login_required
+@permission_required(MANAGE_TIMEOFF)
+def approve_timeoff(timeoff_id):
+    timeoff = TimeOffRequest.query.get_or_404(timeoff_id)
+    try:
+        if timeoff.status == 'Approved':
+            repair = {'updated': 0, 'created': 0, 'deleted': 0, 'reassigned': [], 'uncovered': []}
+        else:
+            timeoff.status = 'Approved'
+            # Only the shifts that clash with the leave are rewritten, in the same transaction as the approval.
+            repair = repair_schedule_for_time_off(timeoff, RotationConstraints.from_config(current_app.config))
+        db.session.commit()
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        logger.error(f"Database error approving time off request {timeoff_id}: {str(e)}")
+        if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+            return jsonify({"status": "error", "message": "An error occurred while approving the request"}), 500
+        flash('An error occurred while approving the time off request.', 'error')
+        return redirect(url_for('admin.manage_timeoff'))
+
+    if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+        return jsonify({
+            "status": "success",
+            "updated": repair['updated'],
+            "created": repair['created'],
+            "deleted": repair['deleted'],
+            "reassigned": [{"user_id": user_id, "start": start.isoformat(), "end": end.isoformat()}
+                           for user_id, start, end in repair['reassigned']],
+            "uncovered": [{"start": start.isoformat(), "end": end.isoformat()} for start, end in repair['uncovered']]
+        })
+    flash(f"Time off request approved. {len(repair['reassigned'])} on-call span(s) reassigned.", 'success')
+    if repair['uncovered']:
+        flash(f"{len(repair['uncovered'])} on-call span(s) could not be covered by the team.", 'warning')
+    return redirect(url_for('admin.manage_timeoff'))
 
 @admin.route('/delete_time_off_request/<int:timeoff_id>', methods=['GET'])
 @login_required
@@ -518,29 +864,17 @@ def custom_report():
             start_date = datetime.strptime(request.form.get('start_date'), '%Y-%m-%d')
             end_date = datetime.strptime(request.form.get('end_date'), '%Y-%m-%d')
 
-            if report_type == 'user_hours':
-                report_data = db.session.query(
-                    User.username,
-                    func.sum(func.extract('epoch', Schedule.end_time - Schedule.start_time) / 3600).label('total_hours')
-                ).join(Schedule).filter(Schedule.start_time >= start_date, Schedule.end_time <= end_date).group_by(User.username).all()
-            elif report_type == 'team_hours':
-                report_data = db.session.query(
-                    Team.name,
-                    func.sum(func.extract('epoch', Schedule.end_time - Schedule.start_time) / 3600).label('total_hours')
-                ).join(User).join(Schedule).filter(Schedule.start_time >= start_date, Schedule.end_time <= end_date).group_by(Team.name).all()
-            elif report_type == 'time_off_requests':
-                report_data = db.session.query(
-                    User.username,
-                    TimeOffRequest.start_date,
-                    TimeOffRequest.end_date,
-                    TimeOffRequest.status
-                ).join(TimeOffRequest).filter(TimeOffRequest.start_date >= start_date, TimeOffRequest.end_date <= end_date).all()
-            else:
-                report_data = []
+            query = report_query(report_type, start_date, end_date)
 
-            if request.form.get('export') == 'csv':
-                return export_to_csv(report_type, report_data)
+            export = request.form.get('export')
+            if export in ('csv', 'csv.gz'):
+                return export_to_csv(report_type, query, compress=export == 'csv.gz')
+            if export in COLUMNAR_FORMATS:
+                if columnar_export_available():
+                    return export_columnar(report_type, query, export)
+                flash('Parquet and Arrow exports need the pyarrow package installed on the server.', 'error')
 
+            report_data = query.all() if query is not None else []
             return render_template('custom_report.html', report_type=report_type, start_date=start_date, end_date=end_date, report_data=report_data)
         
         return render_template('custom_report.html')
@@ -552,26 +886,38 @@ def custom_report():
     finally:
         pass
 
-def export_to_csv(report_type, report_data):
-    output = io.StringIO()
-    writer = csv.writer(output)
-
-    if report_type == 'user_hours' or report_type == 'team_hours':
-        writer.writerow(['Name', 'Total Hours'])
-        for row in report_data:
-            writer.writerow([row[0], f"{row[1]:.2f}"])
-    elif report_type == 'time_off_requests':
-        writer.writerow(['Username', 'Start Date', 'End Date', 'Status'])
-        for row in report_data:
-            writer.writerow([row[0], row[1].strftime('%Y-%m-%d'), row[2].strftime('%Y-%m-%d'), row[3]])
-
-    output.seek(0)
-    return send_file(
-        io.BytesIO(output.getvalue().encode('utf-8')),
-        mimetype='text/csv',
-        as_attachment=True,
-        attachment_filename=f'{report_type}_report.csv'
-    )
+def export_to_csv(report_type, query, compress=False):
+    """
+    Stream a report as a CSV download.
+
+    :param compress: Send a .csv.gz file; otherwise the CSV is gzip-encoded on the
+                     wire when the client accepts it
+    """
+    filename = f'{report_type}_report.csv'
+    headers = {}
+    if compress:
+        mimetype = 'application/gzip'
+        filename += '.gz'
+        export_format = 'csv.gz'
+    else:
+        mimetype = 'text/csv'
+        export_format = 'csv'
+        compress = 'gzip' in request.accept_encodings
+        if compress:
+            headers['Content-Encoding'] = 'gzip'
+            headers['Vary'] = 'Accept-Encoding'
+    headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    logger.info("Streaming %s report export (gzip=%s)", report_type, compress)
+    chunks = count_bytes(stream_csv(report_type, query, compress=compress), report_type, export_format)
+    return Response(stream_with_context(chunks), mimetype=mimetype, headers=headers)
+
+def export_columnar(report_type, query, export_format):
+    """Stream a report as a Parquet file or an Arrow IPC stream."""
+    mimetype, extension = COLUMNAR_FORMATS[export_format]
+    logger.info("Streaming %s report export (%s)", report_type, export_format)
+    chunks = count_bytes(stream_columnar(report_type, query, export_format), report_type, export_format)
+    return Response(stream_with_context(chunks), mimetype=mimetype,
+                    headers={'Content-Disposition': f'attachment; filename="{report_type}_report.{extension}"'})
 
 # @manager.route('/edit_schedule/<int:schedule_id>', methods=['GET', 'POST'])
 # @login_required
@@ -704,8 +1050,7 @@ def my_team():
         team_notes = db.session.query(Note).filter_by(team_id=selected_team.id, is_archived=False).order_by(Note.created_at.desc()).all()
         archived_notes = db.session.query(Note).filter_by(team_id=selected_team.id, is_archived=True).order_by(Note.created_at.desc()).all()
 
-        # Add a debug log statement to log the notes
-        logger.debug(f"Fetched notes for team {selected_team.id}: {[note.content for note in team_notes]}")
+        logger.debug("Fetched %d notes for team %s", len(team_notes), selected_team.id)
 
         if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
             return jsonify({
@@ -950,8 +1295,12 @@ def edit_role(role_id):
         role.description = request.form.get('description')
         # Update permissions
         selected_permissions = request.form.getlist('permissions')
-        role.permissions = [Permission.query.get(int(pid)) for pid in selected_permissions]
+        permission_ids = [int(pid) for pid in selected_permissions]
+        role.permissions = Permission.query.filter(Permission.id.in_(permission_ids)).all() if permission_ids else []
         db.session.commit()
+        role_permission_cache.invalidate(role.id)
+        # Identities carry the role name.
+        identity_cache.invalidate()
         flash('Role updated successfully', 'success')
         return redirect(url_for('admin.list_roles'))
     permissions = Permission.query.all()
@@ -1,6 +1,6 @@
-from app import create_app
-
-app = create_app()
-
 if __name__ == '__main__':
+    # Imported here so spawned process pool workers, which re-import this script, do not build an app.
+    from app import create_app
+
+    app = create_app()
     app.run(host="0.0.0.0", port=5000, debug=True)
\ No newline at end of file
@@ -1,112 +1,659 @@
-from datetime import datetime, timedelta
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from datetime import date, datetime, time, timedelta
+from heapq import heapify, heappop, heappush
+from multiprocessing import get_context
+from time import perf_counter
 from models import User, Schedule, Team, TimeOffRequest
-from sqlalchemy import func
+from extensions import db
+from intervals import IntervalIndex
+from fairness import day_weights, plan_matrix, score_plans
+from local_search import improve_rotation
+from utils import hours_between
+from metrics import schedule_generation_seconds, schedules_generated_total
+from sqlalchemy import func, insert
+import logging
+import os
+import numpy as np
 import random
 
-def generate_advanced_schedule(team_id, start_date, end_date):
+logger = logging.getLogger(__name__)
+
+MIN_BLOCK_DAYS = 3
+MAX_BLOCK_DAYS = 5
+SEARCH_BATCH_SIZE = 32
+LOCAL_SEARCH_BUDGET = 1.0
+# On-call hours this far either side of a repaired span decide who is least loaded
+REPAIR_FAIRNESS_WINDOW = timedelta(days=90)
+
+
+@dataclass(frozen=True)
+class RotationConstraints:
+    """Hard limits every solver backend must respect."""
+    min_block: int = MIN_BLOCK_DAYS
+    max_block: int = MAX_BLOCK_DAYS
+    # Most blocks one user may be given in the period (None = unlimited)
+    max_shifts: int = None
+    # Days a user must be off between two of their blocks
+    rest_days: int = 0
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(
+            min_block=config.get('SCHEDULE_MIN_BLOCK_DAYS', MIN_BLOCK_DAYS),
+            max_block=config.get('SCHEDULE_MAX_BLOCK_DAYS', MAX_BLOCK_DAYS),
+            max_shifts=config.get('SCHEDULE_MAX_SHIFTS'),
+            rest_days=config.get('SCHEDULE_REST_DAYS', 0)
+        )
+
+
+def generation_options(config):
+    """Solver, constraints and time budget configured for the app."""
+    return {
+        'solver': config.get('SCHEDULE_SOLVER', 'greedy'),
+        'constraints': RotationConstraints.from_config(config),
+        'time_budget': config.get('SCHEDULE_TIME_BUDGET'),
+    }
+
+
+def generate_advanced_schedule(team_id, start_date, end_date, time_budget=None, holidays=(),
+                               solver='greedy', constraints=None, seed=None):
     """
     Generate an advanced schedule for a team considering various factors.
-    
+
+    Unavailability is kept as a sorted interval index per user and the next
+    assignee is taken from a heap keyed on accumulated on-call hours, so the
+    cost grows with the number of blocks rather than days x users.
+
     :param team_id: ID of the team to generate the schedule for
+    :param start_date: Start date of the scheduling period (inclusive)
+    :param end_date: End date of the scheduling period (inclusive)
+    :param time_budget: Seconds to spend on a randomized multi-start search for
+                        the fairest plan; None runs the greedy rotation once
+    :param holidays: Dates weighted as holidays when scoring fairness
+    :param solver: Name of the solver backend in SOLVERS
+    :param constraints: RotationConstraints; defaults to 3-5 day blocks with no other limits
+    :param seed: Seed for a private random generator; the same seed and inputs give the
+                 same schedule (searches bounded by a time budget stop on the clock, so
+                 they are only reproducible without one). None uses the global `random`.
+    :return: List of generated (unsaved) schedules
+    """
+    started = perf_counter()
+    start_date, end_date = _as_date(start_date), _as_date(end_date)
+    inputs = load_rotation_inputs([team_id], start_date, end_date).get(team_id)
+
+    if not inputs:
+        return []
+
+    blocks = run_solver(
+        inputs,
+        start_date.toordinal(),
+        end_date.toordinal() + 1,
+        solver=solver,
+        constraints=constraints,
+        time_budget=time_budget,
+        rng=random if seed is None else random.Random(seed),
+        holidays=holidays
+    )
+    schedule_generation_seconds.labels(solver=solver, mode='single').observe(perf_counter() - started)
+    schedules_generated_total.labels(solver=solver, mode='single').inc(len(blocks))
+    return [Schedule(**_block_to_row(block)) for block in blocks]
+
+
+def batch_generate_schedules(team_ids, start_date, end_date, max_workers=None, time_budget=None, holidays=(),
+                             solver='greedy', constraints=None, seed=None, start_method='spawn'):
+    """
+    Generate and save schedules for many teams at once.
+
+    Inputs for every team are loaded with one query per table, the per-team
+    solves are fanned out to a process pool (teams are independent) and all
+    resulting rows are bulk-inserted in a single transaction.
+
+    :param team_ids: IDs of the teams to generate schedules for
+    :param start_date: Start date of the scheduling period (inclusive)
+    :param end_date: End date of the scheduling period (inclusive)
+    :param max_workers: Process pool size (default: CPU count, never more than the number
+                        of teams); 1 solves inline in this process
+    :param time_budget: Per-team seconds the solver may spend improving fairness
+    :param holidays: Dates weighted as holidays when scoring fairness
+    :param solver: Name of the solver backend in SOLVERS
+    :param constraints: RotationConstraints shared by every team
+    :param seed: Seed for the per-team generators; None draws them from the global `random`
+    :param start_method: multiprocessing start method for the pool workers. The default
+                         'spawn' is the only safe choice inside the multi-threaded server;
+                         single-threaded scripts may pass 'fork' to skip the worker imports.
+    :return: Report dict with per-team and overall timings in milliseconds
+    """
+    started = perf_counter()
+    start_date, end_date = _as_date(start_date), _as_date(end_date)
+    team_names = dict(db.session.query(Team.id, Team.name).filter(Team.id.in_(team_ids)).all())
+    inputs = load_rotation_inputs(list(team_names), start_date, end_date)
+    loaded = perf_counter()
+
+    options = {'solver': solver, 'constraints': constraints, 'time_budget': time_budget, 'holidays': tuple(holidays)}
+    # Draw each team's seed here so seeded batches are reproducible whatever the pool does.
+    seeds = random if seed is None else random.Random(seed)
+    jobs = [
+        (team_id, inputs[team_id], start_date.toordinal(), end_date.toordinal() + 1, seeds.getrandbits(64), options)
+        for team_id in sorted(inputs)
+    ]
+    workers = min(max_workers or os.cpu_count() or 1, len(jobs))
+    if workers <= 1:
+        results = [_solve_team(job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=get_context(start_method)) as executor:
+            results = list(executor.map(_solve_team, jobs))
+    solved = perf_counter()
+
+    rows = [_block_to_row(block) for _, blocks, _ in results for block in blocks]
+    try:
+        if rows:
+            db.session.execute(insert(Schedule), rows)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    finished = perf_counter()
+
+    solved_teams = {team_id: (blocks, elapsed) for team_id, blocks, elapsed in results}
+    teams = []
+    for team_id in sorted(team_names):
+        blocks, elapsed = solved_teams.get(team_id, ([], 0.0))
+        teams.append({
+            'team_id': team_id,
+            'team_name': team_names[team_id],
+            'users': len(inputs[team_id]['user_ids']) if team_id in inputs else 0,
+            'schedules': len(blocks),
+            'solve_ms': round(elapsed * 1000, 3),
+        })
+
+    report = {
+        'start_date': start_date.isoformat(),
+        'end_date': end_date.isoformat(),
+        'teams': teams,
+        'schedules_created': len(rows),
+        'load_ms': round((loaded - started) * 1000, 3),
+        'solve_ms': round((solved - loaded) * 1000, 3),
+        'insert_ms': round((finished - solved) * 1000, 3),
+        'total_ms': round((finished - started) * 1000, 3),
+    }
+    schedule_generation_seconds.labels(solver=solver, mode='batch').observe(finished - started)
+    schedules_generated_total.labels(solver=solver, mode='batch').inc(len(rows))
+    logger.info("Generated %d schedules for %d teams in %.1f ms", len(rows), len(teams), report['total_ms'])
+    return report
+
+
+def _solve_team(job):
+    """Process pool entry point: solve one team's rotation without touching the DB."""
+    team_id, inputs, start, end, seed, options = job
+    started = perf_counter()
+    blocks = run_solver(inputs, start, end, rng=random.Random(seed), **options)
+    return team_id, blocks, perf_counter() - started
+
+
+def run_solver(inputs, start, end, solver='greedy', constraints=None, time_budget=None, rng=random, holidays=()):
+    """
+    Dispatch to a solver backend registered in SOLVERS.
+
+    :param inputs: Dict with 'user_ids', 'hours' and 'unavailable' (see load_rotation_inputs)
+    :param start: First day ordinal of the period
+    :param end: Day ordinal just past the end of the period
+    :param solver: Name of the backend
+    :param constraints: RotationConstraints; defaults apply when None
+    :param time_budget: Wall-clock seconds the backend may use
+    :param rng: Random source
+    :param holidays: Dates weighted as holidays
+    :return: List of (user_id, start_ordinal, end_ordinal) tuples
+    """
+    try:
+        backend = SOLVERS[solver]
+    except KeyError:
+        raise ValueError(f"Unknown schedule solver '{solver}'. Available: {', '.join(sorted(SOLVERS))}")
+    return backend(inputs, start, end, constraints or RotationConstraints(), time_budget, rng, holidays)
+
+
+def greedy_solver(inputs, start, end, constraints, time_budget, rng, holidays):
+    """Heap-driven rotation; with a time budget, the fairest of many randomized runs."""
+    if time_budget:
+        return search_rotation(inputs, start, end, time_budget, rng=rng, holidays=holidays, constraints=constraints)
+    return solve_rotation(inputs['user_ids'], inputs['hours'], inputs['unavailable'], start, end,
+                          rng=rng, constraints=constraints)
+
+
+def local_search_solver(inputs, start, end, constraints, time_budget, rng, holidays):
+    """Greedy start improved by local search until the deadline (LOCAL_SEARCH_BUDGET by default)."""
+    deadline = perf_counter() + (time_budget or LOCAL_SEARCH_BUDGET)
+    initial = solve_rotation(inputs['user_ids'], inputs['hours'], inputs['unavailable'], start, end,
+                             rng=rng, constraints=constraints)
+    return improve_rotation(
+        initial,
+        inputs['user_ids'],
+        inputs['hours'],
+        inputs['unavailable'],
+        start,
+        day_weights(date.fromordinal(start), end - start, holidays),
+        constraints,
+        deadline,
+        rng=rng
+    )
+
+
+# Backends share the signature (inputs, start, end, constraints, time_budget, rng, holidays).
+# Process pool workers only see solvers registered at import time.
+SOLVERS = {
+    'greedy': greedy_solver,
+    'local_search': local_search_solver,
+}
+
+
+def register_solver(name, solver):
+    """Make a solver backend available to run_solver under `name`."""
+    SOLVERS[name] = solver
+
+
+def load_rotation_inputs(team_ids, start_date, end_date):
+    """
+    Load everything the rotation solver needs for several teams.
+
+    :param team_ids: IDs of the teams
     :param start_date: Start date of the scheduling period
     :param end_date: End date of the scheduling period
-    :return: List of generated schedules
+    :return: Dict of team ID -> {'user_ids', 'hours', 'unavailable'}; only active
+             members are included, and teams without any are left out
     """
-    team = Team.query.get(team_id)
-    users = User.query.filter_by(team_id=team_id).all()
-    
-    if not users:
-        return []
-    
-    # Get the current on-call hours for each user
-    user_hours = {user.id: get_user_on_call_hours(user.id, start_date, end_date) for user in users}
-    
-    # Get time off requests for the period
-    time_off_requests = TimeOffRequest.query.filter(
-        TimeOffRequest.user_id.in_([user.id for user in users]),
+    # Same eligible pool as repair_schedule_for_time_off: deactivated users get no shifts.
+    members = db.session.query(User.team_id, User.id).filter(
+        User.team_id.in_(team_ids),
+        User.is_active.isnot(False)
+    ).order_by(User.id).all()
+
+    team_users = {}
+    for team_id, user_id in members:
+        team_users.setdefault(team_id, []).append(user_id)
+    if not team_users:
+        return {}
+
+    all_user_ids = [user_id for _, user_id in members]
+    user_hours = get_on_call_hours(all_user_ids, start_date, end_date)
+    unavailable = get_unavailability(all_user_ids, start_date, end_date)
+
+    return {
+        team_id: {
+            'user_ids': user_ids,
+            'hours': {user_id: user_hours[user_id] for user_id in user_ids},
+            'unavailable': {user_id: unavailable[user_id] for user_id in user_ids if user_id in unavailable},
+        }
+        for team_id, user_ids in team_users.items()
+    }
+
+
+def solve_rotation(user_ids, user_hours, unavailable, start, end, rng=random, constraints=None):
+    """
+    Assign consecutive day blocks to users, least-loaded first.
+
+    Works purely on day ordinals so it can run without a database session.
+
+    :param user_ids: IDs of the users in the rotation
+    :param user_hours: Dict of user ID -> hours already on call
+    :param unavailable: Dict of user ID -> IntervalIndex of unavailable day ordinals
+    :param start: First day ordinal of the period
+    :param end: Day ordinal just past the end of the period
+    :param rng: Random source used to pick block lengths
+    :param constraints: RotationConstraints; block lengths fall back to shorter
+                        runs only when nobody can cover min_block days
+    :return: List of (user_id, start_ordinal, end_ordinal) tuples, end exclusive
+    """
+    constraints = constraints or RotationConstraints()
+    min_block, max_block = constraints.min_block, constraints.max_block
+    shift_counts = {}
+    last_end = {}
+
+    # Ties on hours go to the user listed first, so the order of user_ids matters.
+    heap = [(user_hours.get(user_id, 0.0), position, user_id) for position, user_id in enumerate(user_ids)]
+    heapify(heap)
+
+    blocks = []
+    day = start
+    while day < end:
+        desired = min(rng.randint(min_block, max_block), end - day)
+        required = min(min_block, desired)
+        skipped = []
+        chosen = None
+        fallback = None
+
+        # Pop users in order of accumulated hours until one can cover a full block.
+        while heap:
+            entry = heappop(heap)
+            user_id = entry[2]
+            if not _may_start_shift(user_id, day, shift_counts, last_end, constraints):
+                skipped.append(entry)
+                continue
+            index = unavailable.get(user_id)
+            run = index.free_run(day, day + desired) if index else desired
+            if run >= required:
+                chosen = (entry, run)
+                break
+            skipped.append(entry)
+            if run and (fallback is None or run > fallback[1]):
+                fallback = (entry, run)
+
+        # Nobody can take a full block: give the longest partial block instead.
+        if chosen is None and fallback is not None:
+            chosen = fallback
+            skipped.remove(fallback[0])
+
+        for entry in skipped:
+            heappush(heap, entry)
+
+        if chosen is None:
+            # If no users are available, skip this day
+            day += 1
+            continue
+
+        (hours, position, user_id), length = chosen
+        blocks.append((user_id, day, day + length))
+        shift_counts[user_id] = shift_counts.get(user_id, 0) + 1
+        last_end[user_id] = day + length
+        heappush(heap, (hours + length * 24, position, user_id))
+        day += length
+
+    return blocks
+
+
+def search_rotation(inputs, start, end, time_budget, rng=random, holidays=(), constraints=None):
+    """
+    Randomized multi-start search for the fairest rotation within a time budget.
+
+    Candidates are produced by re-running solve_rotation with shuffled tie-break
+    order and fresh block lengths, scored in batches with fairness.score_plans,
+    and the best plan seen is kept. The first candidate is the plain greedy
+    rotation, so the result is never less fair than a single run.
+
+    :param inputs: Dict with 'user_ids', 'hours' and 'unavailable' (see load_rotation_inputs)
+    :param start: First day ordinal of the period
+    :param end: Day ordinal just past the end of the period
+    :param time_budget: Seconds to keep searching; at least one batch always runs
+    :param rng: Random source for block lengths and shuffling
+    :param holidays: Dates weighted as holidays
+    :param constraints: RotationConstraints passed through to solve_rotation
+    :return: Best list of (user_id, start_ordinal, end_ordinal) tuples found
+    """
+    deadline = perf_counter() + time_budget
+    user_ids = inputs['user_ids']
+    weights = day_weights(date.fromordinal(start), end - start, holidays)
+    baseline = np.array([inputs['hours'][user_id] / 24 for user_id in user_ids], dtype=np.float32)
+
+    best_blocks, best_score = None, None
+    while best_blocks is None or perf_counter() < deadline:
+        candidates = []
+        for _ in range(SEARCH_BATCH_SIZE):
+            order = user_ids
+            if candidates or best_blocks is not None:
+                order = list(user_ids)
+                rng.shuffle(order)
+            candidates.append(solve_rotation(order, inputs['hours'], inputs['unavailable'], start, end,
+                                             rng=rng, constraints=constraints))
+            if best_blocks is not None and perf_counter() >= deadline:
+                break
+
+        scores = score_plans(
+            np.stack([plan_matrix(blocks, user_ids, start, end) for blocks in candidates]),
+            weights,
+            baseline
+        )
+        winner = int(np.argmin(scores))
+        if best_score is None or scores[winner] < best_score:
+            best_blocks, best_score = candidates[winner], float(scores[winner])
+
+    return best_blocks
+
+
+def repair_schedule_for_time_off(time_off_request, constraints=None):
+    """
+    Reassign only the on-call time that clashes with an approved time-off request.
+
+    Schedules of the requester that overlap the leave are split: the parts
+    outside the leave stay with them and the clashing part goes to the least
+    loaded teammate who is free (no time off, no overlapping shift, rest gap
+    respected), falling back to several teammates if nobody can cover it all.
+    Every query is bounded by the clashing span, so the cost follows the size
+    of the conflict rather than the length of the schedule.
+
+    The session is not committed, so the caller can save the approval and the
+    repair in one transaction.
+
+    :param time_off_request: The approved TimeOffRequest
+    :param constraints: RotationConstraints; only rest_days applies to repairs
+    :return: Dict with updated/created/deleted counts, the reassigned spans and
+             any spans nobody could cover
+    """
+    constraints = constraints or RotationConstraints()
+    requester_id = time_off_request.user_id
+    leave_start = datetime.combine(_as_date(time_off_request.start_date), time.min)
+    leave_end = datetime.combine(_as_date(time_off_request.end_date), time.min) + timedelta(days=1)
+
+    result = {'updated': 0, 'created': 0, 'deleted': 0, 'reassigned': [], 'uncovered': []}
+    affected = Schedule.query.filter(
+        Schedule.user_id == requester_id,
+        Schedule.start_time < leave_end,
+        Schedule.end_time > leave_start
+    ).order_by(Schedule.start_time).all()
+    if not affected:
+        return result
+
+    span_start = max(affected[0].start_time, leave_start)
+    span_end = min(max(schedule.end_time for schedule in affected), leave_end)
+    rest = timedelta(days=constraints.rest_days)
+
+    team_id = db.session.query(User.team_id).filter(User.id == requester_id).scalar()
+    candidates = []
+    if team_id is not None:
+        candidates = [user_id for user_id, in db.session.query(User.id).filter(
+            User.team_id == team_id,
+            User.id != requester_id,
+            User.is_active.isnot(False)
+        ).order_by(User.id)]
+
+    busy = get_busy_intervals(candidates, span_start - rest, span_end + rest, padding=rest)
+    user_hours = get_on_call_hours(candidates, span_start - REPAIR_FAIRNESS_WINDOW, span_end + REPAIR_FAIRNESS_WINDOW)
+    heap = [(user_hours[user_id], user_id) for user_id in candidates]
+    heapify(heap)
+
+    for schedule in affected:
+        clash_start = max(schedule.start_time, leave_start)
+        clash_end = min(schedule.end_time, leave_end)
+
+        pieces = []
+        if schedule.start_time < clash_start:
+            pieces.append((requester_id, schedule.start_time, clash_start))
+        for user_id, piece_start, piece_end in _cover_span(clash_start, clash_end, heap, busy, rest):
+            if user_id is None:
+                result['uncovered'].append((piece_start, piece_end))
+            else:
+                pieces.append((user_id, piece_start, piece_end))
+                result['reassigned'].append((user_id, piece_start, piece_end))
+        if clash_end < schedule.end_time:
+            pieces.append((requester_id, clash_end, schedule.end_time))
+
+        _apply_pieces(schedule, pieces, result)
+
+    logger.info("Repaired schedules for time off %s: %d updated, %d created, %d deleted, %d uncovered",
+                time_off_request.id, result['updated'], result['created'], result['deleted'], len(result['uncovered']))
+    return result
+
+
+def _cover_span(start, end, heap, busy, rest):
+    """Yield (user_id, start, end) pieces covering [start, end); user_id is None where nobody is free."""
+    while start < end:
+        skipped = []
+        chosen = None
+        fallback = None
+        while heap:
+            entry = heappop(heap)
+            index = busy.get(entry[1])
+            run = index.free_run(start, end) if index else end - start
+            if run == end - start:
+                chosen = (entry, run)
+                break
+            skipped.append(entry)
+            if run and (fallback is None or run > fallback[1]):
+                fallback = (entry, run)
+
+        if chosen is None and fallback is not None:
+            chosen = fallback
+            skipped.remove(fallback[0])
+        for entry in skipped:
+            heappush(heap, entry)
+
+        if chosen is None:
+            # Nobody is free right now; leave a hole until the first teammate frees up.
+            resume = min([busy[user_id].next_free(start) for _, user_id in heap if user_id in busy] + [end])
+            yield None, start, resume
+            start = resume
+            continue
+
+        (hours, user_id), run = chosen
+        piece_end = start + run
+        busy[user_id] = IntervalIndex(list(busy.get(user_id, ())) + [(start - rest, piece_end + rest)])
+        heappush(heap, (hours + run.total_seconds() / 3600, user_id))
+        yield user_id, start, piece_end
+        start = piece_end
+
+
+def _apply_pieces(schedule, pieces, result):
+    """Write a split schedule back, reusing the existing row for the first piece."""
+    merged = []
+    for user_id, start, end in pieces:
+        if merged and merged[-1][0] == user_id and merged[-1][2] == start:
+            merged[-1] = (user_id, merged[-1][1], end)
+        else:
+            merged.append((user_id, start, end))
+
+    if not merged:
+        db.session.delete(schedule)
+        result['deleted'] += 1
+        return
+
+    user_id, start, end = merged[0]
+    schedule.user_id, schedule.start_time, schedule.end_time = user_id, start, end
+    result['updated'] += 1
+    for user_id, start, end in merged[1:]:
+        db.session.add(Schedule(user_id=user_id, start_time=start, end_time=end))
+        result['created'] += 1
+
+
+def get_busy_intervals(user_ids, window_start, window_end, padding=timedelta(0)):
+    """
+    Index each user's shifts and approved time off inside a window.
+
+    :param user_ids: IDs of the users to look up
+    :param window_start: Start of the window (datetime)
+    :param window_end: End of the window (datetime)
+    :param padding: Rest time added either side of every shift
+    :return: Dict of user ID -> IntervalIndex over datetimes
+    """
+    if not user_ids:
+        return {}
+    intervals = {}
+    shifts = db.session.query(Schedule.user_id, Schedule.start_time, Schedule.end_time).filter(
+        Schedule.user_id.in_(user_ids),
+        Schedule.start_time < window_end + padding,
+        Schedule.end_time > window_start - padding
+    )
+    for user_id, start, end in shifts:
+        intervals.setdefault(user_id, []).append((start - padding, end + padding))
+
+    leave = db.session.query(TimeOffRequest.user_id, TimeOffRequest.start_date, TimeOffRequest.end_date).filter(
+        TimeOffRequest.user_id.in_(user_ids),
+        TimeOffRequest.start_date <= _as_date(window_end),
+        TimeOffRequest.end_date >= _as_date(window_start),
+        TimeOffRequest.status == 'Approved'
+    )
+    for user_id, start, end in leave:
+        intervals.setdefault(user_id, []).append((
+            datetime.combine(_as_date(start), time.min),
+            datetime.combine(_as_date(end), time.min) + timedelta(days=1)
+        ))
+    return {user_id: IntervalIndex(spans) for user_id, spans in intervals.items()}
+
+
+def get_unavailability(user_ids, start_date, end_date):
+    """
+    Build an interval index of approved time off for each user.
+
+    :param user_ids: IDs of the users to look up
+    :param start_date: Start date of the range
+    :param end_date: End date of the range
+    :return: Dict of user ID -> IntervalIndex over day ordinals (end exclusive)
+    """
+    rows = db.session.query(
+        TimeOffRequest.user_id,
+        TimeOffRequest.start_date,
+        TimeOffRequest.end_date
+    ).filter(
+        TimeOffRequest.user_id.in_(user_ids),
         TimeOffRequest.start_date <= end_date,
         TimeOffRequest.end_date >= start_date,
         TimeOffRequest.status == 'Approved'
     ).all()
 
-    # Create a dictionary of unavailable dates for each user
-    unavailable_dates = {user.id: set() for user in users}
-    for request in time_off_requests:
-        current_date = max(request.start_date, start_date)
-        end = min(request.end_date, end_date)
-        while current_date <= end:
-            unavailable_dates[request.user_id].add(current_date)
-            current_date += timedelta(days=1)
-
-    # Sort users by their current on-call hours (ascending)
-    sorted_users = sorted(users, key=lambda u: user_hours[u.id])
-    
-    schedules = []
-    current_date = start_date
-    rotation_index = 0
-    
-    while current_date <= end_date:
-        # Filter out unavailable users for the current date
-        available_users = [user for user in sorted_users if current_date not in unavailable_dates[user.id]]
-        
-        if not available_users:
-            # If no users are available, skip this day
-            current_date += timedelta(days=1)
-            continue
-        
-        # Use rotation system to ensure fairness
-        selected_user = available_users[rotation_index % len(available_users)]
-        
-        # Determine the length of the block schedule (aiming for 3-5 day blocks)
-        block_length = random.randint(3, 5)
-        block_end = min(current_date + timedelta(days=block_length), end_date)
-        
-        # Check if the selected user is available for the entire block
-        while any(date in unavailable_dates[selected_user.id] for date in [current_date + timedelta(days=i) for i in range(block_length)]):
-            block_length -= 1
-            if block_length < 3:
-                # If we can't find a 3-day block, move to the next user
-                rotation_index += 1
-                selected_user = available_users[rotation_index % len(available_users)]
-                block_length = random.randint(3, 5)
-            block_end = min(current_date + timedelta(days=block_length), end_date)
-        
-        # Create a new schedule block
-        new_schedule = Schedule(
-            user_id=selected_user.id,
-            start_time=current_date,
-            end_time=block_end
+    intervals = {}
+    for user_id, off_start, off_end in rows:
+        intervals.setdefault(user_id, []).append(
+            (_as_date(off_start).toordinal(), _as_date(off_end).toordinal() + 1)
         )
-        schedules.append(new_schedule)
-        
-        # Update the user's on-call hours
-        user_hours[selected_user.id] += (block_end - current_date).total_seconds() / 3600
-        
-        # Move the current date to the end of the block
-        current_date = block_end + timedelta(days=1)
-        
-        # Move to the next user in the rotation
-        rotation_index += 1
-        
-        # Re-sort the users based on updated hours
-        sorted_users = sorted(sorted_users, key=lambda u: user_hours[u.id])
-    
-    return schedules
+    return {user_id: IntervalIndex(spans) for user_id, spans in intervals.items()}
+
+
+def get_on_call_hours(user_ids, start_date, end_date):
+    """
+    Calculate the total on-call hours for several users in one grouped query.
+
+    :param user_ids: IDs of the users
+    :param start_date: Start date of the range
+    :param end_date: End date of the range
+    :return: Dict of user ID -> total on-call hours
+    """
+    rows = db.session.query(
+        Schedule.user_id,
+        func.sum(hours_between(Schedule.start_time, Schedule.end_time))
+    ).filter(
+        Schedule.user_id.in_(user_ids),
+        Schedule.start_time >= start_date,
+        Schedule.end_time <= end_date
+    ).group_by(Schedule.user_id).all()
+
+    hours = {user_id: 0.0 for user_id in user_ids}
+    hours.update({user_id: float(total or 0) for user_id, total in rows})
+    return hours
+
 
 def get_user_on_call_hours(user_id, start_date, end_date):
     """
     Calculate the total on-call hours for a user within a given date range.
-    
+
     :param user_id: ID of the user
     :param start_date: Start date of the range
     :param end_date: End date of the range
     :return: Total on-call hours
     """
-    schedules = Schedule.query.filter(
-        Schedule.user_id == user_id,
-        Schedule.start_time >= start_date,
-        Schedule.end_time <= end_date
-    ).all()
-    
-    total_hours = sum((s.end_time - s.start_time).total_seconds() / 3600 for s in schedules)
-    return total_hours
+    return get_on_call_hours([user_id], start_date, end_date)[user_id]
+
+
+def _may_start_shift(user_id, day, shift_counts, last_end, constraints):
+    if constraints.max_shifts is not None and shift_counts.get(user_id, 0) >= constraints.max_shifts:
+        return False
+    return user_id not in last_end or last_end[user_id] + constraints.rest_days <= day
+
+
+def _as_date(value):
+    return value.date() if isinstance(value, datetime) else value
+
+
+def _ordinal_to_datetime(ordinal):
+    return datetime.combine(date.fromordinal(ordinal), time.min)
+
+
+def _block_to_row(block):
+    user_id, start, end = block
+    return {'user_id': user_id, 'start_time': _ordinal_to_datetime(start), 'end_time': _ordinal_to_datetime(end)}
@@ -0,0 +1,176 @@
+"""
+On-call coverage analysis.
+
+Loads every shift and every approved time-off request in a window with one
+range query per table, then sweeps the intervals in memory, per user and per
+team, to find:
+
+- gaps: windows in which no member of a team is on call. A shift only counts
+  for the parts its user is not on approved leave;
+- double bookings: two shifts of the same user that overlap;
+- leave conflicts: shifts that overlap their user's approved time off.
+"""
+import heapq
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from time import perf_counter
+
+from extensions import db
+from intervals import merge_intervals, subtract_intervals
+from models import Schedule, Team, TimeOffRequest, User
+
+# Window analyzed when no end date is given, and the longest window accepted.
+COVERAGE_DEFAULT_DAYS = 30
+COVERAGE_MAX_DAYS = 400
+
+
+def _window(start_date, end_date):
+    """Datetime bounds of the inclusive date range [start_date, end_date]."""
+    return datetime.combine(start_date, time.min), datetime.combine(end_date, time.min) + timedelta(days=1)
+
+
+def coverage_shift_query(window_start, window_end, team_ids=None):
+    """Shifts of team members overlapping the window: (id, user_id, start_time, end_time, team_id, username)."""
+    query = db.select(
+        Schedule.id, Schedule.user_id, Schedule.start_time, Schedule.end_time, User.team_id, User.username
+    ).join(User, Schedule.user_id == User.id).where(
+        Schedule.start_time < window_end,
+        Schedule.end_time > window_start
+    )
+    return query.where(User.team_id.in_(team_ids) if team_ids else User.team_id.isnot(None))
+
+
+def coverage_leave_query(window_start, window_end, team_ids=None):
+    """Approved time off of team members overlapping the window: (id, user_id, start_date, end_date)."""
+    query = db.select(
+        TimeOffRequest.id, TimeOffRequest.user_id, TimeOffRequest.start_date, TimeOffRequest.end_date
+    ).join(User, TimeOffRequest.user_id == User.id).where(
+        TimeOffRequest.start_date < window_end.date(),
+        TimeOffRequest.end_date >= window_start.date(),
+        TimeOffRequest.status == 'Approved'
+    )
+    return query.where(User.team_id.in_(team_ids) if team_ids else User.team_id.isnot(None))
+
+
+def _sweep_user(shifts, leave):
+    """
+    Find a user's overlapping shift pairs and shift/leave overlaps in one sorted sweep.
+
+    :param shifts: (start, end, schedule_id) tuples
+    :param leave: (start, end, time_off_id) tuples
+    :return: (list of (shift, shift) pairs, list of (shift, leave) pairs)
+    """
+    events = [(start, end, 0, key) for start, end, key in leave]
+    events.extend((start, end, 1, key) for start, end, key in shifts)
+    events.sort()
+    active_shifts, active_leave = [], []
+    double_booked, on_leave = [], []
+    for start, end, is_shift, key in events:
+        for active in (active_shifts, active_leave):
+            while active and active[0][0] <= start:
+                heapq.heappop(active)
+        interval = (start, end, key)
+        if is_shift:
+            if active_shifts:
+                double_booked.extend((other[1], interval) for other in active_shifts)
+            if active_leave:
+                on_leave.extend((interval, other[1]) for other in active_leave)
+            heapq.heappush(active_shifts, (end, interval))
+        else:
+            if active_shifts:
+                on_leave.extend((other[1], interval) for other in active_shifts)
+            heapq.heappush(active_leave, (end, interval))
+    return double_booked, on_leave
+
+
+def _span(start, end):
+    return {'start': start.isoformat(), 'end': end.isoformat(), 'hours': round((end - start).total_seconds() / 3600, 2)}
+
+
+def analyze_coverage(start_date, end_date, team_ids=None, min_gap=timedelta(0)):
+    """
+    Report coverage gaps, double bookings and leave conflicts for each team.
+
+    :param start_date: First day to analyze (date)
+    :param end_date: Last day to analyze, inclusive (date)
+    :param team_ids: Teams to include (default: every team)
+    :param min_gap: Ignore uncovered windows shorter than this
+    :return: Report dict with one entry per team and overall totals
+    """
+    started = perf_counter()
+    window_start, window_end = _window(start_date, end_date)
+    teams = db.session.query(Team.id, Team.name).order_by(Team.name)
+    if team_ids:
+        teams = teams.filter(Team.id.in_(team_ids))
+    teams = teams.all()
+
+    shifts_by_user = defaultdict(list)
+    user_team, usernames = {}, {}
+    for schedule_id, user_id, start, end, team_id, username in db.session.execute(
+            coverage_shift_query(window_start, window_end, team_ids)):
+        shifts_by_user[user_id].append((start, end, schedule_id))
+        user_team[user_id] = team_id
+        usernames[user_id] = username
+    leave_by_user = defaultdict(list)
+    for time_off_id, user_id, start, end in db.session.execute(
+            coverage_leave_query(window_start, window_end, team_ids)):
+        leave_by_user[user_id].append(
+            (datetime.combine(start, time.min), datetime.combine(end, time.min) + timedelta(days=1), time_off_id)
+        )
+    load_ms = (perf_counter() - started) * 1000
+
+    results = {team.id: {
+        'team_id': team.id, 'team_name': team.name, 'shifts': 0, 'covered_hours': 0.0, 'coverage_pct': 0.0,
+        'gaps': [], 'double_booked': [], 'leave_conflicts': [],
+    } for team in teams}
+    covered_by_team = defaultdict(list)
+    for user_id, shifts in shifts_by_user.items():
+        team = results.get(user_team[user_id])
+        if team is None:
+            continue
+        leave = leave_by_user.get(user_id, ())
+        team['shifts'] += len(shifts)
+        double_booked, on_leave = _sweep_user(shifts, leave)
+        username = usernames[user_id]
+        for first, second in double_booked:
+            team['double_booked'].append({
+                'user_id': user_id, 'username': username, 'schedule_ids': [first[2], second[2]],
+                **_span(max(first[0], second[0]), min(first[1], second[1])),
+            })
+        for shift, time_off in on_leave:
+            team['leave_conflicts'].append({
+                'user_id': user_id, 'username': username, 'schedule_id': shift[2], 'time_off_id': time_off[2],
+                **_span(max(shift[0], time_off[0]), min(shift[1], time_off[1])),
+            })
+        working = merge_intervals((max(start, window_start), min(end, window_end)) for start, end, _ in shifts)
+        if leave:
+            working = subtract_intervals(working, merge_intervals((start, end) for start, end, _ in leave))
+        covered_by_team[team['team_id']].extend(working)
+
+    window_hours = (window_end - window_start).total_seconds() / 3600
+    totals = {'teams': len(results), 'shifts': 0, 'gaps': 0, 'gap_hours': 0.0, 'double_booked': 0,
+              'leave_conflicts': 0}
+    for team in results.values():
+        covered = merge_intervals(covered_by_team.get(team['team_id'], ()))
+        covered_hours = sum((end - start).total_seconds() for start, end in covered) / 3600
+        team['covered_hours'] = round(covered_hours, 2)
+        team['coverage_pct'] = round(100 * covered_hours / window_hours, 2)
+        team['gaps'] = [_span(start, end) for start, end in subtract_intervals([(window_start, window_end)], covered)
+                        if end - start >= min_gap]
+        team['double_booked'].sort(key=lambda entry: entry['start'])
+        team['leave_conflicts'].sort(key=lambda entry: entry['start'])
+        totals['shifts'] += team['shifts']
+        totals['gaps'] += len(team['gaps'])
+        totals['gap_hours'] += sum(gap['hours'] for gap in team['gaps'])
+        totals['double_booked'] += len(team['double_booked'])
+        totals['leave_conflicts'] += len(team['leave_conflicts'])
+    totals['gap_hours'] = round(totals['gap_hours'], 2)
+
+    return {
+        'start': window_start.isoformat(),
+        'end': window_end.isoformat(),
+        'teams': list(results.values()),
+        'totals': totals,
+        'load_ms': round(load_ms, 1),
+        'total_ms': round((perf_counter() - started) * 1000, 1),
+    }
@@ -3,7 +3,16 @@ export function initializeCalendar() {
     if (calendarEl) {
         var calendar = new FullCalendar.Calendar(calendarEl, {
             initialView: 'dayGridMonth',
-            events: calendarEvents,  // We'll need to ensure this variable is available
+            // Only the visible range is fetched; FullCalendar adds start/end to the request.
+            events: {
+                url: calendarEl.dataset.eventsUrl,
+                extraParams: function() {
+                    return calendarEl.dataset.teamId ? { team: calendarEl.dataset.teamId } : {};
+                },
+                failure: function() {
+                    console.error('Error loading calendar events');
+                }
+            },
             headerToolbar: {
                 left: 'prev,next today',
                 center: 'title',
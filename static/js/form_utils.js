@@ -9,4 +9,33 @@ export function initializeFlatpickr() {
             defaultMinute: 0
         });
     }
-}
\ No newline at end of file
+}
+
+export function initializeUserPickers() {
+    // Selects marked .user-picker load their options page by page from the user search API.
+    document.querySelectorAll("select.user-picker").forEach(select => {
+        let nextAfter = null;
+        $(select).select2({
+            width: "100%",
+            placeholder: "Search users...",
+            // Filters offer an empty "All users" option that clearing returns to.
+            allowClear: Boolean(select.querySelector('option[value=""]')),
+            ajax: {
+                url: select.dataset.searchUrl,
+                dataType: "json",
+                delay: 250,
+                data: params => ({
+                    q: params.term || "",
+                    after: (params.page || 1) > 1 ? nextAfter : ""
+                }),
+                processResults: data => {
+                    nextAfter = data.next_after;
+                    return {
+                        results: data.users.map(user => ({ id: user.id, text: user.label })),
+                        pagination: { more: Boolean(data.next_after) }
+                    };
+                }
+            }
+        });
+    });
+}
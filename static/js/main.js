@@ -9,7 +9,7 @@ import { initializeUserManagement } from './user_management.js';
 import { initializeAuth } from './auth.js';
 import { showNotification, showDeleteConfirmationModal } from './utils.js';
 import { initializeSelectAll, initializeTableSearch } from './table_utils.js';
-import { initializeFlatpickr } from './form_utils.js';
+import { initializeFlatpickr, initializeUserPickers } from './form_utils.js';
 
 document.addEventListener('DOMContentLoaded', function() {
     initializeAuth();
@@ -26,8 +26,8 @@ document.addEventListener('DOMContentLoaded', function() {
     initializeTableSearch('teamSearch', 'teamTableBody');
     initializeTableSearch('roleSearch', 'roleTableBody');
     initializeTableSearch('timeoffSearch', 'timeoffTableBody');
-    initializeTableSearch('scheduleSearch', 'scheduleTableBody');
     initializeFlatpickr();
+    initializeUserPickers();
     
     // Make utility functions globally available
     window.showNotification = showNotification;
@@ -1,3 +1,5 @@
+import { escapeHtml, initializePagedTable } from './table_utils.js';
+
 export function initializeSchedule() {
     const scheduleForm = document.getElementById('schedule-form');
     if (scheduleForm) {
@@ -28,11 +30,31 @@ export function initializeSchedule() {
         });
     }
 
-    document.querySelectorAll('.delete-schedule').forEach(button => {
-        button.addEventListener('click', function() {
-            const scheduleId = this.dataset.scheduleId;
-            const deleteUrl = `/manager/delete_schedule/${scheduleId}`;
+    // Delegated so that rows appended by paging get the handler too.
+    document.addEventListener('click', function(e) {
+        const button = e.target.closest('.delete-schedule');
+        if (button) {
+            e.preventDefault();
+            const deleteUrl = `/manager/delete_schedule/${button.dataset.scheduleId}`;
             window.showDeleteConfirmationModal(deleteUrl, () => location.reload());
-        });
+        }
+    });
+
+    initializePagedTable({
+        tableBodyId: 'scheduleTableBody',
+        loadMoreId: 'scheduleLoadMore',
+        itemsKey: 'schedules',
+        renderRow: schedule => `
+            <tr>
+                <td><input type="checkbox" name="schedule_ids[]" value="${schedule.id}"></td>
+                <td>${escapeHtml(schedule.username)}</td>
+                <td>${escapeHtml(schedule.start_time)}</td>
+                <td>${escapeHtml(schedule.end_time)}</td>
+                <td>${escapeHtml(schedule.team_name)}</td>
+                <td>
+                    <a href="${escapeHtml(schedule.edit_url)}" class="btn btn-sm btn-primary">Edit</a>
+                    <a href="#" class="btn btn-sm btn-danger delete-schedule" data-schedule-id="${schedule.id}">Delete</a>
+                </td>
+            </tr>`
     });
 }
@@ -22,21 +22,77 @@ export function initializeTableSearch(searchInputId, tableBodyId) {
 export function initializeSelectAll(selectAllId, checkboxName, deleteButtonId) {
     const selectAll = document.getElementById(selectAllId);
     const deleteButton = document.getElementById(deleteButtonId);
-    const checkboxes = document.getElementsByName(checkboxName);
 
-    if (selectAll && deleteButton && checkboxes.length > 0) {
+    if (selectAll && deleteButton) {
+        // Checkboxes are looked up on each change so rows appended by paging are included.
+        const checkboxes = () => document.querySelectorAll(`input[name="${checkboxName}"]`);
+
+        function updateDeleteButton() {
+            const checkedBoxes = document.querySelectorAll(`input[name="${checkboxName}"]:checked`);
+            deleteButton.disabled = checkedBoxes.length === 0;
+        }
+
         selectAll.addEventListener('change', function() {
-            checkboxes.forEach(checkbox => checkbox.checked = this.checked);
+            checkboxes().forEach(checkbox => checkbox.checked = this.checked);
             updateDeleteButton();
         });
 
-        checkboxes.forEach(checkbox => {
-            checkbox.addEventListener('change', updateDeleteButton);
+        document.addEventListener('change', function(e) {
+            if (e.target.name === checkboxName) {
+                updateDeleteButton();
+            }
         });
+    }
+}
 
-        function updateDeleteButton() {
-            const checkedBoxes = document.querySelectorAll(`input[name="${checkboxName}"]:checked`);
-            deleteButton.disabled = checkedBoxes.length === 0;
+const HTML_ESCAPES = { '&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;', "'": '&#39;' };
+
+export function escapeHtml(value) {
+    // Safe for element content and quoted attribute values.
+    return String(value ?? '').replace(/[&<>"']/g, char => HTML_ESCAPES[char]);
+}
+
+export function initializePagedTable({ tableBodyId, loadMoreId, itemsKey, renderRow, infinite = false }) {
+    // Appends the next keyset page (same URL and filters, plus the cursor) when "Load more" is clicked,
+    // or when it scrolls into view with `infinite`.
+    const tableBody = document.getElementById(tableBodyId);
+    const loadMore = document.getElementById(loadMoreId);
+    if (!tableBody || !loadMore) {
+        return;
+    }
+
+    function loadNextPage() {
+        if (loadMore.disabled || !loadMore.dataset.nextCursor) {
+            return;
         }
+        const params = new URLSearchParams(window.location.search);
+        params.set('cursor', loadMore.dataset.nextCursor);
+        loadMore.disabled = true;
+        fetch(`${window.location.pathname}?${params}`, { headers: { 'X-Requested-With': 'XMLHttpRequest' } })
+            .then(response => response.json())
+            .then(data => {
+                if (data.status !== 'success') {
+                    throw new Error(data.message);
+                }
+                tableBody.insertAdjacentHTML('beforeend', data[itemsKey].map(renderRow).join(''));
+                loadMore.dataset.nextCursor = data.next_cursor || '';
+                loadMore.hidden = !data.next_cursor;
+            })
+            .catch(error => {
+                console.error('Error:', error);
+                window.showNotification('error', 'Could not load more rows.');
+            })
+            .finally(() => {
+                loadMore.disabled = false;
+            });
     }
-}
\ No newline at end of file
+
+    loadMore.addEventListener('click', loadNextPage);
+    if (infinite && 'IntersectionObserver' in window) {
+        new IntersectionObserver(entries => {
+            if (entries.some(entry => entry.isIntersecting)) {
+                loadNextPage();
+            }
+        }, { rootMargin: '200px' }).observe(loadMore);
+    }
+}
@@ -1,3 +1,5 @@
+import { escapeHtml, initializePagedTable } from './table_utils.js';
+
 export function initializeUserManagement() {
     document.querySelectorAll('.delete-user').forEach(button => {
         button.addEventListener('click', function() {
@@ -22,4 +24,62 @@ export function initializeUserManagement() {
             window.toggleUserStatus(toggleUrl);
         });
     });
+
+    // manage_users and manage_inactive_users scroll through keyset pages of the current search.
+    const userTableBody = document.getElementById('userTableBody');
+    if (userTableBody && userTableBody.dataset.listing) {
+        const renderRow = userTableBody.dataset.listing === 'inactive' ? renderInactiveUserRow : renderActiveUserRow;
+        initializePagedTable({
+            tableBodyId: 'userTableBody',
+            loadMoreId: 'userLoadMore',
+            itemsKey: 'users',
+            renderRow: renderRow,
+            infinite: true
+        });
+    }
+}
+
+function deleteUserForm(user) {
+    return `
+        <form action="${escapeHtml(user.delete_url)}" method="POST" class="d-inline">
+            <button type="submit" class="btn btn-sm btn-danger" onclick="return confirm('Are you sure you want to delete this user?');">Delete</button>
+        </form>`;
+}
+
+function renderActiveUserRow(user) {
+    return `
+        <tr>
+            <td>${escapeHtml(user.username)}</td>
+            <td>${escapeHtml(user.first_name)} ${escapeHtml(user.last_name)}</td>
+            <td>${escapeHtml(user.email)}</td>
+            <td>${escapeHtml(user.work_phone || 'N/A')}</td>
+            <td>${escapeHtml(user.mobile_phone || 'N/A')}</td>
+            <td>${escapeHtml(user.timezone || 'UTC')}</td>
+            <td>${escapeHtml(user.role_name || 'No Role')}</td>
+            <td>${escapeHtml(user.team_name || 'No Team')}</td>
+            <td>${user.is_active ? 'Yes' : 'No'}</td>
+            <td>
+                <a href="${escapeHtml(user.details_url)}" class="btn btn-sm btn-info">Details</a>
+                <a href="${escapeHtml(user.edit_url)}" class="btn btn-sm btn-primary">Edit</a>
+                ${deleteUserForm(user)}
+            </td>
+        </tr>`;
+}
+
+function renderInactiveUserRow(user) {
+    return `
+        <tr>
+            <td>${escapeHtml(user.username)}</td>
+            <td>${escapeHtml(user.first_name)} ${escapeHtml(user.last_name)}</td>
+            <td>${escapeHtml(user.email)}</td>
+            <td>${escapeHtml(user.role_name || 'No Role')}</td>
+            <td>${escapeHtml(user.team_name || 'No Team')}</td>
+            <td>
+                <a href="${escapeHtml(user.edit_url)}" class="btn btn-sm btn-primary">Edit</a>
+                <form action="${escapeHtml(user.activate_url)}" method="POST" class="d-inline">
+                    <button type="submit" class="btn btn-sm btn-success">Activate</button>
+                </form>
+                ${deleteUserForm(user)}
+            </td>
+        </tr>`;
 }
@@ -5,6 +5,8 @@ from flask_login import current_user
 import logging
 from datetime import datetime, timezone
 import pytz
+from sqlalchemy import func
+from extensions import db
 
 logger = logging.getLogger(__name__)
 
@@ -22,10 +24,10 @@ def admin_required(fn):
     @wraps(fn)
     def wrapper(*args, **kwargs):
         if not current_user.is_authenticated:
-            logger.warning(f"Unauthenticated user attempting to access admin-only function")
+            logger.warning("Unauthenticated user attempting to access admin-only function")
             return jsonify(msg='Authentication required'), 401
         if current_user.role != 'admin':
-            logger.warning(f"User {current_user.username} with role {current_user.role} denied access to admin-only function")
+            logger.warning("User %s with role %s denied access to admin-only function", current_user.username, current_user.role)
             return jsonify(msg='Admin access required'), 403
         return fn(*args, **kwargs)
     return wrapper
@@ -33,14 +35,14 @@ def admin_required(fn):
 def manager_required(fn):
     @wraps(fn)
     def wrapper(*args, **kwargs):
-        logger.info(f"User {current_user.username} (role: {current_user.role}) attempting to access manager-only function")
+        logger.debug("User %s (role: %s) attempting to access manager-only function", current_user.username, current_user.role)
         if not current_user.is_authenticated:
-            logger.warning(f"Unauthenticated user attempting to access manager-only function")
+            logger.warning("Unauthenticated user attempting to access manager-only function")
             return jsonify(msg='Authentication required'), 401
         if current_user.role not in ['manager', 'admin']:
-            logger.warning(f"User {current_user.username} with role {current_user.role} denied access to manager-only function")
+            logger.warning("User %s with role %s denied access to manager-only function", current_user.username, current_user.role)
             return jsonify(msg='Manager or admin access required'), 403
-        logger.info(f"User {current_user.username} granted access to manager-only function")
+        logger.debug("User %s granted access to manager-only function", current_user.username)
         return fn(*args, **kwargs)
     return wrapper
 
@@ -48,3 +50,21 @@ def get_user_local_time(user):
     utc_time = datetime.now(timezone.utc)
     user_tz = pytz.timezone(user.timezone)
     return utc_time.astimezone(user_tz)
+
+def parse_iso_utc(value):
+    """Parse an ISO 8601 timestamp into a naive UTC datetime, the form schedules are stored in."""
+    parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+def hours_between(start_column, end_column):
+    """
+    SQL expression for the number of hours between two DateTime columns.
+
+    Postgres can extract the epoch from an interval; SQLite has no interval
+    type, so fall back to julianday arithmetic there.
+    """
+    if db.engine.dialect.name == 'sqlite':
+        return (func.julianday(end_column) - func.julianday(start_column)) * 24
+    return func.extract('epoch', end_column - start_column) / 3600
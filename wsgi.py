@@ -1,4 +1,4 @@
-from app import app
+from app import create_app
 
-if __name__ == "__main__":
-    app.run()
\ No newline at end of file
+# Served by `python -m waitress wsgi:app` (see start.sh); run.py is the development entry point.
+app = create_app()